@@ -0,0 +1,13 @@
+"""Benchmarks for the finance manager
+
+Run them from the repository root:
+
+    python -m benchmarks.run --sizes 10000 100000
+"""
+import os
+import sys
+
+# The application modules live in src/ and import each other by plain name
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
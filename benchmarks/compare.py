@@ -0,0 +1,48 @@
+import argparse
+import json
+import sys
+
+# A benchmark this many times slower than before counts as a regression
+DEFAULT_THRESHOLD = 1.25
+
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD):
+    """Return (size, name, old best, new best, ratio) rows and the regressed ones"""
+    rows = []
+    regressions = []
+    for size, results in new["sizes"].items():
+        previous = old["sizes"].get(size, {})
+        for name, timing in results.items():
+            if name not in previous:
+                continue
+            before = previous[name]["best"]
+            ratio = timing["best"] / before if before else float("inf")
+            row = (size, name, before, timing["best"], ratio)
+            rows.append(row)
+            if ratio > threshold:
+                regressions.append(row)
+    return rows, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old", help="results of the earlier commit")
+    parser.add_argument("new", help="results of the later commit")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown ratio that fails")
+    args = parser.parse_args()
+
+    with open(args.old, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    rows, regressions = compare(old, new, args.threshold)
+    for size, name, before, after, ratio in rows:
+        mark = "  ❌" if ratio > args.threshold else ""
+        print(f"{size:>9} {name:<32} {before * 1000:>10.2f} ms -> {after * 1000:>10.2f} ms  x{ratio:.2f}{mark}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmarks are more than {args.threshold}x slower.")
+        sys.exit(1)
+    print("\nNo regressions.")
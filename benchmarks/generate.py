@@ -0,0 +1,89 @@
+import argparse
+import random
+from datetime import date
+from itertools import accumulate
+
+# benchmarks/__init__.py has put src/ on sys.path
+from stream_loader import write_records
+from transaction_store import DATE_FORMAT
+
+# Bump when the generated data changes so cached ledgers are made again
+GENERATOR_VERSION = 2
+
+# Generated ledgers end on this day and cover this many years
+END_DATE = date(2024, 12, 31)
+YEARS = 5
+
+# (type, category, weight, lowest amount, highest amount, day of month or None, descriptions)
+# Weights fall off roughly like a Zipf distribution: a few categories hold
+# most transactions. Rent, salary and bills land on a fixed day of the month.
+CATEGORIES = [
+    ("expense", "Food", 30, 3, 120, None, ["Grocery store", "Coffee shop", "Bakery", "Supermarket", "Pizza place"]),
+    ("expense", "Transportation", 15, 2, 90, None, ["Metro card", "Fuel station", "Taxi ride", "Parking"]),
+    ("expense", "Shopping", 12, 5, 400, None, ["Online order", "Clothing store", "Electronics shop", "Bookstore"]),
+    ("expense", "Entertainment", 8, 5, 150, None, ["Cinema", "Concert tickets", "Streaming service", "Game store"]),
+    ("expense", "Utilities", 5, 30, 250, 10, ["Electric bill", "Water bill", "Internet", "Phone bill"]),
+    ("expense", "Health", 4, 10, 600, None, ["Pharmacy", "Dentist", "Gym membership"]),
+    ("income", "Freelance", 4, 100, 3000, None, ["Client invoice", "Consulting fee", "Upwork payout"]),
+    ("expense", "Rent", 3, 900, 2200, 1, ["Monthly rent"]),
+    ("income", "Salary", 3, 2500, 7000, 25, ["Payroll"]),
+    ("expense", "Travel", 2, 80, 2500, None, ["Airline ticket", "Hotel booking", "Train ticket"]),
+    ("expense", "Education", 2, 20, 900, None, ["Online course", "Textbooks", "Tuition"]),
+    ("expense", "Gifts", 2, 10, 300, None, ["Birthday gift", "Charity donation"]),
+    ("income", "Interest", 1, 1, 80, 28, ["Savings interest"]),
+    ("income", "Refunds", 1, 5, 300, None, ["Store refund", "Tax refund"]),
+]
+
+CUM_WEIGHTS = list(accumulate(entry[2] for entry in CATEGORIES))
+
+
+def generate(count, seed=0):
+    """Yield count transactions in the financial_data.json schema
+
+    The same count and seed always give the same ledger. Amounts are
+    log-uniform within each category's range, so small amounts are common,
+    and recent dates are more frequent than old ones.
+    """
+    rng = random.Random(seed)
+    last = END_DATE.toordinal()
+    span = YEARS * 365
+
+    for transaction_id in range(1, count + 1):
+        transaction_type, category, weight, low, high, day, descriptions = rng.choices(
+            CATEGORIES, cum_weights=CUM_WEIGHTS
+        )[0]
+
+        # The square root makes the density grow linearly towards END_DATE
+        when = date.fromordinal(last - int(span * (1 - rng.random() ** 0.5)))
+        if day is not None:
+            when = when.replace(day=day)
+
+        description = rng.choice(descriptions)
+        if rng.random() < 0.3:
+            description += f" #{rng.randrange(1000, 10000)}"
+
+        yield {
+            "id": transaction_id,
+            "type": transaction_type,
+            "amount_cents": round(low * (high / low) ** rng.random() * 100),
+            "category": category,
+            "description": description,
+            "date": when.strftime(DATE_FORMAT),
+        }
+
+
+def write_ledger(path, count, seed=0):
+    """Write a generated ledger to a JSON data file without holding it in memory"""
+    with open(path, 'w', encoding='utf-8') as f:
+        write_records(f, generate(count, seed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic ledger in the financial_data.json format")
+    parser.add_argument("count", type=int, help="number of transactions, e.g. 10000 to 10000000")
+    parser.add_argument("path", help="JSON file to write")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator")
+    args = parser.parse_args()
+
+    write_ledger(args.path, args.count, args.seed)
+    print(f" {args.count} transactions written to {args.path}.")
@@ -0,0 +1,237 @@
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# benchmarks/__init__.py has put src/ on sys.path
+import aggregation
+import main
+from benchmarks.generate import GENERATOR_VERSION, write_ledger
+from storage import convert
+
+DEFAULT_SIZES = [10_000, 100_000]
+
+# Timed runs of every benchmark; the best and the median are reported
+DEFAULT_REPEAT = 3
+
+# Adds, edits or deletes in one timed run of the mutation benchmarks
+OPERATIONS = 100
+
+# Bump when the results layout changes
+RESULTS_VERSION = 1
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LEDGER_DIR = os.path.join(HERE, "data")
+RESULTS_DIR = os.path.join(HERE, "results")
+
+# Scripted answers that drive the menu functions
+ADD_ANSWERS = ["2", "42.50", "Food", "Benchmark purchase", "2024/06/15"]
+SEARCHES = {
+    "search_by_category": (main.search_by_category, ["food"]),
+    "search_by_description": (main.search_by_description, ["coffee"]),
+    "search_by_type": (main.search_by_type, ["1"]),
+    "search_by_date_day": (main.search_by_date, ["1", "2024/06/15"]),
+    "search_by_date_month": (main.search_by_date, ["2", "2024/06"]),
+    "search_by_date_range": (main.search_by_date, ["3", "2024/01/01", "2024/12/31"]),
+}
+REPORTS = {
+    "show_balance": main.show_balance,
+    "show_transactions_page": main.show_transactions,
+    "show_summary_report": main.show_summary_report,
+    "show_category_report": main.show_category_report,
+    "show_monthly_report": main.show_monthly_report,
+    "show_year_over_year_report": main.show_year_over_year_report,
+    "show_balance_over_time_report": main.show_balance_over_time_report,
+    "show_expense_distribution_report": main.show_expense_distribution_report,
+}
+# The aggregations each chart draws from
+CHART_DATA = {
+    "chart_expense_pie_data": lambda t: aggregation.category_totals(t, "expense"),
+    "chart_monthly_data": aggregation.monthly_totals,
+    "chart_month_pies_data": lambda t: aggregation.group_totals(t, ("month", "type", "category")),
+    "chart_category_trends_data": lambda t: aggregation.group_totals(t, ("category", "type", "month")),
+    "chart_balance_data": aggregation.balance_over_time,
+    "chart_percentiles_data": lambda t: aggregation.expense_distribution(t, top=0),
+}
+
+
+@contextlib.contextmanager
+def scripted(answers=()):
+    """Answer input() from a list and send printed output to devnull
+
+    Once the answers run out every prompt gets 'q', which also leaves the
+    table pager after its first page.
+    """
+    answers = iter(answers)
+    original = builtins.input
+    builtins.input = lambda prompt="": next(answers, "q")
+    try:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        builtins.input = original
+
+
+def measure(run, repeat, setup=None):
+    """Time run(prepared) repeat times; setup() makes prepared and is not timed"""
+    runs = []
+    for _ in range(repeat):
+        prepared = setup() if setup else None
+        start = time.perf_counter()
+        run(prepared)
+        runs.append(time.perf_counter() - start)
+    return {"best": min(runs), "median": statistics.median(runs), "runs": runs}
+
+
+def ledger_file(size, seed):
+    """Return a generated JSON ledger of size transactions, made once and kept"""
+    os.makedirs(LEDGER_DIR, exist_ok=True)
+    path = os.path.join(LEDGER_DIR, f"ledger-{size}-seed{seed}-v{GENERATOR_VERSION}.json")
+    if not os.path.exists(path):
+        print(f" Generating {size} transactions...")
+        write_ledger(path, size, seed)
+    return path
+
+
+def first_ids(transactions, count):
+    return [t["id"] for t in transactions.iter_rows(0, count)]
+
+
+def run_size(size, seed, data_format, repeat):
+    """Run every benchmark on a ledger of one size; returns {name: timings}"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"financial_data.{data_format}")
+        with scripted():
+            convert(ledger_file(size, seed), path)
+
+        def load(prepared):
+            nonlocal transactions
+            transactions = main.load_data()
+
+        def reopen():
+            if main.storage is not None:
+                main.storage.close()
+            main.use_data_file(path)
+
+        transactions = None
+        with scripted():
+            results["load_data"] = measure(load, repeat, setup=reopen)
+
+            def save(prepared):
+                main.save_data(transactions)
+                # Snapshots are written in the background; time the whole write
+                main.storage.flush()
+
+            results["save_data"] = measure(save, repeat)
+
+            # Each run starts from an empty journal, so no run pays for a compaction
+            def reset():
+                save(None)
+                return first_ids(transactions, OPERATIONS)
+
+            def add(ids):
+                with scripted(ADD_ANSWERS * OPERATIONS):
+                    for _ in range(OPERATIONS):
+                        main.add_transaction(transactions)
+                main.storage.flush()
+
+            def edit(ids):
+                answers = []
+                for transaction_id in ids:
+                    answers += ["q", str(transaction_id), "3", "Groceries", "6"]
+                with scripted(answers):
+                    for _ in ids:
+                        main.edit_transactions(transactions)
+                main.storage.flush()
+
+            def delete(ids):
+                answers = []
+                for transaction_id in ids:
+                    answers += ["q", str(transaction_id), "yes"]
+                with scripted(answers):
+                    for _ in ids:
+                        main.delete_transaction(transactions)
+                main.storage.flush()
+
+            results[f"add_transaction_x{OPERATIONS}"] = measure(add, repeat, setup=reset)
+            results[f"edit_transactions_x{OPERATIONS}"] = measure(edit, repeat, setup=reset)
+            results[f"delete_transaction_x{OPERATIONS}"] = measure(delete, repeat, setup=reset)
+
+            for name, (function, answers) in SEARCHES.items():
+                def search(prepared, function=function, answers=answers):
+                    with scripted(answers):
+                        function(transactions)
+                results[name] = measure(search, repeat)
+
+            for name, function in REPORTS.items():
+                results[name] = measure(lambda prepared, function=function: function(transactions), repeat)
+
+            for name, function in CHART_DATA.items():
+                results[name] = measure(lambda prepared, function=function: function(transactions), repeat)
+
+        main.storage.close()
+    return results
+
+
+def git_commit():
+    """Return the current commit and whether the tree has changes, or (None, None)"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time loading, saving, editing, searching and reports")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="ledger sizes, 10000 to 10000000")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the ledger generator")
+    parser.add_argument("--format", choices=["json", "bin", "db", "ledger"], default="json", help="storage format to measure")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs of every benchmark")
+    parser.add_argument("--out", help="results file, by default benchmarks/results/<time>-<commit>.json")
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    report = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "format": args.format,
+        "seed": args.seed,
+        "generator_version": GENERATOR_VERSION,
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+
+    for size in args.sizes:
+        print(f"\n--- {size} transactions ({args.format}) ---")
+        results = run_size(size, args.seed, args.format, args.repeat)
+        report["sizes"][str(size)] = results
+        for name, timing in results.items():
+            print(f"{name:<32} best {timing['best'] * 1000:>10.2f} ms   median {timing['median'] * 1000:>10.2f} ms")
+
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{stamp}-{commit or 'unknown'}.json")
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResults written to {out}")
@@ -0,0 +1,64 @@
+class AggregateCache:
+    """Running sums and counts per type, category, month and day
+
+    Totals are whole cents. daily and monthly are the rollup tables, keyed
+    by (type, category, day) and (type, category, month). They are what gets
+    saved with the ledger; the smaller groups are rolled up from them when a
+    cache is read back.
+    """
+
+    def __init__(self):
+        # Each value is a [total, count] pair
+        self.by_type = {}
+        self.by_category = {}
+        self.by_month = {}
+        self.daily = {}
+        self.monthly = {}
+
+    def _change(self, groups, key, amount, count):
+        entry = groups.get(key)
+        if entry is None:
+            entry = groups[key] = [0, 0]
+        entry[0] += amount
+        entry[1] += count
+        if entry[1] == 0:
+            # Last row of the group is gone
+            del groups[key]
+
+    def _change_month(self, transaction_type, category, month, amount, count):
+        self._change(self.by_type, transaction_type, amount, count)
+        self._change(self.by_category, (transaction_type, category), amount, count)
+        self._change(self.by_month, (transaction_type, month), amount, count)
+        self._change(self.monthly, (transaction_type, category, month), amount, count)
+
+    def add(self, transaction_type, category, day, amount):
+        """Count one transaction dated day (YYYY/MM/DD) in its groups"""
+        self._change(self.daily, (transaction_type, category, day), amount, 1)
+        self._change_month(transaction_type, category, day[:7], amount, 1)
+
+    def remove(self, transaction_type, category, day, amount):
+        """Take one transaction out of its groups"""
+        self._change(self.daily, (transaction_type, category, day), -amount, -1)
+        self._change_month(transaction_type, category, day[:7], -amount, -1)
+
+    def merge(self, rollups, sign=1):
+        """Add saved rollup rows to the cache, or take them out with sign=-1
+
+        rollups is {"daily": rows, "monthly": rows} as made by to_json().
+        """
+        for transaction_type, category, day, total, count in rollups["daily"]:
+            self._change(self.daily, (transaction_type, category, day), sign * total, sign * count)
+        for transaction_type, category, month, total, count in rollups["monthly"]:
+            self._change_month(transaction_type, category, month, sign * total, sign * count)
+        return self
+
+    def to_json(self):
+        """Return the rollup tables as lists of [type, category, period, total, count]"""
+        return {
+            "daily": [[*key, total, count] for key, (total, count) in sorted(self.daily.items())],
+            "monthly": [[*key, total, count] for key, (total, count) in sorted(self.monthly.items())],
+        }
+
+    @classmethod
+    def from_json(cls, rollups):
+        return cls().merge(rollups)
@@ -0,0 +1,209 @@
+import heapq
+from collections import deque
+
+import numpy as np
+
+from quantile_sketch import QuantileSketch
+from transaction_store import TYPE_CODES, TYPES, date_to_ordinal, ordinal_to_date
+
+# Keys transactions can be grouped by
+GROUP_KEYS = ("type", "category", "month", "day", "year")
+
+# Days in the rolling spending averages
+ROLLING_WINDOWS = (30, 90)
+
+# Largest expenses listed, and spending percentiles given per category
+TOP_EXPENSES = 10
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _from_cache(store, keys):
+    """Roll the smallest aggregate cache table that has every key up to keys"""
+    cache = store.aggregates
+    wanted = set(keys)
+
+    if wanted == {"type"}:
+        return {(name,): list(entry) for name, entry in cache.by_type.items()}
+    if wanted <= {"type", "category"}:
+        source, fields = cache.by_category, ("type", "category")
+    elif wanted <= {"type", "month", "year"}:
+        source, fields = cache.by_month, ("type", "month")
+    elif "day" not in wanted:
+        source, fields = cache.monthly, ("type", "category", "month")
+    else:
+        source, fields = cache.daily, ("type", "category", "day")
+
+    result = {}
+    for group, (total, count) in source.items():
+        values = dict(zip(fields, group))
+        if "day" in values:
+            values["month"] = values["day"][:7]
+        if "month" in values:
+            values["year"] = values["month"][:4]
+        entry = result.setdefault(tuple(values[key] for key in keys), [0, 0])
+        entry[0] += total
+        entry[1] += count
+    return result
+
+
+def group_totals(store, keys):
+    """Return {(key values...): [total, count]} for transactions grouped by keys
+
+    Every grouping is rolled up from the aggregate cache, so no
+    transaction rows are read.
+    """
+    keys = tuple(keys)
+    for key in keys:
+        if key not in GROUP_KEYS:
+            raise ValueError(f"Unknown group key '{key}'. Use one of {', '.join(GROUP_KEYS)}")
+
+    # Database-backed stores run the grouping in the database
+    if store.pushdown:
+        return store.group_totals(keys)
+
+    return _from_cache(store, keys)
+
+
+def type_totals(store):
+    """Return {type: [total in cents, count]} for every transaction type"""
+    groups = group_totals(store, ("type",))
+    return {name: groups.get((name,), [0, 0]) for name in TYPES}
+
+
+def category_totals(store, transaction_type):
+    """Return (category, total, percentage) rows for one type, largest first"""
+    groups = group_totals(store, ("type", "category"))
+    totals = {
+        category: total
+        for (group_type, category), (total, count) in groups.items()
+        if group_type == transaction_type
+    }
+
+    # The grand total is computed once, not once per category
+    grand_total = sum(totals.values())
+    rows = []
+    for category, total in sorted(totals.items(), key=lambda x: x[1], reverse=True):
+        percentage = (total / grand_total) * 100 if grand_total else 0.0
+        rows.append((category, total, percentage))
+    return rows
+
+
+def monthly_totals(store):
+    """Return (month, income, expense) rows sorted by month"""
+    groups = group_totals(store, ("month", "type"))
+    monthly_data = {}
+    for (month, transaction_type), (total, count) in groups.items():
+        if month not in monthly_data:
+            monthly_data[month] = {'income': 0, 'expense': 0}
+        monthly_data[month][transaction_type] = total
+
+    return [(month, data['income'], data['expense']) for month, data in sorted(monthly_data.items())]
+
+
+def year_over_year(store):
+    """Return (year, income, expense, income change %, expense change %) rows by year
+
+    A change is None for the first year and when the year before had none.
+    """
+    yearly = {}
+    for (year, transaction_type), (total, count) in group_totals(store, ("year", "type")).items():
+        yearly.setdefault(year, {'income': 0, 'expense': 0})[transaction_type] = total
+
+    rows = []
+    for year, data in sorted(yearly.items()):
+        previous = yearly.get(str(int(year) - 1))
+        changes = []
+        for transaction_type in ('income', 'expense'):
+            before = previous[transaction_type] if previous else 0
+            changes.append((data[transaction_type] - before) / before * 100 if before else None)
+        rows.append((year, data['income'], data['expense'], *changes))
+    return rows
+
+
+def percentile_name(q):
+    """Short name of a quantile, e.g. p90 for 0.9"""
+    return f"p{q * 100:g}"
+
+
+def balance_over_time(store, windows=ROLLING_WINDOWS):
+    """Return (day, balance, averages) rows in date order, one per calendar day
+
+    The rows run from the first to the last day with transactions, days
+    without any included. balance is the running balance at the end of the
+    day. averages holds the mean daily expense over the last n calendar days
+    for each n in windows, days without expenses counting as 0. It is one
+    pass over the days, with a running sum per window.
+    """
+    daily = {}
+    for (day, transaction_type), (total, count) in group_totals(store, ("day", "type")).items():
+        daily.setdefault(date_to_ordinal(day), {'income': 0, 'expense': 0})[transaction_type] = total
+    if not daily:
+        return []
+
+    balance = 0
+    # Expense of the days inside each window, oldest first
+    recent = {window: deque() for window in windows}
+    sums = {window: 0 for window in windows}
+    rows = []
+    for ordinal in range(min(daily), max(daily) + 1):
+        data = daily.get(ordinal)
+        expense = data['expense'] if data else 0
+        if data:
+            balance += data['income'] - expense
+        averages = []
+        for window in windows:
+            days = recent[window]
+            days.append(expense)
+            sums[window] += expense
+            if len(days) > window:
+                sums[window] -= days.popleft()
+            averages.append(sums[window] / window)
+        rows.append((ordinal_to_date(ordinal), balance, averages))
+    return rows
+
+
+def expense_distribution(store, top=TOP_EXPENSES, quantiles=QUANTILES):
+    """Return (largest, percentiles) of the expenses in one streaming pass
+
+    largest holds the top largest expenses as transaction dicts, largest
+    first. percentiles holds (category, count, amounts) rows by category, where
+    amounts are the spending quantiles in cents: exact for a category of up
+    to quantile_sketch.EXACT_LIMIT expenses, accurate to 1% beyond that. The columns
+    are read a chunk at a time into a heap of at most top expenses and one
+    QuantileSketch per category, so memory does not grow with the ledger.
+    """
+    # Min-heap of (amount, -id); the smallest of the largest is at the top
+    heap = []
+    sketches = {}
+    code = TYPE_CODES['expense']
+    for ids, amounts, types, categories in store.iter_column_chunks("ids", "amounts", "types", "categories"):
+        expenses = types == code
+        ids, amounts, categories = ids[expenses], amounts[expenses], categories[expenses]
+        if not len(amounts):
+            continue
+
+        if top:
+            # Only amounts that could reach the top of this chunk go near the heap
+            threshold = np.partition(amounts, -top)[-top] if len(amounts) > top else amounts.min()
+            if len(heap) == top:
+                threshold = max(threshold, heap[0][0])
+            picked = amounts >= threshold
+            for amount, transaction_id in zip(amounts[picked].tolist(), ids[picked].tolist()):
+                # Equal amounts rank the older transaction first
+                if len(heap) < top:
+                    heapq.heappush(heap, (amount, -transaction_id))
+                else:
+                    heapq.heappushpop(heap, (amount, -transaction_id))
+
+        for category in np.unique(categories).tolist():
+            sketch = sketches.get(category)
+            if sketch is None:
+                sketch = sketches[category] = QuantileSketch()
+            sketch.add_many(amounts[categories == category])
+
+    largest = [store.get(-negative_id) for amount, negative_id in sorted(heap, reverse=True)]
+    percentiles = sorted(
+        (store.category_names[category], sketch.count, [round(sketch.quantile(q)) for q in quantiles])
+        for category, sketch in sketches.items()
+    )
+    return largest, percentiles
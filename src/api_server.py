@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+
+import aggregation
+import instrumentation
+import main
+from cli import REPORT_KINDS, balance_json, json_rows, report_json, run_search
+from table_view import page
+from transaction_store import DATE_FORMAT, TYPES
+from validation import parse_amount, parse_date
+
+# Only this machine can connect; there is no authentication
+HOST = "127.0.0.1"
+PORT = 8765
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+# Fields a client may set on a transaction
+FIELDS = ("type", "amount", "category", "description", "date")
+
+# Query parameters of /search, only one of them at a time ("to" goes with "from")
+SEARCH_CRITERIA = ("category", "description", "type", "date", "month", "from")
+
+
+class HttpError(Exception):
+    """Error answered to the client as {"error": message}"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _parse_fields(body, required=()):
+    """Validate the JSON body of an add or edit; returns the fields to set"""
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise HttpError(400, "The body is not valid JSON.")
+    if not isinstance(data, dict):
+        raise HttpError(400, "The body must be a JSON object.")
+
+    unknown = [name for name in data if name not in FIELDS]
+    if unknown:
+        raise HttpError(400, f"Unknown fields: {', '.join(unknown)}.")
+    missing = [name for name in required if name not in data]
+    if missing:
+        raise HttpError(400, f"Missing fields: {', '.join(missing)}.")
+
+    fields = {}
+    for name, value in data.items():
+        if name == "type":
+            if value not in TYPES:
+                raise HttpError(400, f"type must be one of {', '.join(TYPES)}.")
+        elif name == "amount":
+            # A JSON number or decimal text, in currency units
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise HttpError(400, "Enter a valid amount.")
+            try:
+                value = parse_amount(str(value))
+            except ValueError as e:
+                raise HttpError(400, str(e))
+        elif not isinstance(value, str):
+            raise HttpError(400, f"{name} must be a string.")
+        elif name == "date":
+            try:
+                value = parse_date(value)
+            except ValueError:
+                raise HttpError(400, f"Invalid date '{value}', use YYYY/MM/DD.")
+        fields[name] = value
+    return fields
+
+
+def _count(query, name, default=None):
+    text = query.get(name)
+    if text is None:
+        return default
+    if not text.isdigit():
+        raise HttpError(400, f"{name} must be a whole number of 0 or more.")
+    return int(text)
+
+
+def _transaction_id(text):
+    if not text.isdigit():
+        raise HttpError(404, f"Transaction with ID {text} not found")
+    return int(text)
+
+
+def _search_args(query):
+    """Turn /search query parameters into the arguments of cli.run_search"""
+    chosen = [name for name in SEARCH_CRITERIA if name in query]
+    if len(chosen) != 1:
+        raise HttpError(400, f"Give exactly one of {', '.join(SEARCH_CRITERIA)}.")
+
+    args = {name: None for name in ("category", "description", "type", "date", "month", "date_from", "date_to")}
+    name, value = chosen[0], query[chosen[0]]
+    try:
+        if name == "type":
+            if value not in TYPES:
+                raise HttpError(400, f"type must be one of {', '.join(TYPES)}.")
+            args["type"] = value
+        elif name == "date":
+            args["date"] = parse_date(value)
+        elif name == "month":
+            args["month"] = datetime.strptime(value, "%Y/%m")
+        elif name == "from":
+            if "to" not in query:
+                raise HttpError(400, "from needs to.")
+            args["date_from"], args["date_to"] = parse_date(value), parse_date(query["to"])
+        else:
+            args[name] = value
+    except ValueError:
+        raise HttpError(400, f"Invalid {name} '{value}', use {'YYYY/MM' if name == 'month' else 'YYYY/MM/DD'}.")
+    return argparse.Namespace(**args)
+
+
+class LedgerServer:
+    """HTTP/JSON access to one loaded ledger
+
+    Changes go through a queue to a single writer task, which applies every
+    waiting change, writes them to storage as one batch and answers them
+    once the batch is on disk. Reads run on the event loop between two batches and never await,
+    so each one sees the ledger as of one version without copying it or
+    reading the file again. Responses carry that version in X-Ledger-Version.
+    """
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.version = 0
+        # Made in serve(), inside the running event loop
+        self.changes = None
+
+    async def serve(self, host=HOST, port=PORT):
+        self.changes = asyncio.Queue()
+        writer_task = asyncio.create_task(self._run_writer())
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        address = server.sockets[0].getsockname()
+        print(f"✅ Serving {main.DATA_FILE} on http://{address[0]}:{address[1]} (Ctrl+C to stop)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            writer_task.cancel()
+
+    # Writes
+
+    async def _change(self, op, payload):
+        done = asyncio.get_running_loop().create_future()
+        await self.changes.put((op, payload, done))
+        return await done
+
+    async def _run_writer(self):
+        while True:
+            batch = [await self.changes.get()]
+            while not self.changes.empty():
+                batch.append(self.changes.get_nowait())
+
+            with instrumentation.operation("http write batch", rows=len(batch)):
+                results = []
+                for op, payload, done in batch:
+                    try:
+                        results.append((done, self._apply(op, payload), None))
+                    except HttpError as e:
+                        results.append((done, None, e))
+                    except Exception as e:
+                        # One bad change must not stop the writer
+                        print(f"❌ {op} {payload!r}: {e!r}", file=sys.stderr)
+                        results.append((done, None, HttpError(500, "Internal error, see the server output.")))
+                if any(failed is None for done, result, failed in results):
+                    self.version += 1
+                try:
+                    # Clients are answered only once the batch is on disk, so
+                    # this waits for the background writer of the snapshot backends
+                    main.storage.flush()
+                except Exception as e:
+                    # OSError from a file, sqlite3.Error from a database; the
+                    # writer keeps going and every waiting client is answered
+                    print(f"❌ Error in saving transactions: {e}", file=sys.stderr)
+                    error = HttpError(500, f"The change is kept in memory but was not saved: {e}")
+                    results = [(done, None, failed or error) for done, result, failed in results]
+
+            for done, result, failed in results:
+                # The client may have gone away while waiting
+                if done.cancelled():
+                    continue
+                if failed is None:
+                    done.set_result(result)
+                else:
+                    done.set_exception(failed)
+
+    def _apply(self, op, payload):
+        """Apply one change to the store and storage; returns the response data
+
+        Storage errors are raised, not printed as main.record_change does.
+        """
+        transactions = self.transactions
+        if op == "add":
+            transaction = {
+                "id": transactions.next_id(),
+                "type": payload["type"],
+                "amount": payload["amount"],
+                "category": payload["category"],
+                "description": payload.get("description", ""),
+                "date": payload.get("date") or datetime.now().strftime(DATE_FORMAT),
+            }
+            transactions.append(transaction)
+            main.storage.record(transactions, "add", transaction)
+            return json_rows([transaction])[0]
+
+        if op == "edit":
+            transaction_id, fields = payload
+            transaction = transactions.get(transaction_id)
+            if transaction is None:
+                raise HttpError(404, f"Transaction with ID {transaction_id} not found")
+            transaction.update(fields)
+            transactions.update(transaction)
+            main.storage.record(transactions, "edit", transaction)
+            return json_rows([transaction])[0]
+
+        if not transactions.remove(payload):
+            raise HttpError(404, f"Transaction with ID {payload} not found")
+        main.storage.record(transactions, "delete", {"id": payload})
+        return {"deleted": payload}
+
+    # Reads
+
+    def _read(self, parts, query):
+        transactions = self.transactions
+        if parts == ["balance"]:
+            return balance_json(transactions)
+        if parts == ["transactions"]:
+            return json_rows(transactions.iter_rows(_count(query, "offset", 0), _count(query, "limit")))
+        if len(parts) == 2 and parts[0] == "transactions":
+            transaction_id = _transaction_id(parts[1])
+            transaction = transactions.get(transaction_id)
+            if transaction is None:
+                raise HttpError(404, f"Transaction with ID {transaction_id} not found")
+            return json_rows([transaction])[0]
+        if parts == ["search"]:
+            results, title = run_search(transactions, _search_args(query))
+            rows = page(results, _count(query, "offset", 0), _count(query, "limit"))
+            return {"count": len(results), "transactions": json_rows(rows)}
+        if len(parts) == 2 and parts[0] == "reports" and parts[1] in REPORT_KINDS:
+            return report_json(transactions, parts[1], _count(query, "top", aggregation.TOP_EXPENSES))
+        raise HttpError(404, "Not found")
+
+    # HTTP
+
+    async def _dispatch(self, method, target, body):
+        """Answer one request; returns (status, data)"""
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        query = dict(parse_qsl(url.query))
+        try:
+            if method == "GET":
+                with instrumentation.operation(f"http GET /{parts[0] if parts else ''}"):
+                    return 200, self._read(parts, query)
+            if parts == ["transactions"] and method == "POST":
+                return 201, await self._change("add", _parse_fields(body, required=("type", "amount", "category")))
+            if len(parts) == 2 and parts[0] == "transactions":
+                if method == "PATCH":
+                    transaction_id = _transaction_id(parts[1])
+                    return 200, await self._change("edit", (transaction_id, _parse_fields(body)))
+                if method == "DELETE":
+                    return 200, await self._change("delete", _transaction_id(parts[1]))
+            raise HttpError(405, f"{method} is not supported on {url.path}")
+        except HttpError as e:
+            return e.status, {"error": e.message}
+        except Exception as e:
+            print(f"❌ {method} {target}: {e!r}", file=sys.stderr)
+            return 500, {"error": "Internal error, see the server output."}
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Bad request line."}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = headers.get("content-length", "0")
+                if not length.isdigit():
+                    await self._respond(writer, 400, {"error": "Bad Content-Length."}, keep_alive=False)
+                    break
+                if int(length) > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "The body is too large."}, keep_alive=False)
+                    break
+                body = await reader.readexactly(int(length))
+
+                status, data = await self._dispatch(method.upper(), target, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, data, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Client went away, or sent a line longer than the stream limit
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, data, keep_alive):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"X-Ledger-Version: {self.version}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def run_server(transactions, port=PORT):
+    """Serve transactions on localhost until Ctrl+C"""
+    try:
+        asyncio.run(LedgerServer(transactions).serve(HOST, port))
+    except KeyboardInterrupt:
+        print("\n Server stopped.")
@@ -0,0 +1,45 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def _fsync_directory(directory):
+    """Make a rename in directory durable; not every platform can open a directory"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding=None):
+    """Write a file through a temporary file that replaces it at the end
+
+    The data is fsynced before the rename and the directory after it, so a
+    crash leaves either the old file or the complete new one, never a
+    truncated file. If the block fails the old file is left alone.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            # Keep the permissions of the file being replaced
+            if os.path.exists(path):
+                os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+            else:
+                os.chmod(temp_path, 0o644)
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _fsync_directory(directory)
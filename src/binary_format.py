@@ -0,0 +1,165 @@
+import json
+import struct
+
+import numpy as np
+
+from atomic_file import atomic_write
+from money import CENTS
+from transaction_store import TransactionStore
+
+# Files in the binary format use this suffix
+BINARY_SUFFIX = ".bin"
+
+# File starts with the magic bytes and the length of a small JSON header
+MAGIC = b"PFMLEDG1"
+PREFIX = struct.Struct("<8sI")
+
+# Fixed-width record columns, in file order; amounts are whole cents
+COLUMNS = [
+    ("ids", "<i8"),
+    ("dates", "<i4"),
+    ("types", "i1"),
+    ("categories", "<i4"),
+    ("amounts", "<i8"),
+]
+
+# Files written before amounts were kept in cents have float currency units
+LEGACY_AMOUNTS = "<f8"
+
+
+def _align(offset):
+    """Round an offset up to a multiple of 8 bytes"""
+    return (offset + 7) & ~7
+
+
+class HeapStringTable:
+    """Descriptions decoded on demand from the string heap of a binary file"""
+
+    def __init__(self, offsets, heap):
+        self.offsets = offsets
+        self.heap = heap
+        self._count = len(offsets) - 1
+        # Strings written after loading never touch the mapped heap
+        self._changed = {}
+        self._appended = []
+
+    def append(self, value):
+        self._appended.append(value)
+
+    def __getitem__(self, row):
+        if row >= self._count:
+            return self._appended[row - self._count]
+        if row in self._changed:
+            return self._changed[row]
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return bytes(self.heap[start:end]).decode('utf-8')
+
+    def __setitem__(self, row, value):
+        if row >= self._count:
+            self._appended[row - self._count] = value
+        else:
+            self._changed[row] = value
+
+    def __len__(self):
+        return self._count + len(self._appended)
+
+    def copy(self):
+        # The heap itself is never written to, so the copy can share it
+        table = HeapStringTable(self.offsets, self.heap)
+        table._changed = dict(self._changed)
+        table._appended = list(self._appended)
+        return table
+
+
+def write_binary(transactions, path):
+    """Write the live transactions of a store to a binary file"""
+    rows = transactions.live_rows()
+    columns = {name: transactions.live_column(getattr(transactions, name)).astype(dtype) for name, dtype in COLUMNS}
+
+    encoded = [transactions.descriptions[row].encode('utf-8') for row in rows.tolist()]
+    offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    heap = b"".join(encoded)
+
+    # Lay out the columns one after another, each 8-byte aligned
+    layout = {}
+    position = 0
+    for name, dtype in COLUMNS:
+        layout[name] = position
+        position = _align(position + columns[name].nbytes)
+    layout["description_offsets"] = position
+    position = _align(position + offsets.nbytes)
+    layout["heap"] = position
+
+    header = json.dumps({
+        "count": len(rows),
+        "next_id": transactions.next_id(),
+        "categories": transactions.category_names,
+        "layout": layout,
+        "heap_size": len(heap),
+        "amount_unit": "cents",
+    }, ensure_ascii=False).encode('utf-8')
+    data_start = _align(PREFIX.size + len(header))
+
+    # The old file may still be mapped by this store, so it is replaced
+    # rather than overwritten in place
+    with atomic_write(path, 'wb') as f:
+        f.write(PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        for name, dtype in COLUMNS:
+            f.seek(data_start + layout[name])
+            f.write(columns[name].tobytes())
+        f.seek(data_start + layout["description_offsets"])
+        f.write(offsets.tobytes())
+        f.seek(data_start + layout["heap"])
+        f.write(heap)
+
+
+def _map(path, dtype, offset, count):
+    """Map count values of dtype from the file, copy-on-write"""
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=(count,))
+
+
+def read_binary(path, aggregates=None):
+    """Open a binary file as a TransactionStore without parsing the records
+
+    aggregates is a saved AggregateCache for the file, see finish_bulk().
+    Returns (store, legacy); legacy files hold float amounts, which are
+    converted to cents here, and should be written again.
+    """
+    with open(path, 'rb') as f:
+        magic, header_length = PREFIX.unpack(f.read(PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a ledger file in the binary format.")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+
+    data_start = _align(PREFIX.size + header_length)
+    layout = header["layout"]
+    count = header["count"]
+
+    legacy = header.get("amount_unit") != "cents"
+    columns = {
+        name: _map(path, LEGACY_AMOUNTS if legacy and name == "amounts" else dtype, data_start + layout[name], count)
+        for name, dtype in COLUMNS
+    }
+    if legacy:
+        columns["amounts"] = np.rint(columns["amounts"] * CENTS).astype(np.int64)
+    offsets = _map(path, "<i8", data_start + layout["description_offsets"], count + 1)
+    heap = _map(path, "u1", data_start + layout["heap"], header["heap_size"])
+    if count == 0:
+        offsets = np.zeros(1, dtype="<i8")
+
+    store = TransactionStore.from_columns(
+        ids=columns["ids"],
+        amounts=columns["amounts"],
+        dates=columns["dates"],
+        types=columns["types"],
+        categories=columns["categories"],
+        category_names=header["categories"],
+        descriptions=HeapStringTable(offsets, heap),
+        next_id=header["next_id"],
+        aggregates=aggregates,
+    )
+    return store, legacy
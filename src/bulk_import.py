@@ -0,0 +1,221 @@
+import csv
+import os
+import re
+
+import instrumentation
+from transaction_store import DATE_FORMAT, date_to_ordinal
+from validation import parse_amount, parse_date
+
+# Rows handed to one worker process at a time
+CHUNK_ROWS = 50_000
+
+# Statements with fewer rows are parsed directly; starting worker processes
+# would take longer than parsing them
+PARALLEL_MIN_ROWS = 200_000
+
+# Category for rows that do not have one
+DEFAULT_CATEGORY = "Uncategorized"
+
+# Accepted CSV header names for each field, lowercase
+HEADER_NAMES = {
+    "date": ("date", "transaction date", "posting date", "posted"),
+    "amount": ("amount", "value"),
+    "description": ("description", "memo", "details", "payee", "name"),
+    "category": ("category",),
+    "type": ("type",),
+}
+
+# Bank words for the transaction type
+TYPE_NAMES = {"income": "income", "credit": "income", "expense": "expense", "debit": "expense"}
+
+OFX_SUFFIXES = (".ofx", ".qfx")
+OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+# Commas in an amount only separate thousands, as in 1,234.50
+THOUSANDS = re.compile(r"\d{1,3}(,\d{3})+(\.\d*)?")
+
+
+def _make_transaction(date_text, amount_text, description, category, type_text, date_format):
+    """Validate one statement row and return a transaction dict without id
+
+    Dates and amounts go through the same checks as get_date and get_amount.
+    A signed amount without a type column decides income or expense. A
+    decimal comma, as in 12,50, is refused rather than read as 1250.
+    """
+    amount_text = amount_text.strip()
+    negative = amount_text.startswith("-")
+    digits = amount_text[1:] if amount_text[:1] in ("+", "-") else amount_text
+    if "," in digits:
+        if not THOUSANDS.fullmatch(digits):
+            raise ValueError(f"Invalid amount '{amount_text}', use a point for decimals.")
+        digits = digits.replace(",", "")
+    # One sign at most: parse_amount would take the second one of --5
+    if digits[:1] in ("+", "-"):
+        raise ValueError("Enter a valid amount.")
+    amount = parse_amount(digits)
+
+    type_text = type_text.strip().lower()
+    if type_text:
+        if type_text not in TYPE_NAMES:
+            raise ValueError(f"Unknown transaction type '{type_text}'.")
+        transaction_type = TYPE_NAMES[type_text]
+    else:
+        transaction_type = "expense" if negative else "income"
+
+    try:
+        date = parse_date(date_text.strip(), date_format)
+    except ValueError:
+        raise ValueError(f"Invalid date '{date_text.strip()}'.")
+
+    return {
+        "type": transaction_type,
+        "amount": amount,
+        "category": category.strip() or DEFAULT_CATEGORY,
+        "description": description.strip(),
+        "date": date,
+    }
+
+
+def _parse_csv_chunk(job):
+    """Parse a chunk of CSV lines; returns (transactions, errors)"""
+    lines, first_line, columns, date_format, default_category = job
+    transactions = []
+    errors = []
+    for offset, row in enumerate(csv.reader(lines)):
+        if not row:
+            continue
+
+        def field(name):
+            index = columns.get(name)
+            return row[index] if index is not None and index < len(row) else ""
+
+        try:
+            transactions.append(_make_transaction(
+                field("date"),
+                field("amount"),
+                field("description"),
+                field("category") or default_category,
+                field("type"),
+                date_format,
+            ))
+        except ValueError as e:
+            errors.append((first_line + offset, str(e)))
+    return transactions, errors
+
+
+def _parse_ofx_chunk(job):
+    """Parse a chunk of OFX <STMTTRN> blocks; returns (transactions, errors)"""
+    blocks, first_number, default_category = job
+    transactions = []
+    errors = []
+    for offset, block in enumerate(blocks):
+        fields = {tag.upper(): value.strip() for tag, value in OFX_FIELD.findall(block)}
+        description = fields.get("NAME", "")
+        if fields.get("MEMO"):
+            description = f"{description} {fields['MEMO']}".strip()
+        try:
+            transactions.append(_make_transaction(
+                fields.get("DTPOSTED", "")[:8],
+                fields.get("TRNAMT", ""),
+                description,
+                default_category,
+                "",
+                "%Y%m%d",
+            ))
+        except ValueError as e:
+            errors.append((first_number + offset, str(e)))
+    return transactions, errors
+
+
+def _csv_jobs(text, date_format, default_category):
+    lines = text.splitlines()
+    if not lines:
+        return _parse_csv_chunk, []
+
+    header = next(csv.reader([lines[0]]))
+    names = [name.strip().lower() for name in header]
+    columns = {}
+    for field, accepted in HEADER_NAMES.items():
+        for index, name in enumerate(names):
+            if name in accepted:
+                columns[field] = index
+                break
+    missing = [field for field in ("date", "amount") if field not in columns]
+    if missing:
+        raise ValueError(f"The CSV header has no {' or '.join(missing)} column.")
+
+    # Line numbers in errors count the header as line 1
+    jobs = [
+        (lines[start:start + CHUNK_ROWS], start + 1, columns, date_format, default_category)
+        for start in range(1, len(lines), CHUNK_ROWS)
+    ]
+    return _parse_csv_chunk, jobs
+
+
+def _ofx_jobs(text, default_category):
+    blocks = OFX_TRANSACTION.findall(text)
+    jobs = [
+        (blocks[start:start + CHUNK_ROWS], start + 1, default_category)
+        for start in range(0, len(blocks), CHUNK_ROWS)
+    ]
+    return _parse_ofx_chunk, jobs
+
+
+def dedupe_key(transaction):
+    """Key under which two statement rows count as the same transaction"""
+    return (transaction["date"], transaction["amount"], transaction["description"].strip().lower())
+
+
+def import_file(path, transactions, default_category=DEFAULT_CATEGORY, date_format=DATE_FORMAT):
+    """Parse a CSV or OFX statement and add its new rows to the store
+
+    Returns (added, duplicates, errors): the added transaction dicts, the
+    number of rows skipped as already present, and (line, message) pairs
+    for rows that failed validation. Nothing is written to storage here;
+    the caller commits `added` in one batch.
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        text = f.read()
+    instrumentation.count_bytes(read=os.path.getsize(path))
+
+    if path.lower().endswith(OFX_SUFFIXES) or "<OFX>" in text[:4096].upper():
+        parse_chunk, jobs = _ofx_jobs(text, default_category)
+    else:
+        parse_chunk, jobs = _csv_jobs(text, date_format, default_category)
+    del text
+
+    rows = sum(len(job[0]) for job in jobs)
+    if rows >= PARALLEL_MIN_ROWS and len(jobs) > 1:
+        # Imported here so importing an ordinary statement never loads concurrent.futures
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as pool:
+            results = list(pool.map(parse_chunk, jobs))
+    else:
+        results = [parse_chunk(job) for job in jobs]
+
+    # Rows already in the ledger are skipped; identical rows within one
+    # statement are kept, as two equal purchases on a day are both real.
+    # Only the ledger rows in the statement's date range can match, which
+    # keeps a partitioned ledger from opening every partition
+    ordinals = [date_to_ordinal(transaction["date"]) for parsed, chunk_errors in results for transaction in parsed]
+    seen = set()
+    if ordinals:
+        seen = {dedupe_key(transaction) for transaction in transactions.iter_by_dates(min(ordinals), max(ordinals))}
+    added = []
+    duplicates = 0
+    errors = []
+    for parsed, chunk_errors in results:
+        errors.extend(chunk_errors)
+        for transaction in parsed:
+            key = dedupe_key(transaction)
+            if key in seen:
+                duplicates += 1
+                continue
+            transaction = {"id": transactions.next_id(), **transaction}
+            transactions.append(transaction, bulk=True)
+            added.append(transaction)
+
+    if added:
+        transactions.finish_bulk()
+    return added, duplicates, errors
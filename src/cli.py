@@ -0,0 +1,453 @@
+import argparse
+import json
+import shlex
+import sys
+from datetime import datetime
+
+import aggregation
+import instrumentation
+import main
+from bulk_import import DEFAULT_CATEGORY, import_file
+from money import to_units
+from query import SORT_KEYS, Query
+from stream_loader import LedgerLoadError
+from table_view import page, write_table
+from transaction_store import DATE_FORMAT, TYPES, date_to_ordinal, month_bounds
+from validation import parse_amount, parse_date
+
+
+# Reports of the report command, also served by the API server
+REPORT_KINDS = ("summary", "category", "monthly", "yoy", "running-balance", "expenses")
+
+
+def _amount(text):
+    try:
+        return parse_amount(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _date(text):
+    try:
+        return parse_date(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{text}', use YYYY/MM/DD")
+
+
+def _month(text):
+    try:
+        return datetime.strptime(text, "%Y/%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid month '{text}', use YYYY/MM")
+
+
+def _count(text):
+    try:
+        value = int(text)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"invalid count '{text}', use a whole number of 0 or more")
+    return value
+
+
+def _add_paging(command):
+    command.add_argument("--limit", type=_count, help="show at most this many transactions")
+    command.add_argument("--offset", type=_count, default=0, help="skip this many transactions first")
+
+
+def build_parser():
+    """Return the argument parser for all subcommands"""
+    parser = argparse.ArgumentParser(prog="main.py", description="MhShoghi Financial Manager")
+    parser.add_argument("--data", help="data file to use instead of financial_data.json")
+    parser.add_argument("--trace", choices=instrumentation.MODES, help="time every operation, print totals or every call")
+    parser.add_argument("--profile", metavar="FOLDER", help="write cProfile stats of every command to FOLDER")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("balance", help="show the current balance")
+    command.add_argument("--json", action="store_true", help="print JSON")
+
+    command = commands.add_parser("list", help="show transactions")
+    _add_paging(command)
+    command.add_argument("--json", action="store_true", help="print JSON")
+
+    command = commands.add_parser("add", help="add a transaction")
+    command.add_argument("--type", choices=TYPES, required=True)
+    command.add_argument("--amount", type=_amount, required=True)
+    command.add_argument("--category", required=True)
+    command.add_argument("--description", default="")
+    command.add_argument("--date", type=_date, help="YYYY/MM/DD, today if left out")
+
+    command = commands.add_parser("edit", help="edit fields of a transaction")
+    command.add_argument("id", type=int)
+    command.add_argument("--type", choices=TYPES)
+    command.add_argument("--amount", type=_amount)
+    command.add_argument("--category")
+    command.add_argument("--description")
+    command.add_argument("--date", type=_date)
+
+    command = commands.add_parser("delete", help="delete a transaction")
+    command.add_argument("id", type=int)
+
+    command = commands.add_parser("search", help="search transactions")
+    criteria = command.add_mutually_exclusive_group(required=True)
+    criteria.add_argument("--category")
+    criteria.add_argument("--description")
+    criteria.add_argument("--type", choices=TYPES)
+    criteria.add_argument("--date", type=_date, help="exact day, YYYY/MM/DD")
+    criteria.add_argument("--month", type=_month, help="YYYY/MM")
+    criteria.add_argument("--from", dest="date_from", type=_date, help="start of a date range, use with --to")
+    command.add_argument("--to", dest="date_to", type=_date, help="end of a date range")
+    _add_paging(command)
+    command.add_argument("--json", action="store_true", help="print JSON")
+
+    command = commands.add_parser("query", help="search with several criteria at once")
+    command.add_argument("--category", help="category contains this text")
+    command.add_argument("--description", help="description contains this text")
+    command.add_argument("--type", choices=TYPES)
+    command.add_argument("--from", dest="date_from", type=_date, help="first day, YYYY/MM/DD")
+    command.add_argument("--to", dest="date_to", type=_date, help="last day, YYYY/MM/DD")
+    command.add_argument("--min", dest="amount_min", type=_amount, help="smallest amount")
+    command.add_argument("--max", dest="amount_max", type=_amount, help="largest amount")
+    command.add_argument("--sort", choices=SORT_KEYS, default="date", help="column to sort by (default date)")
+    command.add_argument("--desc", action="store_true", help="sort in descending order")
+    _add_paging(command)
+    command.add_argument("--json", action="store_true", help="print JSON")
+    command.add_argument("--explain", action="store_true", help="print how the query is run")
+
+    command = commands.add_parser("report", help="show a financial report")
+    command.add_argument("kind", choices=REPORT_KINDS)
+    command.add_argument("--top", type=_count, default=aggregation.TOP_EXPENSES, help="largest expenses listed by the expenses report")
+    command.add_argument("--json", action="store_true", help="print JSON")
+
+    command = commands.add_parser("chart", help="save charts to image files without a display")
+    command.add_argument("kind", choices=["pie", "monthly", "balance", "percentiles", "month-pies", "category-trends"])
+    command.add_argument("--out", required=True, help="image file (.png or .svg) for pie, monthly, balance and percentiles, a folder otherwise")
+    command.add_argument("--format", choices=["png", "svg"], default="png", help="image format of a folder of charts")
+    command.add_argument("--workers", type=int, help="processes rendering a folder of charts")
+    command.add_argument("--no-cache", action="store_true", help="render again even if the data did not change")
+
+    command = commands.add_parser("import", help="import a CSV or OFX bank statement")
+    command.add_argument("file")
+    command.add_argument("--category", default=DEFAULT_CATEGORY, help="category for rows without one")
+    command.add_argument("--date-format", default=DATE_FORMAT, help="strptime format of the dates in a CSV file")
+
+    commands.add_parser("rebuild-rollups", help="recompute the saved daily and monthly totals from the transactions")
+
+    command = commands.add_parser("serve", help="serve the ledger as an HTTP/JSON API on localhost")
+    command.add_argument("--port", type=int, default=8765, help="port to listen on (default 8765)")
+
+    command = commands.add_parser("batch", help="run the commands in a file, one per line")
+    command.add_argument("file", help="command file, '-' for standard input")
+    return parser
+
+
+def _print_json(data):
+    print(json.dumps(data, ensure_ascii=False, indent=4))
+
+
+def json_rows(transactions):
+    """Transaction dicts for JSON output, amounts in currency units"""
+    return [{**t, "amount": to_units(t["amount"])} for t in transactions]
+
+
+def run_search(transactions, args):
+    """Return (results, title) of the search chosen by args, as parsed by the search command"""
+    if args.category:
+        return transactions.find_by_category(args.category), f"Show results for category '{args.category}'"
+    if args.description:
+        return transactions.find_by_description(args.description), f"Show results for keyword '{args.description}'"
+    if args.type:
+        return transactions.find_by_type(args.type), f"Show results for type '{args.type}'"
+
+    if args.date:
+        first = last = date_to_ordinal(args.date)
+        title = f"Show results for date '{args.date}'"
+    elif args.month:
+        first, last = month_bounds(args.month.year, args.month.month)
+        title = f"Show results for month '{args.month.strftime('%Y/%m')}'"
+    else:
+        if not args.date_to:
+            raise ValueError("--from needs --to")
+        first, last = date_to_ordinal(args.date_from), date_to_ordinal(args.date_to)
+        title = f"Show results from '{args.date_from}' to '{args.date_to}'"
+    return list(transactions.iter_by_dates(first, last)), title
+
+
+def balance_json(transactions):
+    """Income, expense and balance in currency units"""
+    totals = aggregation.type_totals(transactions)
+    income, expense = totals["income"][0], totals["expense"][0]
+    return {"income": to_units(income), "expense": to_units(expense), "balance": to_units(income - expense)}
+
+
+def report_json(transactions, kind, top=aggregation.TOP_EXPENSES):
+    """Data of one of REPORT_KINDS, amounts in currency units"""
+    if kind == "summary":
+        totals = aggregation.type_totals(transactions)
+        income, income_count = totals["income"]
+        expense, expense_count = totals["expense"]
+        return {
+            "income": to_units(income),
+            "income_count": income_count,
+            "expense": to_units(expense),
+            "expense_count": expense_count,
+            "balance": to_units(income - expense),
+            "savings_ratio": (income - expense) / income * 100 if income > 0 else None,
+        }
+    if kind == "category":
+        return {
+            transaction_type: [
+                {"category": category, "amount": to_units(amount), "percentage": percentage}
+                for category, amount, percentage in aggregation.category_totals(transactions, transaction_type)
+            ]
+            for transaction_type in TYPES
+        }
+    if kind == "monthly":
+        return [
+            {
+                "month": month,
+                "income": to_units(income),
+                "expense": to_units(expense),
+                "balance": to_units(income - expense),
+            }
+            for month, income, expense in aggregation.monthly_totals(transactions)
+        ]
+    if kind == "running-balance":
+        return [
+            {
+                "date": day,
+                "balance": to_units(balance),
+                **{
+                    f"average_{window}": to_units(round(average))
+                    for window, average in zip(aggregation.ROLLING_WINDOWS, averages)
+                },
+            }
+            for day, balance, averages in aggregation.balance_over_time(transactions)
+        ]
+    if kind == "expenses":
+        largest, percentiles = aggregation.expense_distribution(transactions, top)
+        return {
+            "largest": json_rows(largest),
+            "percentiles": [
+                {
+                    "category": category,
+                    "count": count,
+                    **{
+                        aggregation.percentile_name(q): to_units(amount)
+                        for q, amount in zip(aggregation.QUANTILES, amounts)
+                    },
+                }
+                for category, count, amounts in percentiles
+            ],
+        }
+    return [
+        {
+            "year": year,
+            "income": to_units(income),
+            "expense": to_units(expense),
+            "balance": to_units(income - expense),
+            "income_change": income_change,
+            "expense_change": expense_change,
+        }
+        for year, income, expense, income_change, expense_change in aggregation.year_over_year(transactions)
+    ]
+
+
+def _run_report(transactions, args):
+    if args.json:
+        _print_json(report_json(transactions, args.kind, args.top))
+    elif args.kind == "summary":
+        main.show_summary_report(transactions)
+    elif args.kind == "category":
+        main.show_category_report(transactions)
+    elif args.kind == "monthly":
+        main.show_monthly_report(transactions)
+    elif args.kind == "running-balance":
+        main.show_balance_over_time_report(transactions)
+    elif args.kind == "expenses":
+        main.show_expense_distribution_report(transactions, args.top)
+    else:
+        main.show_year_over_year_report(transactions)
+
+
+def execute(transactions, args):
+    """Run one parsed command against a loaded ledger"""
+    if args.command == "balance":
+        if args.json:
+            _print_json(balance_json(transactions))
+        else:
+            main.show_balance(transactions)
+
+    elif args.command == "list":
+        rows = transactions.iter_rows(args.offset, args.limit)
+        if args.json:
+            _print_json(json_rows(rows))
+        elif not transactions:
+            print("No transaction found.")
+        else:
+            write_table(rows)
+
+    elif args.command == "add":
+        transaction = {
+            "id": transactions.next_id(),
+            "type": args.type,
+            "amount": args.amount,
+            "category": args.category,
+            "description": args.description,
+            "date": args.date or datetime.now().strftime(DATE_FORMAT),
+        }
+        transactions.append(transaction)
+        main.record_change(transactions, "add", transaction)
+        print(f"✅ Transaction {transaction['id']} added.")
+
+    elif args.command == "edit":
+        transaction = transactions.get(args.id)
+        if transaction is None:
+            raise ValueError(f"Transaction with ID {args.id} not found")
+        for field in ("type", "amount", "category", "description", "date"):
+            value = getattr(args, field)
+            if value is not None:
+                transaction[field] = value
+        transactions.update(transaction)
+        main.record_change(transactions, "edit", transaction)
+        print(f"✅ Transaction {args.id} updated.")
+
+    elif args.command == "delete":
+        if not transactions.remove(args.id):
+            raise ValueError(f"Transaction with ID {args.id} not found")
+        main.record_change(transactions, "delete", {"id": args.id})
+        print(f"✅ Transaction {args.id} deleted.")
+
+    elif args.command == "search":
+        results, title = run_search(transactions, args)
+        count = len(results)
+        results = page(results, args.offset, args.limit)
+        if args.json:
+            _print_json(json_rows(results))
+        else:
+            main.show_search_results(results, title, count, page_size=None)
+
+    elif args.command == "query":
+        query = Query(
+            args.category, args.description, args.type, args.date_from, args.date_to,
+            args.amount_min, args.amount_max, args.sort, args.desc, args.offset, args.limit,
+        )
+        results, count, plan = transactions.query(query)
+        if args.explain:
+            print(f"Plan: {plan}", file=sys.stderr)
+        if args.json:
+            _print_json(json_rows(results))
+        else:
+            main.show_search_results(results, f"Show results for {query.describe()}", count, page_size=None)
+
+    elif args.command == "report":
+        _run_report(transactions, args)
+
+    elif args.command == "chart":
+        # Imported here so other commands never load matplotlib
+        from finance_charts import create_chart_manager
+        chart_manager = create_chart_manager()
+        if not chart_manager.check_matplotlib():
+            raise ValueError("matplotlib is needed for charts")
+        use_cache = not args.no_cache
+        if args.kind == "pie":
+            chart_manager.plot_expense_pie_chart(transactions, args.out, use_cache)
+        elif args.kind == "monthly":
+            chart_manager.plot_income_vs_expense(transactions, args.out, use_cache)
+        elif args.kind == "balance":
+            chart_manager.plot_balance_over_time(transactions, args.out, use_cache)
+        elif args.kind == "percentiles":
+            chart_manager.plot_spending_percentiles(transactions, args.out, use_cache)
+        elif args.kind == "month-pies":
+            chart_manager.save_month_pies(transactions, args.out, args.format, args.workers, use_cache)
+        else:
+            chart_manager.save_category_trends(transactions, args.out, args.format, args.workers, use_cache)
+
+    elif args.command == "import":
+        added, duplicates, errors = import_file(args.file, transactions, args.category, args.date_format)
+        if added:
+            main.record_batch(transactions, "add", added)
+        print(f"✅ {len(added)} transactions imported, {duplicates} duplicates skipped, {len(errors)} invalid rows.")
+        for line, message in errors:
+            print(f"  Line {line}: {message}", file=sys.stderr)
+
+    elif args.command == "rebuild-rollups":
+        main.storage.rebuild_rollups(transactions)
+        print(f"✅ Daily and monthly totals rebuilt from {len(transactions)} transactions.")
+
+    elif args.command == "serve":
+        # Imported here so other commands never load asyncio
+        from api_server import run_server
+        run_server(transactions, args.port)
+
+    elif args.command == "batch":
+        return run_batch(transactions, args.file)
+
+    main.storage.commit()
+    return 0
+
+
+def run_batch(transactions, path):
+    """Run every command line of a file against the same ledger
+
+    Blank lines and lines starting with # are skipped. A failing command is
+    reported and the batch goes on; the exit status is 1 if any failed.
+    """
+    parser = build_parser()
+    f = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8')
+    failed = 0
+    try:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                args = parser.parse_args(shlex.split(line))
+                if args.command in ("batch", "serve") or args.data or args.trace or args.profile:
+                    raise ValueError("batch, serve, --data, --trace and --profile cannot be used inside a batch")
+                with instrumentation.operation(f"command {args.command}"):
+                    execute(transactions, args)
+            except SystemExit:
+                # argparse already printed the problem
+                failed += 1
+            except (ValueError, OSError) as e:
+                print(f"❌ Line {line_number}: {e}", file=sys.stderr)
+                failed += 1
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return 1 if failed else 0
+
+
+def run(argv):
+    """Entry point for `python main.py <command> ...`; returns the exit status"""
+    args = build_parser().parse_args(argv)
+    if args.data:
+        main.use_data_file(args.data)
+    if args.trace or args.profile:
+        instrumentation.configure(args.trace, args.profile)
+
+    try:
+        with instrumentation.operation("load_data") as record:
+            transactions = main.open_data_file().load()
+            if record is not None:
+                record["rows"] = len(transactions)
+    except LedgerLoadError as e:
+        print(f"❌ Error in loading data from {main.DATA_FILE}: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        with instrumentation.operation(f"command {args.command}"):
+            status = execute(transactions, args)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        status = 1
+
+    # Waits for the background writer, so the changes are on disk on exit
+    try:
+        main.storage.close()
+    except OSError as e:
+        print(f"❌ Error in saving transactions: {e}", file=sys.stderr)
+        status = 1
+    return status
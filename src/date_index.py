@@ -0,0 +1,54 @@
+from bisect import bisect_left, insort
+
+import numpy as np
+
+# Each entry packs (date ordinal, row) into one int, so a plain sorted list
+# of ints is ordered by date and then by row
+ROW_BITS = 32
+ROW_MASK = (1 << ROW_BITS) - 1
+
+
+class DateIndex:
+    """Rows kept sorted by date ordinal for range lookups"""
+
+    def __init__(self):
+        self.keys = []
+
+    def build(self, rows, ordinals):
+        """Build the index in one sort from arrays of rows and their ordinals"""
+        keys = (ordinals.astype(np.int64) << ROW_BITS) | rows.astype(np.int64)
+        self.keys = np.sort(keys).tolist()
+
+    def add(self, row, ordinal):
+        key = (ordinal << ROW_BITS) | row
+        # Transactions are usually entered in date order, which is a cheap append
+        if not self.keys or key > self.keys[-1]:
+            self.keys.append(key)
+        else:
+            insort(self.keys, key)
+
+    def remove(self, row, ordinal):
+        key = (ordinal << ROW_BITS) | row
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+
+    def _bounds(self, first, last):
+        """Return the slice of keys for ordinals in [first, last]
+
+        A reversed range, with last before first, is an empty slice.
+        """
+        low = bisect_left(self.keys, first << ROW_BITS)
+        high = bisect_left(self.keys, (last + 1) << ROW_BITS)
+        return low, max(low, high)
+
+    def count(self, first, last):
+        """Count rows dated between first and last ordinals (inclusive)"""
+        low, high = self._bounds(first, last)
+        return high - low
+
+    def rows(self, first, last):
+        """Yield rows dated between first and last ordinals in date order"""
+        low, high = self._bounds(first, last)
+        for position in range(low, high):
+            yield self.keys[position] & ROW_MASK
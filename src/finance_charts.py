@@ -1,12 +1,249 @@
-import numpy as np
-from matplotlib import rcParams
+import hashlib
+import json
+import os
+import re
+import shutil
 
-try:
-    import matplotlib.pyplot as plt
-    import matplotlib.font_manager as fm
-    HAS_MATPLOTLIB = True
-except ImportError:
-    HAS_MATPLOTLIB = False
+import aggregation
+import instrumentation
+from money import to_units
+
+# numpy and matplotlib are imported on first use by _load_plotting, so
+# starting the manager does not pay for the plotting imports
+np = None
+cm = None
+Figure = None
+plt = None
+
+# Image formats charts can be saved as
+IMAGE_FORMATS = ("png", "svg")
+
+# Rendered images are kept here, named by a hash of their data and options
+CHART_CACHE_DIR = os.environ.get("FINANCE_CHART_CACHE", ".chart_cache")
+
+# Bump when the drawing code changes so older cached images are not served
+CACHE_VERSION = 1
+
+# Fewer charts are drawn one after another, as every worker process would
+# first have to import matplotlib again
+PARALLEL_MIN_CHARTS = 4
+
+
+def _load_plotting(pyplot=True):
+    """Import numpy and matplotlib once; return False if they are not installed
+
+    Saving to a file draws on a bare Figure with the Agg canvas and needs no
+    pyplot, so it works without a display and leaves the GUI backend alone.
+    """
+    global np, cm, Figure, plt
+    try:
+        if Figure is None:
+            import numpy as np
+            from matplotlib import cm
+            from matplotlib.figure import Figure
+        if pyplot and plt is None:
+            import matplotlib.pyplot as plt
+    except ImportError:
+        return False
+    return True
+
+
+def _draw_pie(fig, data, options):
+    """ایجاد نمودار دایره‌ای"""
+    categories = [category for category, amount in data]
+    amounts = [amount for category, amount in data]
+
+    # ایجاد طیف رنگی
+    if options["color_scheme"] == 'green':
+        colors = cm.Greens(np.linspace(0.5, 0.8, len(categories)))
+    else:
+        colors = cm.Reds(np.linspace(0.5, 0.8, len(categories)))
+
+    ax = fig.add_subplot()
+    patches, texts, autotexts = ax.pie(
+        amounts,
+        labels=categories,
+        autopct='%1.1f%%',
+        startangle=90,
+        colors=colors,
+        textprops={'fontsize': 12}
+    )
+
+    # بهبود نمایش اعداد و متن
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontweight('bold')
+
+    ax.set_title(options["title"], fontsize=16, fontweight='bold', pad=20)
+    ax.axis('equal')
+
+
+def _draw_monthly(fig, data, options):
+    """Income and expense bars side by side for each month"""
+    months = [month for month, income, expense in data]
+    incomes = [income for month, income, expense in data]
+    expenses = [expense for month, income, expense in data]
+
+    ax = fig.add_subplot()
+    x = np.arange(len(months))
+
+    ax.bar(x - 0.2, incomes, width=0.4, label="Income", color="green", alpha=0.7)
+    ax.bar(x + 0.2, expenses, width=0.4, label="Expense", color="red", alpha=0.7)
+
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Amount ($)")
+    ax.set_title(options["title"])
+
+    ax.set_xticks(x, months, rotation=45)
+    ax.legend()
+
+
+def _draw_trend(fig, data, options):
+    """One bar per month for a single series"""
+    months = [month for month, amount in data]
+    amounts = [amount for month, amount in data]
+
+    ax = fig.add_subplot()
+    x = np.arange(len(months))
+    ax.bar(x, amounts, width=0.6, color=options["color"], alpha=0.7)
+
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Amount ($)")
+    ax.set_title(options["title"])
+    ax.set_xticks(x, months, rotation=45)
+
+
+def _draw_balance(fig, data, options):
+    """Running balance line with rolling average spending on a second axis"""
+    days = np.array([day for day, *values in data], dtype="datetime64[D]")
+
+    ax = fig.add_subplot()
+    lines = ax.plot(days, [values[0] for day, *values in data], color="green", label="Balance")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Balance ($)")
+
+    spending = ax.twinx()
+    for index, (window, color) in enumerate(zip(options["windows"], ("orange", "red")), start=1):
+        lines += spending.plot(
+            days, [values[index] for day, *values in data],
+            color=color, alpha=0.7, label=f"{window}-day average spending",
+        )
+    spending.set_ylabel("Spending per day ($)")
+
+    ax.set_title(options["title"])
+    ax.legend(lines, [line.get_label() for line in lines], loc="upper left")
+
+
+def _draw_percentiles(fig, data, options):
+    """Bars of each spending percentile side by side for each category"""
+    categories = [category for category, *amounts in data]
+    labels = options["labels"]
+
+    ax = fig.add_subplot()
+    x = np.arange(len(categories))
+    width = 0.8 / len(labels)
+    colors = cm.Reds(np.linspace(0.4, 0.8, len(labels)))
+    for index, (label, color) in enumerate(zip(labels, colors)):
+        offset = (index - (len(labels) - 1) / 2) * width
+        ax.bar(x + offset, [amounts[index] for category, *amounts in data], width=width, label=label, color=color)
+
+    ax.set_xlabel("Category")
+    ax.set_ylabel("Amount ($)")
+    ax.set_title(options["title"])
+    ax.set_xticks(x, categories, rotation=45)
+    ax.legend()
+
+
+# Drawing function and figure size for each chart kind
+DRAWERS = {
+    "pie": (_draw_pie, (12, 8)),
+    "monthly": (_draw_monthly, (12, 6)),
+    "trend": (_draw_trend, (12, 6)),
+    "balance": (_draw_balance, (12, 6)),
+    "percentiles": (_draw_percentiles, (12, 6)),
+}
+
+
+def _image_format(path):
+    """Return the image format for a file name, from its suffix"""
+    image_format = os.path.splitext(path)[1].lstrip(".").lower()
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Cannot save a chart as '{path}'. Use a .png or .svg file.")
+    return image_format
+
+
+def _cache_path(kind, data, options, image_format):
+    """Cache file for a chart; equal data and options give the same file"""
+    payload = json.dumps([CACHE_VERSION, kind, data, options], sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return os.path.join(CHART_CACHE_DIR, f"{digest}.{image_format}")
+
+
+def _serve_from_cache(job):
+    """Copy a cached image to the job's output file; return False on a miss"""
+    kind, data, options, out, use_cache = job
+    if not use_cache:
+        return False
+    cached = _cache_path(kind, data, options, _image_format(out))
+    if not os.path.exists(cached):
+        return False
+    shutil.copyfile(cached, out)
+    return True
+
+
+def render_chart(job):
+    """Render one (kind, data, options, out, use_cache) chart to an image file
+
+    data must be made of lists, numbers and strings so it hashes the same
+    way every time. Returns True if the image came from the render cache.
+    """
+    if _serve_from_cache(job):
+        return True
+
+    kind, data, options, out, use_cache = job
+    image_format = _image_format(out)
+    if not _load_plotting(pyplot=False):
+        raise ValueError("matplotlib is needed for charts")
+
+    draw, figsize = DRAWERS[kind]
+    fig = Figure(figsize=figsize)
+    draw(fig, data, options)
+    fig.tight_layout()
+
+    if not use_cache:
+        fig.savefig(out, format=image_format)
+        return False
+
+    # Written under a temporary name first so a reader never sees half an image
+    cached = _cache_path(kind, data, options, image_format)
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    temporary = f"{cached}.{os.getpid()}.tmp"
+    fig.savefig(temporary, format=image_format)
+    os.replace(temporary, cached)
+    shutil.copyfile(cached, out)
+    return False
+
+
+def render_batch(jobs, workers=None):
+    """Render many charts, in a process pool when there are enough to draw
+
+    Returns the number of charts served from the cache.
+    """
+    pending = [job for job in jobs if not _serve_from_cache(job)]
+    if len(pending) >= PARALLEL_MIN_CHARTS and workers != 1:
+        # Imported here so saving a single chart never loads concurrent.futures
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render_chart, pending))
+    else:
+        for job in pending:
+            render_chart(job)
+    return len(jobs) - len(pending)
+
+
+def _file_name(text):
+    """Make a category or month usable as part of a file name"""
+    return re.sub(r"[^\w-]+", "_", text).strip("_") or "unnamed"
 
 
 class FinanceCharts:
@@ -17,7 +254,7 @@ class FinanceCharts:
 
     def check_matplotlib(self):
         """Check matplotlib library installation."""
-        if not HAS_MATPLOTLIB:
+        if not _load_plotting(pyplot=False):
             print("The matplotlib library is not installed. Install it.")
             print("pip install matplotlib")
             return False
@@ -36,101 +273,175 @@ class FinanceCharts:
             print("\n--- Financial charts ---")
             print("1. Expense circular charts")
             print("2. Income vs. Expense Comparison ")
-            print("4. Back to main menu")
+            print("3. Balance over time")
+            print("4. Spending percentiles by category")
+            print("5. Save all charts to files")
+            print("6. Back to main menu")
 
 
             choice = input("Choose your input: ")
 
             if choice == "1":
                 self.plot_expense_pie_chart(transactions)
-            if choice == "2":
+            elif choice == "2":
                 self.plot_income_vs_expense(transactions)
+            elif choice == "3":
+                self.plot_balance_over_time(transactions)
             elif choice == "4":
+                self.plot_spending_percentiles(transactions)
+            elif choice == "5":
+                self.save_all_charts(transactions)
+            elif choice == "6":
                 break
             else:
                 print("Invalid input")
 
-    def plot_expense_pie_chart(self, transactions):
+    @instrumentation.instrumented
+    def plot_expense_pie_chart(self, transactions, out=None, use_cache=True):
         """Plot Expense Pie"""
-        expense_by_category = {}
-        for transaction in transactions:
-            if transaction['type'] == 'expense':
-                expense_by_category[transaction['category']] = expense_by_category.get(transaction['category'], 0) + transaction['amount']
-
+        expense_by_category = [
+            [category, to_units(amount)]
+            for category, amount, percentage in aggregation.category_totals(transactions, 'expense')
+        ]
+        if not expense_by_category:
+            print("No expense found")
+            return
 
-        self._create_pie_chart(
-            expense_by_category,
-            "Distribution expenses by category",
-            "red"
-        )
+        options = {"title": "Distribution expenses by category", "color_scheme": "red"}
+        self._output("pie", expense_by_category, options, out, use_cache)
 
-    def plot_income_vs_expense(self, transactions):
+    @instrumentation.instrumented
+    def plot_income_vs_expense(self, transactions, out=None, use_cache=True):
         """Comparison between income and expense"""
-        monthly_data = {}
-        for t in transactions:
-            year_month = t['date'][:7]
-            if year_month not in monthly_data:
-                monthly_data[year_month] = {'income': 0, 'expense': 0}
-
-            if t['type'] == 'income':
-                monthly_data[year_month]['income'] += t['amount']
-            else:
-                monthly_data[year_month]['expense'] += t['amount']
+        monthly_data = [
+            [month, to_units(income), to_units(expense)]
+            for month, income, expense in aggregation.monthly_totals(transactions)
+        ]
 
         if not monthly_data:
             print("No monthly data found")
             return
 
-        months = sorted(monthly_data.keys())
-        incomes = [monthly_data[m]['income'] for m in months]
-        expenses = [monthly_data[m]['expense'] for m in months]
+        options = {"title": "Comparison between income and expenses in different months"}
+        self._output("monthly", monthly_data, options, out, use_cache)
 
-        plt.figure(figsize=(12, 6))
-        x = np.arange(len(months))
+    @instrumentation.instrumented
+    def plot_balance_over_time(self, transactions, out=None, use_cache=True):
+        """Running balance and rolling average spending per day"""
+        daily_data = [
+            [day.replace("/", "-"), to_units(balance), *[to_units(round(average)) for average in averages]]
+            for day, balance, averages in aggregation.balance_over_time(transactions)
+        ]
 
-        plt.bar(x - 0.2, incomes, width=0.4, label="Income", color="green", alpha=0.7)
-        plt.bar(x + 0.2, expenses, width=0.4, label="Expense", color="red", alpha=0.7)
+        if not daily_data:
+            print("No daily data found")
+            return
 
-        plt.xlabel("Month")
-        plt.ylabel("Amount ($)")
-        plt.title("Comparison between income and expenses in different months")
+        options = {"title": "Balance and average daily spending over time", "windows": list(aggregation.ROLLING_WINDOWS)}
+        self._output("balance", daily_data, options, out, use_cache)
 
-        plt.xticks(x, months, rotation=45)
-        plt.legend()
-        plt.tight_layout()
-        plt.show()
+    @instrumentation.instrumented
+    def plot_spending_percentiles(self, transactions, out=None, use_cache=True):
+        """Spending percentiles of each expense category"""
+        largest, percentiles = aggregation.expense_distribution(transactions, top=0)
+        percentile_data = [
+            [category, *[to_units(amount) for amount in amounts]]
+            for category, count, amounts in percentiles
+        ]
 
-    def _create_pie_chart(self, data, title, color_scheme):
-        """ایجاد نمودار دایره‌ای"""
-        categories = list(data.keys())
-        amounts = list(data.values())
-
-        # ایجاد طیف رنگی
-        if color_scheme == 'green':
-            colors = plt.cm.Greens(np.linspace(0.5, 0.8, len(categories)))
-        else:
-            colors = plt.cm.Reds(np.linspace(0.5, 0.8, len(categories)))
-
-        plt.figure(figsize=(12, 8))
-        patches, texts, autotexts = plt.pie(
-            amounts,
-            labels=categories,
-            autopct='%1.1f%%',
-            startangle=90,
-            colors=colors,
-            textprops={'fontsize': 12}
-        )
+        if not percentile_data:
+            print("No expense found")
+            return
+
+        options = {
+            "title": "Spending percentiles by category",
+            "labels": [aggregation.percentile_name(q) for q in aggregation.QUANTILES],
+        }
+        self._output("percentiles", percentile_data, options, out, use_cache)
 
-        # بهبود نمایش اعداد و متن
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
+    @instrumentation.instrumented
+    def save_month_pies(self, transactions, directory, image_format="png", workers=None, use_cache=True):
+        """Save one expense pie chart per month; returns the file names"""
+        by_month = {}
+        for (month, transaction_type, category), (total, count) in aggregation.group_totals(
+            transactions, ("month", "type", "category")
+        ).items():
+            if transaction_type == "expense":
+                by_month.setdefault(month, []).append([category, to_units(total)])
 
-        plt.title(title, fontsize=16, fontweight='bold', pad=20)
-        plt.axis('equal')
-        plt.tight_layout()
+        jobs = []
+        for month, data in sorted(by_month.items()):
+            data.sort(key=lambda x: x[1], reverse=True)
+            options = {"title": f"Expenses by category in {month}", "color_scheme": "red"}
+            out = os.path.join(directory, f"expenses_{_file_name(month)}.{image_format}")
+            jobs.append(("pie", data, options, out, use_cache))
+        return self._output_batch(jobs, directory, workers)
+
+    @instrumentation.instrumented
+    def save_category_trends(self, transactions, directory, image_format="png", workers=None, use_cache=True):
+        """Save one monthly expense chart per category; returns the file names"""
+        by_category = {}
+        for (category, transaction_type, month), (total, count) in aggregation.group_totals(
+            transactions, ("category", "type", "month")
+        ).items():
+            if transaction_type == "expense":
+                by_category.setdefault(category, []).append([month, to_units(total)])
+
+        jobs = []
+        used_names = set()
+        for category, data in sorted(by_category.items()):
+            data.sort()
+            # Categories that only differ in punctuation still get their own file
+            name = _file_name(category)
+            while name in used_names:
+                name += "_"
+            used_names.add(name)
+            options = {"title": f"Monthly expenses for {category}", "color": "red"}
+            out = os.path.join(directory, f"category_{name}.{image_format}")
+            jobs.append(("trend", data, options, out, use_cache))
+        return self._output_batch(jobs, directory, workers)
+
+    def save_all_charts(self, transactions):
+        """Ask for a folder and save every chart into it"""
+        directory = input("Folder for the charts (default: charts): ").strip() or "charts"
+        image_format = input("Image format, png or svg (default: png): ").strip().lower() or "png"
+        if image_format not in IMAGE_FORMATS:
+            print("Invalid format. Use png or svg.")
+            return
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.plot_expense_pie_chart(transactions, os.path.join(directory, f"expenses.{image_format}"))
+            self.plot_income_vs_expense(transactions, os.path.join(directory, f"monthly.{image_format}"))
+            self.plot_balance_over_time(transactions, os.path.join(directory, f"balance.{image_format}"))
+            self.plot_spending_percentiles(transactions, os.path.join(directory, f"percentiles.{image_format}"))
+            self.save_month_pies(transactions, directory, image_format)
+            self.save_category_trends(transactions, directory, image_format)
+        except OSError as e:
+            print(f"❌ Could not save charts: {e}")
+
+    def _output(self, kind, data, options, out, use_cache):
+        """Show a chart in a window, or render it to the file out"""
+        if out:
+            cached = render_chart((kind, data, options, out, use_cache))
+            instrumentation.count_bytes(written=os.path.getsize(out))
+            print(f"Chart saved to {out}" + (" (unchanged, from cache)" if cached else ""))
+            return
+
+        _load_plotting()
+        draw, figsize = DRAWERS[kind]
+        fig = plt.figure(figsize=figsize)
+        draw(fig, data, options)
+        fig.tight_layout()
         plt.show()
 
+    def _output_batch(self, jobs, directory, workers):
+        os.makedirs(directory, exist_ok=True)
+        cached = render_batch(jobs, workers)
+        instrumentation.count_bytes(written=sum(os.path.getsize(job[3]) for job in jobs))
+        print(f"{len(jobs)} charts saved to {directory} ({cached} unchanged, from cache)")
+        return [job[3] for job in jobs]
+
 
 def create_chart_manager():
-    return FinanceCharts()
\ No newline at end of file
+    return FinanceCharts()
@@ -0,0 +1,177 @@
+import atexit
+import cProfile
+import functools
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# "summary" prints totals per operation at exit; "calls" also prints every call as it ends
+MODES = ("summary", "calls")
+
+# Set by configure(); None means instrumentation is off and costs one check per call
+_mode = None
+_profile_dir = None
+_profile_count = 0
+_summary_registered = False
+
+# Operations running right now, outermost first; bytes are counted for all of them
+_active = []
+
+# name -> [calls, seconds, slowest call, rows, bytes read, bytes written]
+_totals = {}
+
+
+def configure(mode=None, profile_dir=None):
+    """Turn instrumentation on or off
+
+    mode is 'summary' or 'calls'. With profile_dir every outermost operation
+    also runs under cProfile and its stats are written there as a .prof file.
+    """
+    global _mode, _profile_dir, _summary_registered
+    if mode is not None and mode not in MODES:
+        raise ValueError(f"Unknown trace mode '{mode}'. Use one of {', '.join(MODES)}")
+
+    _mode = mode or ("summary" if profile_dir else None)
+    _profile_dir = profile_dir
+    if _profile_dir:
+        os.makedirs(_profile_dir, exist_ok=True)
+    if _mode and not _summary_registered:
+        atexit.register(print_summary)
+        _summary_registered = True
+
+
+def enabled():
+    return _mode is not None
+
+
+def count_bytes(read=0, written=0):
+    """Add bytes read from or written to disk to every running operation"""
+    for record in _active:
+        record["read"] += read
+        record["written"] += written
+
+
+@contextmanager
+def profiled(path):
+    """Run the block under cProfile and write its stats to path"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+@contextmanager
+def operation(name, rows=None):
+    """Time a block as one call of the operation name
+
+    Yields a record whose "rows" the block can fill in, or None when
+    instrumentation is off.
+    """
+    global _profile_count
+    if _mode is None:
+        yield None
+        return
+
+    record = {"name": name, "rows": rows, "read": 0, "written": 0}
+    profiler = None
+    # cProfile cannot nest, so only outermost operations are profiled
+    if _profile_dir and not _active:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    _active.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start
+        _active.pop()
+        if profiler is not None:
+            profiler.disable()
+            _profile_count += 1
+            file_name = f"{_profile_count:04d}-{name.replace(' ', '_')}.prof"
+            profiler.dump_stats(os.path.join(_profile_dir, file_name))
+        _finish(record, elapsed)
+
+
+def _rows(args, result):
+    """Rows an operation worked on: the length of its ledger argument or result"""
+    for value in args + (result,):
+        if hasattr(value, "__len__") and not isinstance(value, str):
+            return len(value)
+    return None
+
+
+def instrumented(function):
+    """Time every call of function as an operation named after it"""
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _mode is None:
+            return function(*args, **kwargs)
+        with operation(name) as record:
+            result = function(*args, **kwargs)
+            record["rows"] = _rows(args, result)
+            return result
+
+    return wrapper
+
+
+def _size(count):
+    if count < 1024:
+        return f"{count} B"
+    if count < 1024 * 1024:
+        return f"{count / 1024:.1f} KB"
+    return f"{count / (1024 * 1024):.1f} MB"
+
+
+def _finish(record, elapsed):
+    totals = _totals.setdefault(record["name"], [0, 0.0, 0.0, 0, 0, 0])
+    totals[0] += 1
+    totals[1] += elapsed
+    totals[2] = max(totals[2], elapsed)
+    totals[3] += record["rows"] or 0
+    totals[4] += record["read"]
+    totals[5] += record["written"]
+
+    if _mode == "calls":
+        indent = "  " * len(_active)
+        rows = "" if record["rows"] is None else f"  rows {record['rows']}"
+        print(
+            f"[trace] {indent}{record['name']:<32} {elapsed * 1000:>10.2f} ms{rows}"
+            f"  read {_size(record['read'])}  written {_size(record['written'])}",
+            file=sys.stderr,
+        )
+
+
+def print_summary():
+    """Print the totals of every operation, slowest first"""
+    if not _totals:
+        return
+    lines = [
+        "\n--- Timing summary ---",
+        f"{'Operation':<32} {'Calls':>6} {'Total ms':>10} {'Max ms':>10} {'Rows':>10} {'Read':>10} {'Written':>10}",
+        "-" * 94,
+    ]
+    for name, (calls, seconds, slowest, rows, read, written) in sorted(
+        _totals.items(), key=lambda x: x[1][1], reverse=True
+    ):
+        lines.append(
+            f"{name:<32} {calls:>6} {seconds * 1000:>10.2f} {slowest * 1000:>10.2f} {rows:>10}"
+            f" {_size(read):>10} {_size(written):>10}"
+        )
+    if _profile_dir:
+        lines.append(f"cProfile stats written to {_profile_dir}")
+    print("\n".join(lines), file=sys.stderr)
+
+
+# FINANCE_TRACE=summary|calls and FINANCE_PROFILE=<folder> turn it on for every run
+try:
+    configure(os.environ.get("FINANCE_TRACE") or None, os.environ.get("FINANCE_PROFILE") or None)
+except ValueError as e:
+    print(f"Instrumentation is off: {e}", file=sys.stderr)
@@ -0,0 +1,110 @@
+import json
+import os
+
+import instrumentation
+from money import from_record, to_record
+
+# Number of journal records after which the journal is folded into the snapshot
+COMPACT_THRESHOLD = 1000
+
+# Fields every added or edited transaction in the journal has
+FIELDS = {"id", "type", "amount", "category", "description", "date"}
+
+
+def journal_path(data_file):
+    """Return the journal file that belongs to a data file"""
+    return os.path.splitext(data_file)[0] + ".journal"
+
+
+def _parse_record(line):
+    """Return (op, transaction or next id) of a journal line, or None if it is damaged"""
+    try:
+        record = json.loads(line)
+        op = record["op"]
+        if op == "reserve":
+            return op, int(record["next_id"])
+        # Older journals have amounts in currency units
+        transaction = from_record(record["transaction"])
+        if op == "delete":
+            return op, {"id": int(transaction["id"])}
+        if op in ("add", "edit") and FIELDS <= transaction.keys():
+            return op, transaction
+    except (ValueError, KeyError, TypeError, AttributeError):
+        pass
+    return None
+
+
+class TransactionJournal:
+    """Append-only journal of transaction changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+
+    def append(self, op, transaction):
+        """Append one add/edit/delete record to the journal"""
+        self.append_records([(op, transaction)])
+
+    def append_records(self, records):
+        """Append (op, transaction) records with a single write, synced to disk"""
+        lines = [json.dumps({"op": op, "transaction": to_record(t)}, ensure_ascii=False) + "\n" for op, t in records]
+        data = "".join(lines)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        instrumentation.count_bytes(written=len(data.encode('utf-8')))
+        self.count += len(lines)
+
+    def reserve(self, next_id):
+        """Remember the next free id across a compaction"""
+        record = {"op": "reserve", "next_id": next_id}
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+
+    def replay(self, transactions):
+        """Apply journal records to the store loaded from the snapshot"""
+        self.count = 0
+        if not os.path.exists(self.path):
+            return
+
+        instrumentation.count_bytes(read=os.path.getsize(self.path))
+        count = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                record = _parse_record(line)
+                if record is None:
+                    # A torn line left by a crash in the middle of an append, or a
+                    # record that lacks its fields
+                    print(f"Skipping damaged journal record on line {line_number}.")
+                    continue
+
+                op, transaction = record
+                if op == "reserve":
+                    # Ids of transactions deleted before the last compaction;
+                    # here the record holds the next id instead of a transaction
+                    transactions.reserve_ids(transaction)
+                    continue
+
+                if op == "delete":
+                    transactions.remove(transaction["id"])
+                elif transaction["id"] in transactions:
+                    transactions.update(transaction)
+                else:
+                    transactions.append(transaction)
+                count += 1
+
+        self.count = count
+
+    def reset(self):
+        """Empty the journal after its records were written to the snapshot"""
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+        self.count = 0
+
+    def needs_compaction(self):
+        """Check whether the journal is long enough to be compacted"""
+        return self.count >= COMPACT_THRESHOLD
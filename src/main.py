@@ -1,21 +1,67 @@
-import json
 import os
+import sys
 from datetime import datetime
-from finance_charts import create_chart_manager
-
-
-# File for saving data
-DATA_FILE = "financial_data.json"
+import aggregation
+import instrumentation
+from bulk_import import DEFAULT_CATEGORY, import_file
+from money import format_amount
+from query import SORT_KEYS, Query
+from storage import open_storage
+from stream_loader import LedgerLoadError
+from table_view import PAGE_SIZE, browse, write_table
+from transaction_store import DATE_FORMAT, TYPES, date_to_ordinal, month_bounds
+from validation import parse_amount, parse_date
+
+
+# File for saving data; a .bin file selects the memory-mapped binary format,
+# a .db file the SQLite database and a .ledger folder monthly partitions
+DATA_FILE = os.environ.get("FINANCE_DATA_FILE", "financial_data.json")
+
+# JSON/binary snapshot plus journal, SQLite or partitions, depending on
+# DATA_FILE; opened by open_data_file(), as opening may already read the file
+storage = None
+
+# Operation names of the main menu choices, for instrumentation
+MENU_ACTIONS = {
+    "1": "show balance",
+    "2": "show transactions",
+    "3": "add transaction",
+    "4": "edit transaction",
+    "5": "delete transaction",
+    "6": "search",
+    "7": "reports",
+    "9": "charts",
+    "10": "import",
+    "11": "exit",
+}
+
+def use_data_file(path):
+    """Switch to another data file before loading"""
+    global DATA_FILE
+    DATA_FILE = path
+
+def open_data_file():
+    """Open the storage of DATA_FILE and return it
+
+    Raises LedgerLoadError if the data file is damaged.
+    """
+    global storage
+    storage = open_storage(DATA_FILE)
+    return storage
 
 def main():
     """Main function"""
     print("Welcome to the MhShoghi Financial Manager!")
 
 
-    chart_manager = create_chart_manager()
-
     # Loading available data
-    transactions = load_data()
+    try:
+        transactions = load_data()
+    except LedgerLoadError as e:
+        # Never continue with an empty ledger: the next save would wipe the file
+        print(f"❌ Error in loading data from {DATA_FILE}: {e}")
+        print("The data file was not changed. Fix or restore it and start again.")
+        return
 
     # Show main menu
     while True:
@@ -24,34 +70,52 @@ def main():
         choice = input("Choose your desired input: ")
 
 
-        if choice == "1":
-            # Show Balance
-            show_balance(transactions)
-        elif choice == "2":
-            # Show Transactions
-            show_transactions(transactions)
-        elif choice == "3":
-            # Add Transaction
-            add_transaction(transactions)
-        elif choice == "4":
-            # Edit Transaction
-            edit_transactions(transactions)
-        elif choice == "5":
-            # Delete Transaction
-            delete_transaction(transactions)
-        elif choice == "6":
-            # Search Transaction
-            search_transactions(transactions)
-        elif choice == "7":
-            # Financial Reports
-            show_financial_reports(transactions)
-        elif choice == "9":
-            chart_manager.show_charts_menu(transactions)
-        elif choice == "11":
-            print("\n Thanks. Your data saved!")
-            break
-        else:
-            print("Invalid input. Please try again.")
+        # Timed as one operation when instrumentation is on
+        with instrumentation.operation(f"menu {MENU_ACTIONS.get(choice, 'invalid input')}"):
+            if choice == "1":
+                # Show Balance
+                show_balance(transactions)
+            elif choice == "2":
+                # Show Transactions
+                show_transactions(transactions)
+            elif choice == "3":
+                # Add Transaction
+                add_transaction(transactions)
+            elif choice == "4":
+                # Edit Transaction
+                edit_transactions(transactions)
+            elif choice == "5":
+                # Delete Transaction
+                delete_transaction(transactions)
+            elif choice == "6":
+                # Search Transaction
+                search_transactions(transactions)
+            elif choice == "7":
+                # Financial Reports
+                show_financial_reports(transactions)
+            elif choice == "9":
+                # Imported here so the text-only paths never load matplotlib
+                from finance_charts import create_chart_manager
+                create_chart_manager().show_charts_menu(transactions)
+            elif choice == "10":
+                # Import bank statement
+                import_transactions(transactions)
+            elif choice == "11":
+                try:
+                    # Wait for the background writer before leaving
+                    storage.flush()
+                except Exception as e:
+                    print(f"❌ Error in saving transactions: {e}")
+                    print("Your changes are still in memory. Fix the problem and choose exit again.")
+                    continue
+                storage.close()
+                print("\n Thanks. Your data saved!")
+                break
+            else:
+                print("Invalid input. Please try again.")
+
+            # Commit the changes of this menu action as one batch
+            storage.commit()
 
 def show_main_menu():
     """Main menu"""
@@ -67,30 +131,48 @@ def show_main_menu():
     print("7. Statistics and Reports")
 
     print("9. Financial charts")
+    print("10. Import bank statement (CSV/OFX)")
     # Others
     print("8. Exit the program")
 
+@instrumentation.instrumented
 def load_data():
-    """Load data from JSON file"""
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                print(f" {len(data)} transactions loaded from {DATA_FILE}.")
-                return data
-        except (json.JSONDecodeError, Exception) as e:
-            print("Error in loading data from JSON file. Please try again.")
-            return []
-    else:
-        print("Data file not found.")
-        return []
+    """Load transactions from the data file into the store
+
+    Raises LedgerLoadError if the data file is damaged.
+    """
+    transactions = open_data_file().load(progress=show_load_progress)
+    print(f" {len(transactions)} transactions loaded from {DATA_FILE}.")
+    return transactions
+
+def show_load_progress(bytes_read, total):
+    """Print how much of the data file has been read"""
+    percent = bytes_read * 100 // total if total else 100
+    sys.stdout.write(f"\r Loading {DATA_FILE}: {percent}% ({bytes_read // (1024 * 1024)} MB)")
+    if bytes_read >= total:
+        sys.stdout.write("\n")
+    sys.stdout.flush()
 
 # Save transaction to the file
+@instrumentation.instrumented
 def save_data(transactions):
-    """Save transactions to JSON file"""
+    """Save a full snapshot of transactions to the data file"""
+    try:
+        storage.save(transactions)
+    except Exception as e:
+        print(f"Error in saving transactions: {e}")
+
+def record_change(transactions, op, transaction):
+    """Write a single add/edit/delete to storage"""
     try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(transactions,f, ensure_ascii=False, indent=4)
+        storage.record(transactions, op, transaction)
+    except Exception as e:
+        print(f"Error in saving transactions: {e}")
+
+def record_batch(transactions, op, batch):
+    """Write many changes of one kind to storage in one go"""
+    try:
+        storage.record_batch(transactions, op, batch)
     except Exception as e:
         print(f"Error in saving transactions: {e}")
 
@@ -120,7 +202,7 @@ def add_transaction(transactions):
 
     # Create new transaction
     transaction = {
-        "id": len(transactions) + 1,
+        "id": transactions.next_id(),
         "type": transaction_type,
         "amount": transaction_amount,
         "category": category,
@@ -131,7 +213,35 @@ def add_transaction(transactions):
 
     # Append/Save transaction
     transactions.append(transaction)
-    save_data(transactions)
+    record_change(transactions, "add", transaction)
+
+def import_transactions(transactions):
+    """Import transactions from a CSV or OFX bank statement"""
+    print("\n--- Import bank statement ---")
+    path = input("Statement file (CSV or OFX): ").strip()
+    if not path:
+        print("File name should not be empty.")
+        return
+
+    category = input(f"Category for rows without one (Enter for '{DEFAULT_CATEGORY}'): ").strip()
+    # OFX dates have a fixed format, so this only applies to CSV files
+    date_format = input("Date format of a CSV file, e.g. %Y-%m-%d (Enter for YYYY/MM/DD): ").strip()
+
+    try:
+        added, duplicates, errors = import_file(path, transactions, category or DEFAULT_CATEGORY, date_format or DATE_FORMAT)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not import {path}: {e}")
+        return
+
+    # The whole statement is committed with one write
+    if added:
+        record_batch(transactions, "add", added)
+
+    print(f"✅ {len(added)} transactions imported, {duplicates} duplicates skipped, {len(errors)} invalid rows.")
+    for line, message in errors[:10]:
+        print(f"  Line {line}: {message}")
+    if len(errors) > 10:
+        print(f"  ... and {len(errors) - 10} more.")
 
 def get_transaction_type():
     """Get transaction type from user"""
@@ -158,15 +268,10 @@ def get_amount():
             if amount_input.lower() == "exit":
                 return None
 
-            amount = float(amount_input)
-            if amount <= 0:
-                print("Amount must be greater than 0.")
-                continue
-
-            return amount
+            return parse_amount(amount_input)
 
-        except ValueError:
-            print("Enter a valid amount. or (exit)")
+        except ValueError as e:
+            print(f"{e} (or exit)")
 
 def get_date():
     """Get date from user"""
@@ -178,28 +283,29 @@ def get_date():
 
         else:
             try:
-                # Date validation
-                datetime.strptime(date_input, "%Y/%m/%d")
-                return date_input
+                # Date validation, stored zero-padded
+                return parse_date(date_input)
             except ValueError:
                 print("❌ Invalid date format. Use YYYY/MM/DD (e.g., 2019-02-01)")
 
+@instrumentation.instrumented
 def show_balance(transactions):
     """Show current balance"""
     if not transactions:
         print("No transactions found.")
         return
 
-    total_income = sum(t["amount"] for t in transactions if t["type"] == "income")
-    total_expense = sum(t["amount"] for t in transactions if t["type"] == "expense")
+    totals = aggregation.type_totals(transactions)
+    total_income = totals["income"][0]
+    total_expense = totals["expense"][0]
 
     balance = total_income - total_expense
 
 
     print("\n--- Finance statistics: ---")
-    print(f"Total Income: {total_income} $")
-    print(f"Total Expense: {total_expense} $")
-    print(f"Balance: {balance} $")
+    print(f"Total Income: {format_amount(total_income)} $")
+    print(f"Total Expense: {format_amount(total_expense)} $")
+    print(f"Balance: {format_amount(balance)} $")
 
 
     if balance > 0:
@@ -209,19 +315,14 @@ def show_balance(transactions):
     else:
         print("⚖️ Your balance is zero.")
 
-def show_transactions(transactions):
-    """Show transactions"""
+def show_transactions(transactions, page_size=PAGE_SIZE):
+    """Show transactions, a page at a time"""
     if not transactions:
         print("No transaction found.")
         return
 
-    print(f"\n{'ID':<4} {'Date':<12} {'Type':<8} {'Category':<15} {'Amount':<12} {'Description'}")
-    print("-" * 70)
-
-    for t in transactions:
-        type_str = "income" if t["type"] == "income" else "expense"
-        amount_str = f"{t['amount']:,.0f} $"
-        print(f"{t['id']:<4} {t['date']:<12} {type_str:<8} {t['category']:<15} {amount_str:<12} {t['description']}")
+    # Rows are streamed from the store, only one page is formatted at a time
+    browse(transactions.iter_rows(), len(transactions), page_size)
 
 def edit_transactions(transactions):
     """Edit an available transaction"""
@@ -245,7 +346,7 @@ def edit_transactions(transactions):
         return
 
     print(f"\nEdit transaction {transaction['id']:<4}")
-    print(f"Balance: {transaction['amount']} - {transaction['type']} - {transaction['category']:<12}")
+    print(f"Balance: {format_amount(transaction['amount'])} - {transaction['type']} - {transaction['category']:<12}")
 
     # Show edit menu
     while True:
@@ -270,7 +371,7 @@ def edit_transactions(transactions):
             new_amount = get_amount()
             if new_amount:
                 transaction["amount"] = new_amount
-                print("✅ Transaction amount updated and set to " + str(new_amount))
+                print("✅ Transaction amount updated and set to " + format_amount(new_amount))
 
 
         elif field_choice == "3":
@@ -282,7 +383,7 @@ def edit_transactions(transactions):
         elif field_choice == "4":
             print("*" * 40)
             print("You are editing description for transaction ID: ")
-            print(f"Balance: {transaction['amount']} - {transaction['type']} - {transaction['category']:<12}")
+            print(f"Balance: {format_amount(transaction['amount'])} - {transaction['type']} - {transaction['category']:<12}")
             new_description = input("New description: ").strip()
             transaction["description"] = new_description
             print("✅ Transaction description updated.")
@@ -294,7 +395,8 @@ def edit_transactions(transactions):
                 print("✅ Transaction date updated.")
 
         elif field_choice == "6":
-            save_data(transactions)
+            transactions.update(transaction)
+            record_change(transactions, "edit", transaction)
             print("✅ Changes saved.")
             break
         else:
@@ -303,11 +405,7 @@ def edit_transactions(transactions):
 # Find transaction By ID
 def find_transaction_by_id(transactions, transaction_id):
     """Find transaction by id"""
-    for t in transactions:
-        if t["id"] == transaction_id:
-            return t
-
-    return None
+    return transactions.get(transaction_id)
 
 def delete_transaction(transactions):
     """Delete transaction"""
@@ -328,22 +426,19 @@ def delete_transaction(transactions):
     transaction = find_transaction_by_id(transactions, transaction_id)
     if not transaction:
         print(f"Transaction with ID {transaction_id} not found")
+        return
 
 
     # Display transaction
     print(f"\nAre you sure you want to delete {transaction['id']}?")
     type_str = "income" if transaction["type"] == "income" else "expense"
-    print(f" {type_str} - {transaction['category']} - {transaction['amount']:,.0f} $ - {transaction['description']}")
+    print(f" {type_str} - {transaction['category']} - {format_amount(transaction['amount'], 0)} $ - {transaction['description']}")
 
     confirm = input("Type 'yes' for confirmation (y/n): ").strip()
 
     if confirm == "yes":
-        transactions.remove(transaction)
-
-        # Update ids
-        for i, transaction in enumerate(transactions, start=1):
-            transaction['id'] = 1
-        save_data(transactions)
+        transactions.remove(transaction["id"])
+        record_change(transactions, "delete", {"id": transaction["id"]})
 
         print("Transaction deleted successfully.")
     else:
@@ -362,10 +457,11 @@ def search_transactions(transactions):
     print("2. 📅 Search based on date")
     print("3. 💰 Search based on transaction type")
     print("4. 🔎 Search in description")
+    print("5. 🧩 Combined search")
 
 
     # choice field input
-    choice = input("Choose your desired input: (1 or 4)")
+    choice = input("Choose your desired input: (1 to 5)")
 
     if choice == "1":
         # Search by category
@@ -379,6 +475,9 @@ def search_transactions(transactions):
     elif choice == "4":
         # Search in description
         search_by_description(transactions)
+    elif choice == "5":
+        # Several criteria at once
+        search_combined(transactions)
     else:
         print("Invalid input")
         return
@@ -390,23 +489,44 @@ def search_by_category(transactions):
         print("Category should not be empty.")
         return
 
-    results = [t for t in transactions if category in t['category'].lower()]
+    results = transactions.find_by_category(category)
     show_search_results(results, f"Show results for category '{category}'")
 
 def search_by_date(transactions):
-    """Search transactions by date"""
-    date = input("Date: (YYYY/MM/DD): ").strip()
-    if not date:
-        print("Date should not be empty.")
-        return
+    """Search transactions by day, month or date range"""
+    print("\n1. Exact day")
+    print("2. Month")
+    print("3. Date range")
+    choice = input("Choose 1, 2 or 3: ").strip()
 
     try:
-        datetime.strptime(date, "%Y-%m-%d")
-        results = [t for t in transactions if t['date'] == date]
-        show_search_results(results, f"Show results for date '{date}'")
-
+        if choice == "1":
+            date = input("Date: (YYYY/MM/DD): ").strip()
+            datetime.strptime(date, "%Y/%m/%d")
+            first = last = date_to_ordinal(date)
+            title = f"Show results for date '{date}'"
+        elif choice == "2":
+            month = input("Month: (YYYY/MM): ").strip()
+            parsed = datetime.strptime(month, "%Y/%m")
+            first, last = month_bounds(parsed.year, parsed.month)
+            title = f"Show results for month '{month}'"
+        elif choice == "3":
+            date_from = input("From: (YYYY/MM/DD): ").strip()
+            date_to = input("To: (YYYY/MM/DD): ").strip()
+            datetime.strptime(date_from, "%Y/%m/%d")
+            datetime.strptime(date_to, "%Y/%m/%d")
+            first, last = date_to_ordinal(date_from), date_to_ordinal(date_to)
+            title = f"Show results from '{date_from}' to '{date_to}'"
+        else:
+            print("Invalid input")
+            return
     except ValueError:
         print("Invalid date")
+        return
+
+    # Rows come from the date index already in date order
+    count = transactions.count_by_dates(first, last)
+    show_search_results(transactions.iter_by_dates(first, last), title, count)
 
 def search_by_type(transactions):
     """Search transactions by type"""
@@ -416,11 +536,11 @@ def search_by_type(transactions):
 
     choice = input("Choose 1 or 2:")
     if choice == "1":
-        results = [t for t in transactions if t['type'] == 'income']
+        results = transactions.find_by_type('income')
         show_search_results(results, f"Show results for type 'income'")
 
     elif choice == "2":
-        results = [t for t in transactions if t['type'] == 'expense']
+        results = transactions.find_by_type('expense')
         show_search_results(results, f"Show results for type 'expense'")
     else:
         print("Invalid input")
@@ -431,24 +551,72 @@ def search_by_description(transactions):
     if not keyword:
         print("Keyword should not be empty.")
         return
-    results = [t for t in transactions if keyword in t['description'].lower()]
+    results = transactions.find_by_description(keyword)
     show_search_results(results, f"Show results for keyword '{keyword}'")
 
-def show_search_results(results, title):
-    """Show search results"""
-    if not results:
+def search_combined(transactions):
+    """Search with any mix of criteria, sorted and limited"""
+    print("\nPress Enter to skip a criterion.")
+    category = input("Category contains: ").strip()
+    description = input("Description contains: ").strip()
+    transaction_type = input("Type (income/expense): ").strip().lower()
+    if transaction_type and transaction_type not in TYPES:
+        print("Invalid type")
+        return
+
+    try:
+        date_from = input("From: (YYYY/MM/DD): ").strip()
+        date_from = parse_date(date_from) if date_from else None
+        date_to = input("To: (YYYY/MM/DD): ").strip()
+        date_to = parse_date(date_to) if date_to else None
+    except ValueError:
+        print("Invalid date")
+        return
+
+    try:
+        amount_min = input("Minimum amount: ").strip()
+        amount_min = parse_amount(amount_min) if amount_min else None
+        amount_max = input("Maximum amount: ").strip()
+        amount_max = parse_amount(amount_max) if amount_max else None
+    except ValueError as e:
+        print(e)
+        return
+
+    sort = input(f"Sort by ({', '.join(SORT_KEYS)}, Enter for date): ").strip().lower() or "date"
+    if sort not in SORT_KEYS:
+        print("Invalid sort order")
+        return
+    descending = input("Newest or largest first? (y/N): ").strip().lower() == "y"
+    limit = input("Show at most (Enter for all): ").strip()
+    if limit and not limit.isdigit():
+        print("Invalid number")
+        return
+
+    query = Query(
+        category, description, transaction_type or None, date_from, date_to,
+        amount_min, amount_max, sort, descending, limit=int(limit) if limit else None,
+    )
+    results, count, plan = transactions.query(query)
+    title = f"Show results for {query.describe()}"
+    if count > len(results):
+        title += f" (first {len(results)} of {count})"
+    show_search_results(results, title)
+
+def show_search_results(results, title, count=None, page_size=PAGE_SIZE):
+    """Show search results, a page at a time, or all at once without page_size"""
+    # Streamed results come with their count, lists are counted here
+    if count is None:
+        count = len(results)
+    if count == 0:
         print(f"No search results found.")
         return
 
     print(f"\n--- {title} ---")
-    print(f" {len(results)} search results found.")
-    print(f"{'ID':<4} {'Date':<12} {'type':<8} {'category':<15} {'amount':<15} {'description':<15}")
-    print("-" * 70)
-
-    for r in results:
-        type_str = "income" if r["type"] == "income" else "expense"
-        amount_str = f"{r['amount']:,.0f} $"
-        print(f"{r['id']:<4} {r['date']:<12} {r['type']:<8} {r['category']:<15}  {amount_str:<15} {r['description']:<15}")
+    print(f" {count} search results found.")
+    if page_size:
+        browse(results, count, page_size)
+    else:
+        write_table(results)
 
 def show_financial_reports(transactions):
     """Show financial reports"""
@@ -461,9 +629,12 @@ def show_financial_reports(transactions):
         print("1. 📋 Summary")
         print("2. 🏷️ Statistics based on category")
         print("3. 📅 Monthly report")
-        print("4. 🔙 Main Menu")
+        print("4. 📆 Year over year")
+        print("5. 📈 Balance over time")
+        print("6. 🏆 Largest expenses and spending percentiles")
+        print("7. 🔙 Main Menu")
 
-        choice = input("Choose your desired input: (1 or 4)").strip()
+        choice = input("Choose your desired input: (1 to 7)").strip()
 
         if choice == "1":
             # Summary
@@ -476,88 +647,143 @@ def show_financial_reports(transactions):
             # monthly report
             show_monthly_report(transactions)
         elif choice == "4":
+            # year over year report
+            show_year_over_year_report(transactions)
+        elif choice == "5":
+            # running balance and rolling spending
+            show_balance_over_time_report(transactions)
+        elif choice == "6":
+            # top expenses and percentiles
+            show_expense_distribution_report(transactions)
+        elif choice == "7":
             break
         else:
             print("Invalid input")
 
+@instrumentation.instrumented
 def show_summary_report(transactions):
     """Show summary report"""
-    total_income = sum(t['amount'] for t in transactions if t['type'] == 'income')
-    total_expense = sum(t['amount'] for t in transactions if t['type'] == 'expense')
+    totals = aggregation.type_totals(transactions)
+    total_income, income_count = totals['income']
+    total_expense, expense_count = totals['expense']
     balance = total_income - total_expense
 
-    # income_count = len([t for t in transactions if t['type'] == 'income'])
-    # Update (for better usage and performance)
-    income_count = len([t for t in transactions if t['type'] == 'income'])
-    expense_count = len([t for t in transactions if t['type'] == 'expense'])
-
 
     print("\n--- 📋 Overall Financial Summary ---")
-    print(f"💰 Total income: {total_income:,.0f} $ ({income_count} transactions)")
-    print(f"💸 Total Expenses: {total_expense:,.0f} $ ({expense_count} transactions)")
-    print(f"💳 Final Balance: {balance:,.0f} $")
+    print(f"💰 Total income: {format_amount(total_income, 0)} $ ({income_count} transactions)")
+    print(f"💸 Total Expenses: {format_amount(total_expense, 0)} $ ({expense_count} transactions)")
+    print(f"💳 Final Balance: {format_amount(balance, 0)} $")
 
     if total_income > 0:
         savings_ratio = ((total_income - total_expense) / total_income) * 100
         print(f"🎯 Rate of savings: {savings_ratio:.2f}%")
 
+@instrumentation.instrumented
 def show_category_report(transactions):
     """Show category report"""
     # Grouping income by category
-    income_by_category = {}
-    for t in transactions:
-        if t['type'] == 'income':
-            income_by_category[t['category']] = income_by_category.get(t['category'],0) + t['amount']
+    income_by_category = aggregation.category_totals(transactions, 'income')
 
     # Grouping expense by category
-    expense_by_category = {}
-    for t in transactions:
-        if t['type'] == 'expense':
-            expense_by_category[t['category']] = expense_by_category.get(t['category'], 0) + t['amount']
+    expense_by_category = aggregation.category_totals(transactions, 'expense')
 
     print("\n--- Statistics based on category ---")
 
     if income_by_category:
         print("\n Income by category")
-        for category, amount in sorted(income_by_category.items(), key=lambda x: x[1], reverse=True):
-            percentage = (amount / sum(income_by_category.values())) * 100
-            print(f"{category}: {amount:,.0f} ({percentage:.2f}%)")
+        for category, amount, percentage in income_by_category:
+            print(f"{category}: {format_amount(amount, 0)} ({percentage:.2f}%)")
 
     if expense_by_category:
         print("\n Expenses by category")
-        for category, amount in sorted(expense_by_category.items(), key=lambda x: x[1], reverse=True):
-            percentage = (amount / sum(expense_by_category.values())) * 100
-            print(f"{category}: {amount:,.0f} ({percentage:.2f}%)")
+        for category, amount, percentage in expense_by_category:
+            print(f"{category}: {format_amount(amount, 0)} ({percentage:.2f}%)")
 
+@instrumentation.instrumented
 def show_monthly_report(transactions):
     """Show monthly report"""
 
-    # Define an empty dictionary
-    monthly_data = {}
-    for t in transactions:
-        year_month = t['date'][:7] # YYYY-MM
-
-        if year_month not in monthly_data:
-            monthly_data[year_month] = {'income': 0, 'expense': 0 }
-
-        if t['type'] == 'income':
-            monthly_data[year_month]['income'] += t['amount']
-        else:
-            monthly_data[year_month]['expense'] += t['amount']
+    # Income and expense per YYYY/MM month
+    monthly_data = aggregation.monthly_totals(transactions)
 
     if not monthly_data:
         print("No monthly data found.")
         return
 
     print("\n--- Monthly Report ---")
-    for month, data in sorted(monthly_data.items()):
-        balance = data['income'] - data['expense']
+    for month, income, expense in monthly_data:
+        balance = income - expense
         print(f"\n {month}")
-        print(f"Income: {data['income']:,.0f} $")
-        print(f"Expense: {data['expense']:,.0f} $")
-        print(f"Balance: {balance:,.0f} $")
+        print(f"Income: {format_amount(income, 0)} $")
+        print(f"Expense: {format_amount(expense, 0)} $")
+        print(f"Balance: {format_amount(balance, 0)} $")
+
+@instrumentation.instrumented
+def show_year_over_year_report(transactions):
+    """Show income and expense per year against the year before"""
+    yearly_data = aggregation.year_over_year(transactions)
+
+    if not yearly_data:
+        print("No yearly data found.")
+        return
+
+    print("\n--- Year over Year Report ---")
+    for year, income, expense, income_change, expense_change in yearly_data:
+        print(f"\n {year}")
+        print(f"Income: {format_amount(income, 0)} ${_change_text(income_change)}")
+        print(f"Expense: {format_amount(expense, 0)} ${_change_text(expense_change)}")
+        print(f"Balance: {format_amount(income - expense, 0)} $")
+
+@instrumentation.instrumented
+def show_balance_over_time_report(transactions):
+    """Show the running balance and rolling average spending at the end of each month"""
+    daily_data = aggregation.balance_over_time(transactions)
+
+    if not daily_data:
+        print("No daily data found.")
+        return
+
+    # The last day of each month, or the last day with transactions in the final month
+    month_ends = {}
+    for day, balance, averages in daily_data:
+        month_ends[day[:7]] = (day, balance, averages)
+
+    print("\n--- Balance over Time ---")
+    for month, (day, balance, averages) in month_ends.items():
+        print(f"\n {month} (up to {day})")
+        print(f"Balance: {format_amount(balance, 0)} $")
+        for window, average in zip(aggregation.ROLLING_WINDOWS, averages):
+            print(f"Average spending, last {window} days: {format_amount(round(average))} $ a day")
+
+@instrumentation.instrumented
+def show_expense_distribution_report(transactions, top=aggregation.TOP_EXPENSES):
+    """Show the largest expenses and spending percentiles per category"""
+    largest, percentiles = aggregation.expense_distribution(transactions, top)
+
+    if not percentiles:
+        print("No expense found.")
+        return
+
+    if largest:
+        print(f"\n--- {len(largest)} Largest Expenses ---")
+        write_table(largest)
+
+    names = [aggregation.percentile_name(q) for q in aggregation.QUANTILES]
+    print("\n--- Spending Percentiles by Category ---")
+    print(f"{'Category':<15} {'Count':>8} " + " ".join(f"{name:>12}" for name in names))
+    for category, count, amounts in percentiles:
+        print(f"{category[:15]:<15} {count:>8} " + " ".join(f"{format_amount(amount):>12}" for amount in amounts))
+
+def _change_text(change):
+    if change is None:
+        return ""
+    return f" ({change:+.1f}% on the year before)"
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Non-interactive commands, see `python main.py --help`
+        import cli
+        sys.exit(cli.run(sys.argv[1:]))
     main()
 
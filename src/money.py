@@ -0,0 +1,56 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# Amounts are kept as whole cents, in int64 columns and in the data files
+CENTS = 100
+
+# Largest amount accepted, so sums of many of them stay exact in int64
+MAX_CENTS = 10 ** 15
+
+
+def to_cents(value):
+    """Convert an amount in currency units, a number or decimal text, to whole cents
+
+    Half a cent rounds up. Raises ValueError for text that is not a number.
+    """
+    try:
+        # str() of a float is its shortest decimal, so 0.29 becomes 29 cents, not 28
+        cents = (Decimal(str(value).strip()) * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f"invalid amount {value!r}")
+    return int(cents)
+
+
+def to_units(cents):
+    """Convert cents to a number of currency units, for JSON output and charts"""
+    return cents / CENTS
+
+
+def format_amount(cents, places=2):
+    """Format cents as currency text with thousands separators, e.g. 1,234.50
+
+    places is 2 for cents or 0 for whole units, rounding half up.
+    """
+    sign = "-" if cents < 0 else ""
+    cents = abs(int(cents))
+    if places == 0:
+        return f"{sign}{(cents + CENTS // 2) // CENTS:,}"
+    units, rest = divmod(cents, CENTS)
+    return f"{sign}{units:,}.{rest:02d}"
+
+
+def from_record(record):
+    """Return the transaction dict, amount in cents, of a record from a data or journal file
+
+    Records written before amounts were kept in cents have an "amount" in
+    currency units, newer ones an "amount_cents".
+    """
+    if "amount_cents" in record:
+        return {("amount" if key == "amount_cents" else key): value for key, value in record.items()}
+    if "amount" in record:
+        return {key: (to_cents(value) if key == "amount" else value) for key, value in record.items()}
+    return record
+
+
+def to_record(transaction):
+    """Return the record written to data and journal files for a transaction dict"""
+    return {("amount_cents" if key == "amount" else key): value for key, value in transaction.items()}
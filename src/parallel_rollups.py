@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from transaction_store import group_sums, rollup_sums
+
+
+def _shard_rollups(job):
+    """Sum one shard of the shared columns; returns its (daily, monthly) group sums"""
+    names, rows, start, stop = job
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    try:
+        columns = [np.ndarray((rows,), dtype=np.int64, buffer=block.buf)[start:stop] for block in blocks]
+        result = rollup_sums(*columns)
+        # The views have to go before the blocks can be closed
+        del columns
+        return result
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def _merge(parts):
+    """Merge partial group sums from the shards into one (keys, sums, counts)"""
+    keys, sums, counts = (np.concatenate(column) for column in zip(*parts))
+    return group_sums(keys, sums, counts)
+
+
+def parallel_rollup_sums(groups, dates, amounts, workers=None):
+    """rollup_sums split over a process pool
+
+    The int64 columns are copied once into shared memory and each worker
+    sums its own slice of rows, so only the small per-shard group sums are
+    sent back. Summing whole cents gives the same totals in any order.
+    """
+    workers = workers or os.cpu_count() or 1
+    rows = len(amounts)
+    blocks = []
+    try:
+        for column in (groups, dates, amounts):
+            block = shared_memory.SharedMemory(create=True, size=max(rows, 1) * 8)
+            blocks.append(block)
+            np.ndarray((rows,), dtype=np.int64, buffer=block.buf)[:] = column
+
+        shard = max(-(-rows // workers), 1)
+        jobs = [
+            ([block.name for block in blocks], rows, start, min(start + shard, rows))
+            for start in range(0, rows, shard)
+        ]
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            parts = list(pool.map(_shard_rollups, jobs))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    daily, monthly = zip(*parts)
+    return _merge(daily), _merge(monthly)
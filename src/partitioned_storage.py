@@ -0,0 +1,417 @@
+import json
+import os
+from datetime import date
+
+import numpy as np
+
+import instrumentation
+from atomic_file import atomic_write
+from money import from_record, to_record
+from storage import Storage
+from stream_loader import LedgerLoadError, iter_records, write_records
+from transaction_store import (
+    EPOCH_ORDINAL,
+    TransactionStore,
+    date_to_ordinal,
+    month_bounds,
+    ordinal_to_month,
+)
+from write_behind import BackgroundWriter
+
+# A ledger folder holds this manifest and one JSON file per partition
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 3
+
+# Version 1 entries hold no rollups and version 2 rollups are not in cents;
+# their rollups are dropped and those partitions are read and rewritten on opening
+READABLE_VERSIONS = (1, 2, MANIFEST_VERSION)
+
+# Rollups of an empty partition
+NO_ROLLUPS = {"daily": [], "monthly": []}
+
+# Transactions are split by calendar month or by calendar year
+GRANULARITIES = ("month", "year")
+DEFAULT_GRANULARITY = "month"
+
+COLUMN_NAMES = ("alive", "ids", "amounts", "dates", "types", "categories")
+
+
+def partition_key(ordinal, granularity):
+    """Return the partition of a date ordinal: 'YYYY/MM' or 'YYYY'"""
+    if granularity == "year":
+        return f"{date.fromordinal(int(ordinal)).year:04d}"
+    return ordinal_to_month(ordinal)
+
+
+def partition_bounds(key):
+    """Return the first and last day ordinals of a partition"""
+    if len(key) == 4:
+        year = int(key)
+        return date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal()
+    return month_bounds(int(key[:4]), int(key[5:7]))
+
+
+def partition_file(key):
+    """File name of a partition inside the ledger folder"""
+    return key.replace("/", "-") + ".json"
+
+
+def _partition_entry(rows):
+    """Manifest entry for a partition copy: its size, id range and rollups"""
+    rows.rebuild_aggregates()
+    ids = rows.live_column(rows.ids)
+    return {
+        "count": len(rows),
+        "min_id": int(ids.min()),
+        "max_id": int(ids.max()),
+        "rollups": rows.aggregates.to_json(),
+    }
+
+
+def _same_rollups(entry, other):
+    rollups = entry.get("rollups")
+    return rollups is not None and all(
+        sorted(map(tuple, rollups[name])) == sorted(map(tuple, other["rollups"][name]))
+        for name in ("daily", "monthly")
+    )
+
+
+def split_partitions(store, granularity):
+    """Return {key: copy of the rows in that partition} for every live row"""
+    rows = store.live_rows()
+    days = (store.live_column(store.dates) - EPOCH_ORDINAL).astype("datetime64[D]")
+    unit = "datetime64[Y]" if granularity == "year" else "datetime64[M]"
+    periods, inverse = np.unique(days.astype(unit), return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    partitions = {}
+    for number, period in enumerate(periods):
+        key = str(period).replace("-", "/")
+        partitions[key] = TransactionStore.copy_rows(store, rows[inverse == number])
+    return partitions
+
+
+class PartitionedTransactionStore(TransactionStore):
+    """TransactionStore that reads its partitions from disk only when needed
+
+    Balances and reports come from the totals in the manifest, date range
+    searches open the partitions that overlap the range, and a lookup by id
+    opens the partitions whose id range holds it. Anything that needs every
+    row, like listing all transactions, opens all of them.
+    """
+
+    def __init__(self, directory, manifest):
+        super().__init__()
+        self.directory = directory
+        self.granularity = manifest["granularity"]
+        self.entries = manifest["partitions"]
+        self._next_id = manifest["next_id"]
+        self._loaded = set()
+        # Partitions changed since the last commit
+        self.dirty = set()
+        self._unloaded_count = 0
+        for entry in self.entries.values():
+            self._unloaded_count += entry["count"]
+            self.aggregates.merge(entry.get("rollups", NO_ROLLUPS))
+        self._load([key for key, entry in self.entries.items() if "rollups" not in entry])
+
+    def __len__(self):
+        return self._live + self._unloaded_count
+
+    def __contains__(self, transaction_id):
+        return self._find_row(transaction_id) is not None
+
+    # Loading partitions
+
+    def _load(self, keys):
+        """Read the partitions in keys that are not loaded yet"""
+        keys = sorted(set(keys) - self._loaded)
+        if not keys:
+            return
+        # Rows are appended in bulk; the search index is rebuilt on demand
+        self._search_index = None
+        for key in keys:
+            self._read_partition(key)
+        self.date_index.build(TransactionStore.live_rows(self), TransactionStore.live_column(self, self.dates))
+
+    def _read_partition(self, key):
+        self._loaded.add(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        path = os.path.join(self.directory, entry["file"])
+        first = self._size
+        if os.path.exists(path):
+            instrumentation.count_bytes(read=os.path.getsize(path))
+            for number, record in enumerate(iter_records(path), start=1):
+                try:
+                    TransactionStore.append(self, from_record(record), bulk=True)
+                except (KeyError, TypeError, ValueError) as e:
+                    raise LedgerLoadError(f"Transaction number {number} of {entry['file']} is invalid ({e!r}).")
+        self._unloaded_count -= entry["count"]
+
+        # The manifest rollups were counted when the ledger was opened; if the
+        # file does not match them, count what it really holds and rewrite it
+        rows = np.arange(first, self._size)
+        if len(rows):
+            actual = _partition_entry(TransactionStore.copy_rows(self, rows))
+        else:
+            actual = {"count": 0, "rollups": NO_ROLLUPS}
+        if actual["count"] != entry["count"] or not _same_rollups(entry, actual):
+            self.aggregates.merge(entry.get("rollups", NO_ROLLUPS), -1)
+            self.aggregates.merge(actual["rollups"])
+            self.dirty.add(key)
+
+    def _load_all(self):
+        self._load(self.entries)
+
+    def _keys_between(self, first, last):
+        """Partitions that may hold transactions dated between two ordinals"""
+        keys = []
+        for key in self.entries:
+            start, end = partition_bounds(key)
+            if start <= last and end >= first:
+                keys.append(key)
+        return keys
+
+    def _key(self, row):
+        return partition_key(self.dates[row], self.granularity)
+
+    def partition_rows(self, key):
+        """Return a copy of the loaded rows of one partition"""
+        first, last = partition_bounds(key)
+        rows = TransactionStore.live_rows(self)
+        dates = self.dates[rows]
+        return TransactionStore.copy_rows(self, rows[(dates >= first) & (dates <= last)])
+
+    # Reads that need every row
+
+    def iter_rows(self, offset=0, limit=None):
+        self._load_all()
+        return super().iter_rows(offset, limit)
+
+    def live_rows(self):
+        self._load_all()
+        return super().live_rows()
+
+    def live_column(self, column):
+        if not self._loaded.issuperset(self.entries):
+            # Loading may grow the columns, so look the column up again after it
+            name = next(name for name in COLUMN_NAMES if getattr(self, name) is column)
+            self._load_all()
+            column = getattr(self, name)
+        return super().live_column(column)
+
+    def iter_column_chunks(self, *names):
+        self._load_all()
+        return super().iter_column_chunks(*names)
+
+    def copy_rows(self, rows=None):
+        self._load_all()
+        return super().copy_rows(rows)
+
+    def rebuild_aggregates(self):
+        self._load_all()
+        super().rebuild_aggregates()
+
+    def finish_bulk(self):
+        # Aggregates were kept up to date row by row
+        self.date_index.build(TransactionStore.live_rows(self), TransactionStore.live_column(self, self.dates))
+
+    def find_by_category(self, text):
+        self._load_all()
+        return super().find_by_category(text)
+
+    def find_by_description(self, keyword):
+        self._load_all()
+        return super().find_by_description(keyword)
+
+    def find_by_type(self, transaction_type):
+        self._load_all()
+        return super().find_by_type(transaction_type)
+
+    # Reads that need some partitions
+
+    def query(self, query):
+        # A date range only needs its partitions; the other paths read every row
+        date_range = query.date_range
+        if date_range is None:
+            self._load_all()
+        else:
+            self._load(self._keys_between(*date_range))
+        return super().query(query)
+
+    def count_by_dates(self, first, last):
+        self._load(self._keys_between(first, last))
+        return super().count_by_dates(first, last)
+
+    def iter_by_dates(self, first, last):
+        self._load(self._keys_between(first, last))
+        return super().iter_by_dates(first, last)
+
+    def _find_row(self, transaction_id):
+        row = self._rows_by_id.get(transaction_id)
+        if row is None:
+            keys = [
+                key for key, entry in self.entries.items()
+                if key not in self._loaded and entry["min_id"] <= transaction_id <= entry["max_id"]
+            ]
+            if keys:
+                self._load(keys)
+                row = self._rows_by_id.get(transaction_id)
+        return row
+
+    # Changes
+
+    def append(self, transaction, bulk=False):
+        key = partition_key(date_to_ordinal(transaction["date"]), self.granularity)
+        self._load([key])
+        super().append(transaction, bulk)
+        if bulk:
+            # finish_bulk() only rebuilds the date index
+            self._count_row(self._size - 1, self.aggregates.add)
+        self.dirty.add(key)
+
+    def update(self, transaction):
+        row = self._find_row(transaction["id"])
+        if row is None:
+            return False
+        new_key = partition_key(date_to_ordinal(transaction["date"]), self.granularity)
+        self._load([new_key])
+        self.dirty.update((self._key(row), new_key))
+        return super().update(transaction)
+
+    def remove(self, transaction_id):
+        row = self._find_row(transaction_id)
+        if row is None:
+            return False
+        self.dirty.add(self._key(row))
+        return super().remove(transaction_id)
+
+    def take_dirty(self):
+        """Return {key: rows copy} for every changed partition and forget the changes"""
+        changed = {key: self.partition_rows(key) for key in sorted(self.dirty)}
+        self.dirty = set()
+        return changed
+
+
+class PartitionedStorage(Storage):
+    """A folder with one JSON file per month or year and a manifest of totals
+
+    Only the partitions changed since the last commit are rewritten, each
+    to a temporary file that replaces it, and then the manifest. Writes run
+    on a background thread like the snapshot backends.
+    """
+
+    def __init__(self, path, granularity=None, read_only=False):
+        super().__init__(path, read_only)
+        self.manifest_path = os.path.join(path, MANIFEST_NAME)
+        self.manifest = self._read_manifest()
+        if granularity is not None:
+            if granularity not in GRANULARITIES:
+                raise ValueError(f"Unknown partition size '{granularity}'. Use one of {', '.join(GRANULARITIES)}")
+            if self.manifest["partitions"] and granularity != self.manifest["granularity"]:
+                raise ValueError(f"{path} is already split by {self.manifest['granularity']}")
+            self.manifest["granularity"] = granularity
+        self.store = None
+        self.writer = BackgroundWriter(self._write_pending)
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"version": MANIFEST_VERSION, "granularity": DEFAULT_GRANULARITY, "next_id": 1, "partitions": {}}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise LedgerLoadError(f"Cannot read {self.manifest_path}: {e}")
+        if manifest.get("version") not in READABLE_VERSIONS or manifest.get("granularity") not in GRANULARITIES:
+            raise LedgerLoadError(f"{self.manifest_path} is not a ledger manifest this version can read.")
+        if manifest["version"] < MANIFEST_VERSION:
+            for entry in manifest["partitions"].values():
+                entry.pop("rollups", None)
+        return manifest
+
+    def load(self, progress=None):
+        """Return a store that opens partitions as they are needed
+
+        Nothing but the manifest is read here.
+        """
+        if not os.path.exists(self.manifest_path):
+            print("Data file not found.")
+        else:
+            instrumentation.count_bytes(read=os.path.getsize(self.manifest_path))
+        # The store and the writer thread each keep their own manifest entries
+        manifest = json.loads(json.dumps(self.manifest))
+        self.store = PartitionedTransactionStore(self.path, manifest)
+        return self.store
+
+    def save(self, transactions):
+        """Queue a rewrite of every partition"""
+        if transactions is self.store:
+            # Partitions that were never opened are already on disk as they are
+            transactions.dirty.update(transactions._loaded)
+            self.commit()
+            return
+        partitions = split_partitions(transactions, self.manifest["granularity"])
+        self.writer.submit(("all", partitions, transactions.next_id()))
+
+    def record(self, transactions, op, transaction):
+        # The store keeps track of the partitions a change touches
+        pass
+
+    def record_batch(self, transactions, op, batch):
+        pass
+
+    def commit(self):
+        """Queue copies of the partitions changed since the last commit"""
+        # Partitions that did not match the manifest stay as they are
+        if self.read_only:
+            return
+        if self.store is not None and self.store.dirty:
+            self.writer.submit(("changed", self.store.take_dirty(), self.store.next_id()))
+
+    def flush(self):
+        self.commit()
+        self.writer.flush()
+
+    def close(self):
+        self.commit()
+        self.writer.close()
+
+    def _write_pending(self, items):
+        """Write queued partitions and then the manifest; runs on the writer thread"""
+        entries = dict(self.manifest["partitions"])
+        written = {}
+        for kind, partitions, next_id in items:
+            if kind == "all":
+                entries = {}
+                written = {}
+            # A later copy of a partition replaces an earlier one
+            written.update(partitions)
+            entries.update(dict.fromkeys(partitions))
+            self.manifest["next_id"] = max(self.manifest["next_id"], next_id)
+
+        os.makedirs(self.path, exist_ok=True)
+        for key, rows in sorted(written.items()):
+            path = os.path.join(self.path, partition_file(key))
+            if len(rows) == 0:
+                del entries[key]
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            with atomic_write(path, 'w', encoding='utf-8') as f:
+                write_records(f, map(to_record, rows))
+            instrumentation.count_bytes(written=os.path.getsize(path))
+            entries[key] = {"file": partition_file(key), **_partition_entry(rows)}
+
+        # Files of partitions a full rewrite dropped
+        for key in set(self.manifest["partitions"]) - set(entries):
+            path = os.path.join(self.path, self.manifest["partitions"][key]["file"])
+            if os.path.exists(path):
+                os.remove(path)
+
+        self.manifest["version"] = MANIFEST_VERSION
+        self.manifest["partitions"] = {key: entries[key] for key in sorted(entries)}
+        with atomic_write(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=4, ensure_ascii=False)
+        instrumentation.count_bytes(written=os.path.getsize(self.manifest_path))
@@ -0,0 +1,58 @@
+import math
+
+import numpy as np
+
+# Largest relative error of a quantile read from a sketch
+RELATIVE_ERROR = 0.01
+
+# Up to this many amounts are also kept as they are, so the quantiles of a
+# small group are exact rather than the middle of a bucket
+EXACT_LIMIT = 1000
+
+
+class QuantileSketch:
+    """Approximate quantiles of positive amounts in bounded memory
+
+    Amounts are counted in logarithmic buckets, bucket k holding amounts in
+    (gamma ** (k - 1), gamma ** k]. A quantile is read back as the middle of
+    its bucket, which is within relative_error of the true amount. Amounts
+    of 1 cent up to MAX_CENTS need fewer than 2,000 buckets at 1%, however
+    many amounts are added. Until EXACT_LIMIT amounts are added, the
+    quantiles are read from the amounts themselves.
+    """
+
+    def __init__(self, relative_error=RELATIVE_ERROR):
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self.gamma)
+        # Bucket index -> number of amounts in it
+        self.counts = {}
+        self.count = 0
+        # The amounts themselves, until there are more than EXACT_LIMIT
+        self.exact = np.empty(0, dtype=np.int64)
+
+    def add_many(self, amounts):
+        """Count an array of positive amounts"""
+        if not len(amounts):
+            return
+        buckets = np.ceil(np.log(np.asarray(amounts, dtype=np.float64)) / self._log_gamma).astype(np.int64)
+        keys, counts = np.unique(buckets, return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.count += len(amounts)
+        if self.exact is not None:
+            self.exact = np.concatenate((self.exact, amounts)) if self.count <= EXACT_LIMIT else None
+
+    def quantile(self, q):
+        """Return the amount below which a fraction q of the amounts fall, or None if empty"""
+        if not self.count:
+            return None
+        if self.exact is not None:
+            # Interpolated between the two nearest amounts, as numpy does
+            return float(np.quantile(self.exact, q))
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** key / (self.gamma + 1)
@@ -0,0 +1,168 @@
+from datetime import date
+
+import numpy as np
+
+from money import format_amount
+from transaction_store import TYPE_CODES, date_to_ordinal
+
+# Columns a query can be sorted by
+SORT_KEYS = ("date", "amount", "id")
+
+# Day ordinals used for the open end of a date range
+FIRST_ORDINAL = 1
+LAST_ORDINAL = date.max.toordinal()
+
+
+class Query:
+    """Transactions matching every given predicate, sorted and paged
+
+    category and description match a substring, ignoring case, like the
+    search menu. Dates are YYYY/MM/DD strings and amounts are cents; the
+    bounds are inclusive and either end of a range may be left out.
+    """
+
+    def __init__(
+        self, category=None, description=None, transaction_type=None, date_from=None, date_to=None,
+        amount_min=None, amount_max=None, sort="date", descending=False, offset=0, limit=None,
+    ):
+        if transaction_type is not None and transaction_type not in TYPE_CODES:
+            raise ValueError(f"Unknown transaction type '{transaction_type}'.")
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort order '{sort}', use one of {', '.join(SORT_KEYS)}.")
+        self.category = category.lower() if category else None
+        self.description = description.lower() if description else None
+        self.transaction_type = transaction_type
+        self.date_from = date_from
+        self.date_to = date_to
+        self.amount_min = amount_min
+        self.amount_max = amount_max
+        self.sort = sort
+        self.descending = descending
+        self.offset = offset
+        self.limit = limit
+
+    @property
+    def date_range(self):
+        """(first, last) day ordinals, or None when no date is given"""
+        if self.date_from is None and self.date_to is None:
+            return None
+        first = date_to_ordinal(self.date_from) if self.date_from else FIRST_ORDINAL
+        last = date_to_ordinal(self.date_to) if self.date_to else LAST_ORDINAL
+        return first, last
+
+    def describe(self):
+        """The predicates in words, for the title of the results"""
+        parts = []
+        if self.category:
+            parts.append(f"category '{self.category}'")
+        if self.description:
+            parts.append(f"keyword '{self.description}'")
+        if self.transaction_type:
+            parts.append(f"type '{self.transaction_type}'")
+        if self.date_from or self.date_to:
+            parts.append(f"dates {self.date_from or '...'} to {self.date_to or '...'}")
+        if self.amount_min is not None or self.amount_max is not None:
+            low = format_amount(self.amount_min) if self.amount_min is not None else "..."
+            high = format_amount(self.amount_max) if self.amount_max is not None else "..."
+            parts.append(f"amounts {low} to {high}")
+        return ", ".join(parts) or "all transactions"
+
+
+class Plan:
+    """How a query runs: where its candidate rows come from and what is checked on them"""
+
+    def __init__(self, index, estimate, filters):
+        # "date index", "category index", "description index" or "full scan"
+        self.index = index
+        # Candidate rows the index gives, or an upper bound on them
+        self.estimate = estimate
+        # Predicates checked on the candidates, in order
+        self.filters = filters
+
+    def __str__(self):
+        checks = f"then {', '.join(self.filters)} in one pass" if self.filters else "no further checks"
+        return f"{self.index} ({self.estimate} candidate rows), {checks}"
+
+
+def plan_query(transactions, query):
+    """Pick the access path that gives the fewest candidate rows
+
+    The date index counts a range exactly. The category and description
+    indexes are used once a search has built them; the description one is
+    also built for a query that has nothing narrower, as a description
+    search would. Anything else is a vectorized scan of the live rows.
+    """
+    date_range = query.date_range
+    options = []
+    if date_range is not None:
+        # Counted on the index that gives the rows, not by the store, whose
+        # count may come from elsewhere, such as SQL on the SQLite backend
+        options.append(("date index", transactions.date_index.count(*date_range)))
+    if query.category and transactions.has_search_index:
+        options.append(("category index", transactions.search_index.count_category(query.category)))
+    if query.description and (transactions.has_search_index or not options):
+        options.append(("description index", transactions.search_index.estimate_description(query.description)))
+    options.append(("full scan", len(transactions)))
+    # min() keeps the first of equal options, so an index wins a tie with the scan
+    index, estimate = min(options, key=lambda option: option[1])
+
+    filters = []
+    if date_range is not None and index != "date index":
+        filters.append("dates")
+    if query.category and index != "category index":
+        filters.append("category")
+    if query.transaction_type:
+        filters.append("type")
+    if query.amount_min is not None or query.amount_max is not None:
+        filters.append("amount")
+    # Substrings are checked last, on the rows the columns let through
+    if query.description and index != "description index":
+        filters.append("description")
+    return Plan(index, estimate, filters)
+
+
+def run_query(transactions, query):
+    """Return (rows, total, plan): row numbers of the requested page in order, and the number of matches"""
+    plan = plan_query(transactions, query)
+    date_range = query.date_range
+    if plan.index == "date index":
+        rows = np.fromiter(transactions.date_index.rows(*date_range), dtype=np.int64, count=plan.estimate)
+    elif plan.index == "category index":
+        rows = np.array(transactions.search_index.find_category(query.category), dtype=np.int64)
+    elif plan.index == "description index":
+        rows = np.array(transactions.search_index.find_description(query.description), dtype=np.int64)
+    else:
+        rows = transactions.live_rows()
+
+    # Every column predicate is combined into one mask over the candidates
+    mask = np.ones(len(rows), dtype=bool)
+    if "dates" in plan.filters:
+        dates = transactions.dates[rows]
+        mask &= (dates >= date_range[0]) & (dates <= date_range[1])
+    if "category" in plan.filters:
+        # Only the distinct category names are matched as text
+        codes = [code for code, name in enumerate(transactions.category_names) if query.category in name.lower()]
+        mask &= np.isin(transactions.categories[rows], codes)
+    if "type" in plan.filters:
+        mask &= transactions.types[rows] == TYPE_CODES[query.transaction_type]
+    if query.amount_min is not None:
+        mask &= transactions.amounts[rows] >= query.amount_min
+    if query.amount_max is not None:
+        mask &= transactions.amounts[rows] <= query.amount_max
+    rows = rows[mask]
+    if "description" in plan.filters:
+        keep = [query.description in transactions.descriptions[row].lower() for row in rows.tolist()]
+        rows = rows[np.array(keep, dtype=bool)]
+
+    # Ties are broken by id, so paging through results is stable
+    ids = transactions.ids[rows]
+    if query.sort == "id":
+        order = np.argsort(ids, kind="stable")
+    else:
+        values = transactions.dates[rows] if query.sort == "date" else transactions.amounts[rows]
+        order = np.lexsort((ids, values))
+    if query.descending:
+        order = order[::-1]
+
+    stop = None if query.limit is None else query.offset + query.limit
+    return rows[order][query.offset:stop], len(rows), plan
@@ -0,0 +1,89 @@
+def trigrams(text):
+    """Return the set of 3-character substrings of a lowercase text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Category and description indexes for substring search"""
+
+    def __init__(self):
+        # Lowercase category -> rows with that category
+        self.category_rows = {}
+        # Trigram of a lowercase description -> rows containing it
+        self.trigram_rows = {}
+        # Lowercase descriptions, used to confirm trigram candidates
+        self.descriptions = {}
+
+    def add(self, row, category, description):
+        """Index a new or edited row"""
+        self.category_rows.setdefault(category.lower(), set()).add(row)
+
+        description = description.lower()
+        self.descriptions[row] = description
+        for gram in trigrams(description):
+            self.trigram_rows.setdefault(gram, set()).add(row)
+
+    def remove(self, row, category, description):
+        """Drop a row from the indexes"""
+        key = category.lower()
+        rows = self.category_rows.get(key)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self.category_rows[key]
+
+        description = self.descriptions.pop(row, description.lower())
+        for gram in trigrams(description):
+            rows = self.trigram_rows.get(gram)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self.trigram_rows[gram]
+
+    def count_category(self, text):
+        """Count rows whose category contains text"""
+        text = text.lower()
+        return sum(len(rows) for category, rows in self.category_rows.items() if text in category)
+
+    def estimate_description(self, keyword):
+        """Upper bound on the rows whose description contains keyword, without reading them"""
+        grams = trigrams(keyword.lower())
+        if not grams:
+            return len(self.descriptions)
+        return min(len(self.trigram_rows.get(gram, ())) for gram in grams)
+
+    def find_category(self, text):
+        """Return sorted rows whose category contains text"""
+        text = text.lower()
+        rows = set()
+        # Only the distinct categories are scanned, not the transactions
+        for category, category_rows in self.category_rows.items():
+            if text in category:
+                rows |= category_rows
+        return sorted(rows)
+
+    def find_description(self, keyword):
+        """Return sorted rows whose description contains keyword"""
+        keyword = keyword.lower()
+        grams = trigrams(keyword)
+        if not grams:
+            # Too short for trigrams: check every description
+            return sorted(row for row, description in self.descriptions.items() if keyword in description)
+
+        postings = []
+        for gram in grams:
+            rows = self.trigram_rows.get(gram)
+            if not rows:
+                return []
+            postings.append(rows)
+
+        # Intersect starting from the rarest trigram
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for rows in postings[1:]:
+            candidates &= rows
+            if not candidates:
+                return []
+
+        # Trigrams can match out of order, so confirm the real substring
+        return sorted(row for row in candidates if keyword in self.descriptions[row])
@@ -0,0 +1,357 @@
+import os
+import pathlib
+import sqlite3
+
+import instrumentation
+from aggregate_cache import AggregateCache
+from storage import Storage
+from stream_loader import LedgerLoadError
+from transaction_store import TransactionStore, date_to_ordinal, ordinal_to_date
+
+# Pending changes are written in one SQL transaction once this many pile up
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions (type);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    type TEXT NOT NULL,
+    category TEXT NOT NULL,
+    day TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (type, category, day)
+);
+CREATE TABLE IF NOT EXISTS monthly_totals (
+    type TEXT NOT NULL,
+    category TEXT NOT NULL,
+    month TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (type, category, month)
+);
+CREATE TRIGGER IF NOT EXISTS rollup_insert AFTER INSERT ON transactions BEGIN
+    INSERT INTO daily_totals VALUES (new.type, new.category, new.date, new.amount, 1)
+        ON CONFLICT (type, category, day) DO UPDATE SET total = total + excluded.total, count = count + 1;
+    INSERT INTO monthly_totals VALUES (new.type, new.category, substr(new.date, 1, 7), new.amount, 1)
+        ON CONFLICT (type, category, month) DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS rollup_delete AFTER DELETE ON transactions BEGIN
+    UPDATE daily_totals SET total = total - old.amount, count = count - 1
+        WHERE type = old.type AND category = old.category AND day = old.date;
+    DELETE FROM daily_totals
+        WHERE type = old.type AND category = old.category AND day = old.date AND count = 0;
+    UPDATE monthly_totals SET total = total - old.amount, count = count - 1
+        WHERE type = old.type AND category = old.category AND month = substr(old.date, 1, 7);
+    DELETE FROM monthly_totals
+        WHERE type = old.type AND category = old.category AND month = substr(old.date, 1, 7) AND count = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS rollup_update AFTER UPDATE ON transactions BEGIN
+    UPDATE daily_totals SET total = total - old.amount, count = count - 1
+        WHERE type = old.type AND category = old.category AND day = old.date;
+    UPDATE monthly_totals SET total = total - old.amount, count = count - 1
+        WHERE type = old.type AND category = old.category AND month = substr(old.date, 1, 7);
+    INSERT INTO daily_totals VALUES (new.type, new.category, new.date, new.amount, 1)
+        ON CONFLICT (type, category, day) DO UPDATE SET total = total + excluded.total, count = count + 1;
+    INSERT INTO monthly_totals VALUES (new.type, new.category, substr(new.date, 1, 7), new.amount, 1)
+        ON CONFLICT (type, category, month) DO UPDATE SET total = total + excluded.total, count = count + 1;
+    DELETE FROM daily_totals
+        WHERE type = old.type AND category = old.category AND day = old.date AND count = 0;
+    DELETE FROM monthly_totals
+        WHERE type = old.type AND category = old.category AND month = substr(old.date, 1, 7) AND count = 0;
+END;
+"""
+
+# Bump when the rollup tables change; older databases rebuild them on opening
+ROLLUPS_VERSION = 2
+
+# Databases made before amounts were kept in cents hold REAL currency units.
+# Their columns keep REAL affinity, so values read back are int()ed.
+MIGRATE_TO_CENTS = "UPDATE transactions SET amount = CAST(round(amount * 100) AS INTEGER)"
+
+# Older versions saved dates as typed, e.g. 2025/1/5; these are padded once
+UNPADDED_DATES = "SELECT id, date FROM transactions WHERE date NOT GLOB '[0-9][0-9][0-9][0-9]/[0-9][0-9]/[0-9][0-9]'"
+
+REBUILD_ROLLUPS = [
+    "DELETE FROM daily_totals",
+    "DELETE FROM monthly_totals",
+    "INSERT INTO daily_totals SELECT type, category, date, SUM(amount), COUNT(*) FROM transactions"
+    " GROUP BY type, category, date",
+    "INSERT INTO monthly_totals SELECT type, category, substr(date, 1, 7), SUM(amount), COUNT(*) FROM transactions"
+    " GROUP BY type, category, substr(date, 1, 7)",
+]
+
+COLUMNS = "id, type, amount, category, description, date"
+
+# SQL expression for each aggregation group key in the two rollup tables;
+# dates are stored as YYYY/MM/DD text, so prefixes give the month and the year
+DAILY_EXPRESSIONS = {
+    "type": "type",
+    "category": "category",
+    "month": "substr(day, 1, 7)",
+    "day": "day",
+    "year": "substr(day, 1, 4)",
+}
+MONTHLY_EXPRESSIONS = {
+    "type": "type",
+    "category": "category",
+    "month": "month",
+    "year": "substr(month, 1, 4)",
+}
+
+
+def _row_to_dict(row):
+    return {
+        "id": row[0],
+        "type": row[1],
+        "amount": int(row[2]),
+        "category": row[3],
+        "description": row[4],
+        "date": row[5],
+    }
+
+
+def _params(transaction):
+    return (
+        transaction["id"],
+        transaction["type"],
+        transaction["amount"],
+        transaction["category"],
+        transaction["description"],
+        transaction["date"],
+    )
+
+
+class SqliteTransactionStore(TransactionStore):
+    """TransactionStore whose searches and totals run as SQL queries"""
+
+    pushdown = True
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+
+    def _query(self, sql, params=()):
+        # Queries must see every change made so far
+        self.storage.flush()
+        return self.storage.connection.execute(sql, params)
+
+    def find_by_category(self, text):
+        cursor = self._query(
+            f"SELECT {COLUMNS} FROM transactions WHERE instr(lower(category), ?) > 0 ORDER BY id",
+            (text.lower(),),
+        )
+        return [_row_to_dict(row) for row in cursor]
+
+    def find_by_description(self, keyword):
+        cursor = self._query(
+            f"SELECT {COLUMNS} FROM transactions WHERE instr(lower(description), ?) > 0 ORDER BY id",
+            (keyword.lower(),),
+        )
+        return [_row_to_dict(row) for row in cursor]
+
+    def find_by_type(self, transaction_type):
+        cursor = self._query(f"SELECT {COLUMNS} FROM transactions WHERE type = ? ORDER BY id", (transaction_type,))
+        return [_row_to_dict(row) for row in cursor]
+
+    def count_by_dates(self, first, last):
+        cursor = self._query(
+            "SELECT COUNT(*) FROM transactions WHERE date BETWEEN ? AND ?",
+            (ordinal_to_date(first), ordinal_to_date(last)),
+        )
+        return cursor.fetchone()[0]
+
+    def iter_by_dates(self, first, last):
+        cursor = self._query(
+            f"SELECT {COLUMNS} FROM transactions WHERE date BETWEEN ? AND ? ORDER BY date, id",
+            (ordinal_to_date(first), ordinal_to_date(last)),
+        )
+        for row in cursor:
+            yield _row_to_dict(row)
+
+    def group_totals(self, keys):
+        """Return {(key values...): [total, count]} rolled up from a rollup table"""
+        # The monthly table is much smaller, so it is used unless days are needed
+        if "day" in keys:
+            table, columns = "daily_totals", DAILY_EXPRESSIONS
+        else:
+            table, columns = "monthly_totals", MONTHLY_EXPRESSIONS
+        expressions = ", ".join(columns[key] for key in keys)
+        cursor = self._query(
+            f"SELECT {expressions}, SUM(total), SUM(count) FROM {table} GROUP BY {expressions}"
+        )
+        return {tuple(row[:len(keys)]): [int(row[-2]), row[-1]] for row in cursor}
+
+
+class SqliteStorage(Storage):
+    """SQLite database with indexes on date, category and type"""
+
+    def __init__(self, path, read_only=False):
+        """Open the database, creating or migrating its tables
+
+        A read-only database is copied into memory and migrated there.
+        Raises LedgerLoadError if the file is not a usable SQLite database.
+        """
+        super().__init__(path, read_only)
+        try:
+            if read_only:
+                source = sqlite3.connect(f"{pathlib.Path(path).absolute().as_uri()}?mode=ro", uri=True)
+                self.connection = sqlite3.connect(":memory:")
+                try:
+                    source.backup(self.connection)
+                finally:
+                    source.close()
+            else:
+                self.connection = sqlite3.connect(path)
+            # INSERT OR REPLACE then fires the delete trigger for the row it replaces
+            self.connection.execute("PRAGMA recursive_triggers = ON")
+            self.connection.executescript(SCHEMA)
+            if self._meta("amounts_in_cents") is None:
+                with self.connection:
+                    self.connection.execute(MIGRATE_TO_CENTS)
+                    self._write_meta("amounts_in_cents", 1)
+            if self._meta("dates_padded") is None:
+                self._pad_dates()
+                # Rows moved to other days and months
+                self._rebuild_rollup_tables()
+            if self._meta("rollups_version") != ROLLUPS_VERSION:
+                self._rebuild_rollup_tables()
+        except sqlite3.DatabaseError as e:
+            raise LedgerLoadError(f"{path} is not a usable SQLite database ({e}).")
+        self.pending = []
+        self.next_id = 1
+
+    def load(self, progress=None):
+        try:
+            return self._load()
+        except sqlite3.DatabaseError as e:
+            raise LedgerLoadError(f"{self.path} is not a usable SQLite database ({e}).")
+
+    def _load(self):
+        transactions = SqliteTransactionStore(self)
+        for row in self.connection.execute(f"SELECT {COLUMNS} FROM transactions ORDER BY id"):
+            transactions.append(_row_to_dict(row), bulk=True)
+        # The in-memory cache starts from the rollup tables instead of a scan
+        rollups = {
+            name: [
+                (transaction_type, category, period, int(total), count)
+                for transaction_type, category, period, total, count in self.connection.execute(
+                    f"SELECT * FROM {name}_totals"
+                )
+            ]
+            for name in ("daily", "monthly")
+        }
+        transactions.finish_bulk(AggregateCache.from_json(rollups))
+        instrumentation.count_bytes(read=os.path.getsize(self.path))
+
+        next_id = self._meta("next_id")
+        if next_id is not None:
+            transactions.reserve_ids(next_id)
+        return transactions
+
+    def save(self, transactions):
+        """Replace the whole table in one SQL transaction"""
+        self.pending = []
+        with self.connection:
+            self.connection.execute("DELETE FROM transactions")
+            self.connection.executemany(
+                f"INSERT INTO transactions ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                (_params(transaction) for transaction in transactions),
+            )
+            self._write_next_id(transactions.next_id())
+        instrumentation.count_bytes(written=os.path.getsize(self.path))
+
+    def rebuild_rollups(self, transactions):
+        """Recompute the rollup tables and the in-memory cache from the rows"""
+        self.flush()
+        self._rebuild_rollup_tables()
+        transactions.rebuild_aggregates()
+
+    def _rebuild_rollup_tables(self):
+        with self.connection:
+            for statement in REBUILD_ROLLUPS:
+                self.connection.execute(statement)
+            self._write_meta("rollups_version", ROLLUPS_VERSION)
+
+    def _pad_dates(self):
+        """Rewrite dates without leading zeros in the zero-padded form"""
+        try:
+            dates = [
+                (ordinal_to_date(date_to_ordinal(date)), transaction_id)
+                for transaction_id, date in self.connection.execute(UNPADDED_DATES)
+            ]
+        except ValueError as e:
+            raise LedgerLoadError(f"{self.path} holds an invalid date ({e}).")
+        with self.connection:
+            self.connection.executemany("UPDATE transactions SET date = ? WHERE id = ?", dates)
+            self._write_meta("dates_padded", 1)
+
+    def _meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _write_meta(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def record(self, transactions, op, transaction):
+        self.pending.append((op, transaction))
+        self.next_id = transactions.next_id()
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def record_batch(self, transactions, op, batch):
+        self.pending.extend((op, transaction) for transaction in batch)
+        self.next_id = transactions.next_id()
+        self.flush()
+
+    def flush(self):
+        """Write pending changes in a single SQL transaction"""
+        if not self.pending:
+            return
+
+        with self.connection:
+            # Consecutive changes of the same kind go through one executemany
+            run_op = None
+            run = []
+            for op, transaction in self.pending + [(None, None)]:
+                if op != run_op and run:
+                    self._execute_run(run_op, run)
+                    run = []
+                run_op = op
+                if transaction is not None:
+                    run.append(transaction)
+            self._write_next_id(self.next_id)
+        self.pending = []
+
+    def _execute_run(self, op, transactions):
+        if op == "delete":
+            self.connection.executemany(
+                "DELETE FROM transactions WHERE id = ?",
+                ((transaction["id"],) for transaction in transactions),
+            )
+        else:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO transactions ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                (_params(transaction) for transaction in transactions),
+            )
+
+    def _write_next_id(self, next_id):
+        # Deleted ids are never handed out again
+        self._write_meta("next_id", next_id)
+
+    def close(self):
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Startup budget for the text-only paths (menu and CLI), in milliseconds
+STARTUP_TARGET_MS = 300
+
+# Modules that only the chart paths may import
+CHART_MODULES = ("matplotlib", "matplotlib.pyplot")
+
+# Imports the menu and every non-chart CLI command, then lists chart modules that got loaded
+PROBE = (
+    "import sys, cli, main; "
+    f"print(','.join(name for name in {CHART_MODULES!r} if name in sys.modules))"
+)
+
+
+def measure(runs):
+    """Start a fresh interpreter runs times; return (median ms, loaded chart modules)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    loaded = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=here,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+        loaded = result.stdout.strip()
+    return statistics.median(timings), loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the startup time of the text-only paths")
+    parser.add_argument("--runs", type=int, default=7, help="interpreter starts to take the median of")
+    parser.add_argument("--target", type=float, default=STARTUP_TARGET_MS, help="budget in milliseconds")
+    args = parser.parse_args()
+
+    median, loaded = measure(args.runs)
+    print(f"Startup: {median:.0f} ms (median of {args.runs}), target {args.target:.0f} ms")
+
+    failed = False
+    if loaded:
+        print(f"❌ Chart modules loaded at startup: {loaded}")
+        failed = True
+    if median > args.target:
+        print("❌ Startup is over the target.")
+        failed = True
+    if not failed:
+        print("✅ Startup is within the target.")
+    sys.exit(1 if failed else 0)
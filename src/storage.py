@@ -0,0 +1,312 @@
+import argparse
+import json
+import os
+import struct
+import sys
+
+import instrumentation
+from aggregate_cache import AggregateCache
+from atomic_file import atomic_write
+from binary_format import BINARY_SUFFIX, read_binary, write_binary
+from journal import COMPACT_THRESHOLD, TransactionJournal, journal_path
+from money import from_record, to_record
+from stream_loader import LedgerLoadError, iter_records, write_records
+from transaction_store import TransactionStore, is_padded_date
+from write_behind import BackgroundWriter
+
+# Data files at least this large report progress while loading
+PROGRESS_MIN_BYTES = 50 * 1024 * 1024
+
+# Suffixes that select the SQLite backend
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+# Bump when the layout of the saved rollups changes; older files are rebuilt
+ROLLUPS_VERSION = 2
+
+# Folders with this suffix hold a ledger split into monthly or yearly files
+PARTITIONED_SUFFIX = ".ledger"
+
+
+def rollups_path(data_file):
+    """Return the file that keeps the daily and monthly rollups of a snapshot"""
+    return os.path.splitext(data_file)[0] + ".rollups.json"
+
+
+def _fingerprint(path):
+    """Size and modification time, which change whenever a file is rewritten"""
+    status = os.stat(path)
+    return [status.st_size, status.st_mtime_ns]
+
+
+class Storage:
+    """Where transactions are kept between runs
+
+    load() returns a TransactionStore, save() writes all of it, record()
+    persists one add/edit/delete, record_batch() persists many changes of
+    one kind together. commit() ends a unit of work such as a menu action;
+    flush() waits until every pending write is durable. A read-only storage
+    never changes its file, not even to migrate or compact it.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+
+    def load(self, progress=None):
+        raise NotImplementedError
+
+    def save(self, transactions):
+        raise NotImplementedError
+
+    def record(self, transactions, op, transaction):
+        raise NotImplementedError
+
+    def record_batch(self, transactions, op, batch):
+        for transaction in batch:
+            self.record(transactions, op, transaction)
+
+    def commit(self):
+        self.flush()
+
+    def flush(self):
+        pass
+
+    def rebuild_rollups(self, transactions):
+        """Recompute the daily and monthly rollups from the rows and save them"""
+        transactions.rebuild_aggregates()
+        self.save(transactions)
+
+    def close(self):
+        self.flush()
+
+
+class SnapshotStorage(Storage):
+    """A snapshot file plus an append-only journal of later changes
+
+    Writes happen on a background thread: changes are queued and written
+    together once they stop arriving for a moment, so the menu never waits
+    for the disk. Snapshots are written to a temporary file and renamed.
+    Each snapshot is followed by a rollups file with its daily and monthly
+    totals, so loading does not have to recompute them.
+    """
+
+    def __init__(self, path, read_only=False):
+        super().__init__(path, read_only)
+        self.journal = TransactionJournal(journal_path(path))
+        self.rollups_path = rollups_path(path)
+        # Journal records since the last snapshot, counting queued ones
+        self.journal_records = 0
+        self.writer = BackgroundWriter(self._write_pending)
+
+    def read_snapshot(self, progress, aggregates=None):
+        """Return (store, repaired) read from the snapshot file
+
+        aggregates, if given, is the saved AggregateCache of the snapshot.
+        """
+        raise NotImplementedError
+
+    def write_snapshot(self, transactions):
+        raise NotImplementedError
+
+    def load(self, progress=None):
+        """Read the snapshot and replay the journal on top of it
+
+        Raises LedgerLoadError if the snapshot is damaged.
+        """
+        transactions = TransactionStore()
+        repaired = False
+        if os.path.exists(self.path):
+            if os.path.getsize(self.path) < PROGRESS_MIN_BYTES:
+                progress = None
+            transactions, repaired = self.read_snapshot(progress, self.read_rollups())
+            instrumentation.count_bytes(read=os.path.getsize(self.path))
+        elif not os.path.exists(self.journal.path):
+            # Changes made before any snapshot was written are still loaded
+            print("Data file not found.")
+
+        # Changes made after the last snapshot
+        self.journal.replay(transactions)
+        self.journal_records = self.journal.count
+
+        # Keep startup bounded by folding a long journal into the snapshot
+        if (self.journal.needs_compaction() or repaired) and not self.read_only:
+            self.save(transactions)
+        return transactions
+
+    def save(self, transactions):
+        """Queue a full snapshot; the copy taken here is written in the background"""
+        self.journal_records = 0
+        self.writer.submit(("snapshot", transactions.copy_rows()))
+
+    def record(self, transactions, op, transaction):
+        self.record_batch(transactions, op, [transaction])
+
+    def record_batch(self, transactions, op, batch):
+        # Changes that would fill the journal go straight into a snapshot
+        if self.journal_records + len(batch) >= COMPACT_THRESHOLD:
+            self.save(transactions)
+        else:
+            self.journal_records += len(batch)
+            self.writer.submit_many([("journal", (op, dict(transaction))) for transaction in batch])
+
+    def commit(self):
+        # The writer thread decides when to write
+        pass
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+    def read_rollups(self):
+        """Return the saved AggregateCache of the snapshot, or None if it must be rebuilt"""
+        try:
+            with open(self.rollups_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            instrumentation.count_bytes(read=os.path.getsize(self.rollups_path))
+            # Rollups saved with an older snapshot do not count its rows
+            if data["version"] != ROLLUPS_VERSION or data["snapshot"] != _fingerprint(self.path):
+                return None
+            return AggregateCache.from_json(data)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def write_rollups(self, copy):
+        """Save the rollups of a snapshot copy just written"""
+        copy.rebuild_aggregates()
+        data = {"version": ROLLUPS_VERSION, "snapshot": _fingerprint(self.path), **copy.aggregates.to_json()}
+        with atomic_write(self.rollups_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        instrumentation.count_bytes(written=os.path.getsize(self.rollups_path))
+
+    def _write_pending(self, items):
+        """Write a burst of queued changes; runs on the writer thread"""
+        # A snapshot already holds every change queued before it, so only
+        # the newest snapshot and the changes after it are written
+        start = 0
+        for index, (kind, payload) in enumerate(items):
+            if kind == "snapshot":
+                start = index
+        if items[start][0] == "snapshot":
+            copy = items[start][1]
+            self.write_snapshot(copy)
+            instrumentation.count_bytes(written=os.path.getsize(self.path))
+            self.write_rollups(copy)
+            # Snapshot now holds every change, so the journal can start over
+            self.journal.reset()
+            self.journal.reserve(copy.next_id())
+            start += 1
+
+        records = [payload for kind, payload in items[start:]]
+        if records:
+            self.journal.append_records(records)
+
+
+class JsonStorage(SnapshotStorage):
+    """Indented JSON array snapshot, as in financial_data.json"""
+
+    def read_snapshot(self, progress, aggregates=None):
+        transactions = TransactionStore()
+        duplicates = []
+        legacy = False
+        for number, record in enumerate(iter_records(self.path, progress), start=1):
+            try:
+                # Files from before amounts were kept in cents, or with dates
+                # that are not zero-padded, are rewritten once read
+                legacy = legacy or "amount" in record or not is_padded_date(record["date"])
+                transaction = from_record(record)
+                if transaction["id"] in transactions:
+                    # Older versions renumbered ids on delete and could repeat them
+                    duplicates.append(transaction)
+                else:
+                    transactions.append(transaction, bulk=True)
+            except (KeyError, TypeError, ValueError) as e:
+                raise LedgerLoadError(f"Transaction number {number} is invalid ({e!r}).")
+
+        # Give repeated ids fresh numbers once every original id is known
+        for transaction in duplicates:
+            transaction["id"] = transactions.next_id()
+            transactions.append(transaction, bulk=True)
+
+        transactions.finish_bulk(aggregates)
+        return transactions, bool(duplicates) or legacy
+
+    def write_snapshot(self, transactions):
+        with atomic_write(self.path, 'w', encoding='utf-8') as f:
+            write_records(f, map(to_record, transactions))
+
+
+class BinaryStorage(SnapshotStorage):
+    """Memory-mapped binary snapshot, see binary_format.py"""
+
+    def read_snapshot(self, progress, aggregates=None):
+        # Columns are mapped straight from the file, nothing is parsed
+        try:
+            return read_binary(self.path, aggregates)
+        except (OSError, ValueError) as e:
+            raise LedgerLoadError(str(e))
+        except (struct.error, KeyError, TypeError) as e:
+            # A truncated file or a damaged header
+            raise LedgerLoadError(f"{self.path} is damaged ({e!r}).")
+
+    def write_snapshot(self, transactions):
+        write_binary(transactions, self.path)
+
+
+def open_storage(path, granularity=None, read_only=False):
+    """Return the storage backend for a data file, chosen by its suffix
+
+    granularity ('month' or 'year') applies to partitioned ledger folders.
+    """
+    if path.endswith(PARTITIONED_SUFFIX) or os.path.isdir(path):
+        # Imported here because the partitioned backend builds on this module
+        from partitioned_storage import PartitionedStorage
+        return PartitionedStorage(path, granularity, read_only)
+    if path.endswith(SQLITE_SUFFIXES):
+        # Imported here so the JSON and binary paths never load sqlite3
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage(path, read_only)
+    if path.endswith(BINARY_SUFFIX):
+        return BinaryStorage(path, read_only)
+    return JsonStorage(path, read_only)
+
+
+def convert(source, target, granularity=None):
+    """Copy a ledger from one storage format to another; the source is left as it is
+
+    Raises LedgerLoadError if the source is damaged, ValueError if the
+    target is a ledger folder split another way.
+    """
+    source_storage = open_storage(source, read_only=True)
+    try:
+        transactions = source_storage.load()
+        storage = open_storage(target, granularity)
+        try:
+            storage.save(transactions)
+        finally:
+            storage.close()
+    finally:
+        source_storage.close()
+    print(f" {len(transactions)} transactions written to {target}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert a ledger between JSON, binary, SQLite and partitioned storage"
+    )
+    parser.add_argument("source", help="financial_data.json, a .bin file, a .db file or a .ledger folder")
+    parser.add_argument("target", help="file to write; its suffix (.json, .bin, .db, .ledger) selects the format")
+    parser.add_argument(
+        "--partition", choices=["month", "year"],
+        help="split a .ledger target into one file per month (default) or per year",
+    )
+    args = parser.parse_args()
+
+    if os.path.abspath(args.source) == os.path.abspath(args.target):
+        parser.error("source and target must be different files")
+    try:
+        convert(args.source, args.target, args.partition)
+    except (LedgerLoadError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
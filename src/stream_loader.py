@@ -0,0 +1,122 @@
+import codecs
+import json
+import os
+import textwrap
+
+# Bytes read from the data file at a time
+CHUNK_SIZE = 1 << 16
+
+WHITESPACE = " \t\r\n"
+
+
+class LedgerLoadError(Exception):
+    """Raised when the data file cannot be read completely"""
+
+
+class JsonArrayReader:
+    """Read the records of a top-level JSON array one at a time"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE, progress=None):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.bytes_read = 0
+        self.count = 0
+
+    def _fill(self):
+        """Drop the consumed part of the buffer and read the next chunk"""
+        chunk = self.f.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        if not chunk:
+            self.eof = True
+        text = self.text_decoder.decode(chunk, final=self.eof)
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+        if self.progress is not None:
+            self.progress(self.bytes_read)
+
+    def _next_char(self):
+        """Skip whitespace and return the next character, or '' at the end"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def _decode_value(self):
+        while True:
+            self._next_char()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A bare number cut by the chunk boundary may still go on
+                complete = isinstance(value, (dict, list)) or (
+                    end < len(self.buffer) and self.buffer[end] in WHITESPACE + ",]"
+                )
+                if complete or self.eof:
+                    self.position = end
+                    return value
+                self._fill()
+            except json.JSONDecodeError:
+                # The record may simply continue in the next chunk
+                if self.eof:
+                    raise LedgerLoadError(f"Invalid JSON after record {self.count}.")
+                self._fill()
+
+    def __iter__(self):
+        if self._next_char() != "[":
+            raise LedgerLoadError("The data file does not contain a JSON array.")
+        self.position += 1
+
+        if self._next_char() == "]":
+            return
+
+        while True:
+            record = self._decode_value()
+            self.count += 1
+            yield record
+
+            char = self._next_char()
+            if char == ",":
+                self.position += 1
+            elif char == "]":
+                return
+            elif char == "":
+                raise LedgerLoadError(f"The data file ends in the middle of the array, after record {self.count}.")
+            else:
+                raise LedgerLoadError(f"Unexpected '{char}' after record {self.count}.")
+
+
+def iter_records(path, progress=None):
+    """Yield the transaction dicts of a JSON data file without loading it whole
+
+    progress, if given, is called with (bytes_read, total_bytes) after each chunk.
+    """
+    total = os.path.getsize(path)
+    report = None
+    if progress is not None:
+        report = lambda bytes_read: progress(bytes_read, total)
+
+    try:
+        with open(path, 'rb') as f:
+            yield from JsonArrayReader(f, progress=report)
+    except UnicodeDecodeError as e:
+        raise LedgerLoadError(f"The data file is not valid UTF-8: {e}")
+    except OSError as e:
+        raise LedgerLoadError(f"Cannot read {path}: {e}")
+
+
+def write_records(f, records):
+    """Write records as a JSON array one at a time, laid out like json.dump(indent=4)"""
+    f.write("[")
+    for number, record in enumerate(records):
+        f.write(",\n" if number else "\n")
+        f.write(textwrap.indent(json.dumps(record, ensure_ascii=False, indent=4), "    "))
+    f.write("\n]")
@@ -0,0 +1,59 @@
+import sys
+from itertools import islice
+
+from money import format_amount
+
+# Rows shown per page in the menu
+PAGE_SIZE = 20
+
+# Rows joined into one write when printing a long table
+BLOCK_ROWS = 10_000
+
+HEADER = f"\n{'ID':<4} {'Date':<12} {'Type':<8} {'Category':<15} {'Amount':<12} {'Description'}\n" + "-" * 70
+ROW_FORMAT = "{:<4} {:<12} {:<8} {:<15} {:<12} {}"
+
+
+def page(rows, offset=0, limit=None):
+    """Return an iterator over rows[offset:offset + limit] without building a list"""
+    return islice(rows, offset, None if limit is None else offset + limit)
+
+
+def format_rows(rows):
+    """Yield one table line per transaction"""
+    row_format = ROW_FORMAT.format
+    for t in rows:
+        yield row_format(t["id"], t["date"], t["type"], t["category"], f"{format_amount(t['amount'], 0)} $", t["description"])
+
+
+def write_table(rows, out=None):
+    """Write transactions as a table, a block of lines per write
+
+    Returns the number of rows written.
+    """
+    out = out or sys.stdout
+    lines = [HEADER]
+    written = 0
+    for line in format_rows(rows):
+        lines.append(line)
+        written += 1
+        if len(lines) >= BLOCK_ROWS:
+            out.write("\n".join(lines) + "\n")
+            lines = []
+    if lines:
+        out.write("\n".join(lines) + "\n")
+    out.flush()
+    return written
+
+
+def browse(rows, total, page_size=PAGE_SIZE):
+    """Show rows a page at a time until they run out or the user stops"""
+    rows = iter(rows)
+    shown = 0
+    while shown < total:
+        written = write_table(islice(rows, page_size))
+        shown += written
+        if written < page_size or shown >= total:
+            break
+        answer = input(f"Shown {shown} of {total}. Press Enter for more, q to stop: ")
+        if answer.strip().lower() == "q":
+            break
@@ -0,0 +1,509 @@
+import calendar
+import os
+from datetime import date, datetime
+
+import numpy as np
+
+from aggregate_cache import AggregateCache
+from date_index import DateIndex
+from search_index import SearchIndex
+
+# Format of dates in the data file and in the user interface
+DATE_FORMAT = "%Y/%m/%d"
+
+# Transaction types and their codes in the type column
+TYPES = ["income", "expense"]
+TYPE_CODES = {"income": 0, "expense": 1}
+
+# Rows converted from the columns at a time when iterating
+ROW_CHUNK = 4096
+
+# Rows of each column handed out at a time by iter_column_chunks
+COLUMN_CHUNK = 65536
+
+# Ordinal of 1970/01/01, used to turn ordinals into numpy dates
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Months from year 0 to 1970/01
+EPOCH_MONTH = 1970 * 12
+
+# Ledgers with fewer live rows have their rollups summed in this process,
+# below this a process pool costs more to start than it saves
+PARALLEL_MIN_ROWS = 2_000_000
+
+
+def is_padded_date(value):
+    """True for a date in the zero-padded YYYY/MM/DD form the program writes"""
+    return len(value) == 10 and value[4] == "/" and value[7] == "/"
+
+
+def date_to_ordinal(value):
+    """Convert a YYYY/MM/DD string to a day ordinal
+
+    Older versions saved dates as typed, e.g. 2025/1/5, so anything that is
+    not zero-padded goes through strptime.
+    """
+    if is_padded_date(value):
+        return date(int(value[:4]), int(value[5:7]), int(value[8:10])).toordinal()
+    return datetime.strptime(value, DATE_FORMAT).toordinal()
+
+
+def ordinal_to_date(ordinal):
+    """Convert a day ordinal back to a YYYY/MM/DD string"""
+    return date.fromordinal(int(ordinal)).strftime(DATE_FORMAT)
+
+
+def ordinal_to_month(ordinal):
+    """Convert a day ordinal to a YYYY/MM month string"""
+    day = date.fromordinal(int(ordinal))
+    return f"{day.year:04d}/{day.month:02d}"
+
+
+def group_sums(keys, amounts, counts=None):
+    """Sum amounts per distinct key; returns (keys, sums, counts) sorted by key
+
+    counts gives the number of rows behind each amount when the amounts are
+    themselves sums, as when merging partial results.
+    """
+    # Sorting brings equal keys together, so each group is one run that
+    # np.add.reduceat sums in int64 without any rounding
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    sums = np.add.reduceat(amounts[order], starts)
+    if counts is None:
+        counts = np.diff(np.r_[starts, len(keys)])
+    else:
+        counts = np.add.reduceat(counts[order], starts)
+    return keys[starts], sums, counts
+
+
+def rollup_sums(groups, dates, amounts):
+    """Return the (daily, monthly) group sums of rows, each as from group_sums
+
+    groups are the category and type codes of each row, dates its day
+    ordinals. Keys are group << 32 | day ordinal, or months from year 0.
+    """
+    # Months counted from year 0, so they are never negative
+    months = (dates - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) + EPOCH_MONTH
+    groups = groups << 32
+    return group_sums(groups | dates, amounts), group_sums(groups | months, amounts)
+
+
+def month_bounds(year, month):
+    """Return the first and last day ordinals of a month"""
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, 1).toordinal(), date(year, month, last_day).toordinal()
+
+
+class StringTable:
+    """Table of strings stored apart from the numeric columns"""
+
+    def __init__(self):
+        self._values = []
+
+    def append(self, value):
+        self._values.append(value)
+
+    def __getitem__(self, row):
+        return self._values[row]
+
+    def __setitem__(self, row, value):
+        self._values[row] = value
+
+    def __len__(self):
+        return len(self._values)
+
+    def copy(self):
+        table = StringTable()
+        table._values = list(self._values)
+        return table
+
+
+class TransactionStore:
+    """Columnar transaction storage backed by typed NumPy arrays"""
+
+    # Set by stores whose backend answers group_totals() itself
+    pushdown = False
+
+    def __init__(self, capacity=1024):
+        # Rows are never moved: deleted rows stay behind as tombstones
+        self._size = 0
+        self._live = 0
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        # Whole cents, so sums are exact
+        self.amounts = np.zeros(capacity, dtype=np.int64)
+        self.dates = np.zeros(capacity, dtype=np.int32)
+        self.types = np.zeros(capacity, dtype=np.int8)
+        self.categories = np.zeros(capacity, dtype=np.int32)
+
+        # Dictionary encoding of category names
+        self.category_names = []
+        self._category_codes = {}
+
+        self.descriptions = StringTable()
+
+        # Hash index from transaction id to row, and the next id to hand out
+        self._rows_by_id = {}
+        self._next_id = 1
+
+        # Category and description search indexes, built on first search
+        # and then kept in step with the rows
+        self._search_index = None
+        self.date_index = DateIndex()
+
+        # Running totals for balance, reports and charts
+        self.aggregates = AggregateCache()
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        """Build a store from a list of transaction dicts"""
+        store = cls()
+        for transaction in transactions:
+            store.append(transaction, bulk=True)
+        store.finish_bulk()
+        return store
+
+    @classmethod
+    def from_columns(
+        cls, ids, amounts, dates, types, categories, category_names, descriptions, next_id=1, aggregates=None
+    ):
+        """Build a store around existing column arrays, e.g. memory-mapped ones
+
+        The arrays are used as they are; they are only copied when the store
+        has to grow.
+        """
+        store = cls(capacity=0)
+        count = len(ids)
+        store._size = count
+        store._live = count
+        store.alive = np.ones(count, dtype=bool)
+        store.ids = ids
+        store.amounts = amounts
+        store.dates = dates
+        store.types = types
+        store.categories = categories
+        store.category_names = list(category_names)
+        store._category_codes = {name: code for code, name in enumerate(store.category_names)}
+        store.descriptions = descriptions
+        store._rows_by_id = dict(zip(ids.tolist(), range(count)))
+        if len(store._rows_by_id) != count:
+            raise ValueError("Duplicate transaction ids in columns")
+        store._next_id = max(next_id, int(ids.max()) + 1 if count else 1)
+        store.finish_bulk(aggregates)
+        return store
+
+    def finish_bulk(self, aggregates=None):
+        """Build the date index and aggregates after bulk appends
+
+        aggregates, if given, is a saved AggregateCache that already counts
+        every row and is used instead of recomputing one.
+        """
+        # One sort and one set of reductions are much cheaper than
+        # maintaining the date index and totals row by row
+        self.date_index.build(self.live_rows(), self.live_column(self.dates))
+        if aggregates is None:
+            self.rebuild_aggregates()
+        else:
+            self.aggregates = aggregates
+
+    @property
+    def search_index(self):
+        if self._search_index is None:
+            index = SearchIndex()
+            for row in self.live_rows().tolist():
+                index.add(row, self.category_names[self.categories[row]], self.descriptions[row])
+            self._search_index = index
+        return self._search_index
+
+    @property
+    def has_search_index(self):
+        """True once a search has built the category and description indexes"""
+        return self._search_index is not None
+
+    def __len__(self):
+        return self._live
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self._rows_by_id
+
+    def __iter__(self):
+        return self.iter_rows()
+
+    def iter_rows(self, offset=0, limit=None):
+        """Yield live transactions in row order, skipping offset and stopping after limit
+
+        Columns are read a chunk of rows at a time, which is much faster than
+        reading every field of every row on its own.
+        """
+        rows = self.live_rows()[offset:None if limit is None else offset + limit]
+        date_strings = {}
+        for start in range(0, len(rows), ROW_CHUNK):
+            chunk = rows[start:start + ROW_CHUNK]
+            columns = zip(
+                chunk.tolist(),
+                self.ids[chunk].tolist(),
+                self.types[chunk].tolist(),
+                self.amounts[chunk].tolist(),
+                self.categories[chunk].tolist(),
+                self.dates[chunk].tolist(),
+            )
+            for row, transaction_id, type_code, amount, category_code, ordinal in columns:
+                date_string = date_strings.get(ordinal)
+                if date_string is None:
+                    date_string = date_strings[ordinal] = ordinal_to_date(ordinal)
+                yield {
+                    "id": transaction_id,
+                    "type": TYPES[type_code],
+                    "amount": amount,
+                    "category": self.category_names[category_code],
+                    "description": self.descriptions[row],
+                    "date": date_string,
+                }
+
+    def iter_column_chunks(self, *names):
+        """Yield the live part of the named columns, a chunk of rows at a time
+
+        Each item is a tuple of arrays, one per name, e.g. ("amounts",
+        "types"). Streaming reports read the ledger this way without a copy
+        of whole columns.
+        """
+        for start in range(0, self._size, COLUMN_CHUNK):
+            stop = min(start + COLUMN_CHUNK, self._size)
+            if self._live == self._size:
+                yield tuple(getattr(self, name)[start:stop] for name in names)
+            else:
+                alive = self.alive[start:stop]
+                yield tuple(getattr(self, name)[start:stop][alive] for name in names)
+
+    def to_list(self):
+        """Return all transactions as a list of dicts"""
+        return list(self)
+
+    def copy_rows(self, rows=None):
+        """Return a copy of the rows that later changes to this store do not touch
+
+        rows is an array of row numbers to copy, by default every row. The
+        copy has no indexes or aggregates. It supports iteration, live_rows,
+        live_column, next_id and rebuild_aggregates, which is all snapshot
+        writers need.
+        """
+        copy = TransactionStore.__new__(TransactionStore)
+        if rows is None:
+            copy._size = self._size
+            copy._live = self._live
+            for name in ("alive", "ids", "amounts", "dates", "types", "categories"):
+                setattr(copy, name, getattr(self, name)[:self._size].copy())
+            copy.descriptions = self.descriptions.copy()
+        else:
+            copy._size = copy._live = len(rows)
+            copy.alive = np.ones(len(rows), dtype=bool)
+            for name in ("ids", "amounts", "dates", "types", "categories"):
+                setattr(copy, name, getattr(self, name)[rows])
+            copy.descriptions = StringTable()
+            copy.descriptions._values = [self.descriptions[row] for row in rows.tolist()]
+        copy.category_names = list(self.category_names)
+        copy._next_id = self._next_id
+        return copy
+
+    def _grow(self):
+        """Double the capacity of every column"""
+        capacity = max(1024, self._size * 2)
+        for name in ("alive", "ids", "amounts", "dates", "types", "categories"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _category_code(self, category):
+        """Return the code of a category, adding it if it is new"""
+        code = self._category_codes.get(category)
+        if code is None:
+            code = len(self.category_names)
+            self.category_names.append(category)
+            self._category_codes[category] = code
+        return code
+
+    def _write_row(self, row, transaction):
+        self.ids[row] = transaction["id"]
+        self.amounts[row] = transaction["amount"]
+        self.dates[row] = date_to_ordinal(transaction["date"])
+        self.types[row] = TYPE_CODES[transaction["type"]]
+        self.categories[row] = self._category_code(transaction["category"])
+
+    def _row_to_dict(self, row):
+        return {
+            "id": int(self.ids[row]),
+            "type": TYPES[self.types[row]],
+            "amount": int(self.amounts[row]),
+            "category": self.category_names[self.categories[row]],
+            "description": self.descriptions[row],
+            "date": ordinal_to_date(self.dates[row]),
+        }
+
+    def _count_row(self, row, change):
+        """Add a row to, or take it out of, the aggregate cache"""
+        change(
+            TYPES[self.types[row]],
+            self.category_names[self.categories[row]],
+            ordinal_to_date(self.dates[row]),
+            int(self.amounts[row]),
+        )
+
+    def _find_row(self, transaction_id):
+        return self._rows_by_id.get(transaction_id)
+
+    def live_rows(self):
+        """Return the row numbers of live rows"""
+        return np.flatnonzero(self.alive[:self._size])
+
+    def live_column(self, column):
+        """Return the part of a column that belongs to live rows"""
+        values = column[:self._size]
+        if self._live == self._size:
+            return values
+        return values[self.alive[:self._size]]
+
+    def next_id(self):
+        """Return the id for a new transaction"""
+        return self._next_id
+
+    def reserve_ids(self, next_id):
+        """Make sure ids below next_id are never handed out again"""
+        self._next_id = max(self._next_id, next_id)
+
+    def append(self, transaction, bulk=False):
+        """Add a transaction dict to the store
+
+        With bulk=True the date index and aggregates are left to
+        finish_bulk() once all rows are in.
+        """
+        if transaction["id"] in self._rows_by_id:
+            raise ValueError(f"Duplicate transaction id {transaction['id']}")
+        if self._size == len(self.ids):
+            self._grow()
+        row = self._size
+        self._write_row(row, transaction)
+        self.descriptions.append(transaction["description"])
+        if self._search_index is not None:
+            self._search_index.add(row, transaction["category"], transaction["description"])
+        if not bulk:
+            self.date_index.add(row, int(self.dates[row]))
+            self._count_row(row, self.aggregates.add)
+        self.alive[row] = True
+        self._rows_by_id[transaction["id"]] = row
+        self._next_id = max(self._next_id, transaction["id"] + 1)
+        self._size += 1
+        self._live += 1
+
+    def get(self, transaction_id):
+        """Return a transaction dict by id, or None"""
+        row = self._find_row(transaction_id)
+        if row is None:
+            return None
+        return self._row_to_dict(row)
+
+    def update(self, transaction):
+        """Write an edited transaction dict back to the store"""
+        row = self._find_row(transaction["id"])
+        if row is None:
+            return False
+        if self._search_index is not None:
+            self._search_index.remove(row, self.category_names[self.categories[row]], self.descriptions[row])
+        self.date_index.remove(row, int(self.dates[row]))
+        self._count_row(row, self.aggregates.remove)
+        self._write_row(row, transaction)
+        self.descriptions[row] = transaction["description"]
+        if self._search_index is not None:
+            self._search_index.add(row, transaction["category"], transaction["description"])
+        self.date_index.add(row, int(self.dates[row]))
+        self._count_row(row, self.aggregates.add)
+        return True
+
+    def remove(self, transaction_id):
+        """Remove a transaction by id, leaving a tombstone in its row"""
+        row = self._rows_by_id.pop(transaction_id, None)
+        if row is None:
+            return False
+        if self._search_index is not None:
+            self._search_index.remove(row, self.category_names[self.categories[row]], self.descriptions[row])
+        self.date_index.remove(row, int(self.dates[row]))
+        self._count_row(row, self.aggregates.remove)
+        self.alive[row] = False
+        self.descriptions[row] = ""
+        self._live -= 1
+        return True
+
+    # Indexed searches
+
+    def find_by_category(self, text):
+        """Return transactions whose category contains text"""
+        return [self._row_to_dict(row) for row in self.search_index.find_category(text)]
+
+    def find_by_description(self, keyword):
+        """Return transactions whose description contains keyword"""
+        return [self._row_to_dict(row) for row in self.search_index.find_description(keyword)]
+
+    def find_by_type(self, transaction_type):
+        """Return transactions of one type"""
+        rows = self.live_rows()[self.live_column(self.types) == TYPE_CODES[transaction_type]]
+        return [self._row_to_dict(row) for row in rows.tolist()]
+
+    def count_by_dates(self, first, last):
+        """Count transactions dated between first and last ordinals"""
+        return self.date_index.count(first, last)
+
+    def iter_by_dates(self, first, last):
+        """Yield transactions dated between first and last ordinals in date order"""
+        for row in self.date_index.rows(first, last):
+            yield self._row_to_dict(row)
+
+    def query(self, query):
+        """Run a query.Query; returns (transaction dicts of the requested page, total matches, plan)"""
+        # Imported here because query imports this module
+        from query import run_query
+        rows, total, plan = run_query(self, query)
+        return [self._row_to_dict(row) for row in rows.tolist()], total, plan
+
+    # Aggregate cache
+
+    def rebuild_aggregates(self):
+        """Recompute the aggregate cache with vectorized reductions
+
+        Large ledgers are summed in shards by a process pool, see
+        parallel_rollups.
+        """
+        if self._live == 0:
+            self.aggregates = AggregateCache()
+            return
+
+        # Group = category code * number of types + type code
+        groups = self.live_column(self.categories).astype(np.int64) * len(TYPES) + self.live_column(self.types)
+        dates = self.live_column(self.dates).astype(np.int64)
+        amounts = self.live_column(self.amounts)
+        if self._live >= PARALLEL_MIN_ROWS and (os.cpu_count() or 1) > 1:
+            # Imported here as only ledgers this large need shared memory and worker processes
+            from parallel_rollups import parallel_rollup_sums
+            daily, monthly = parallel_rollup_sums(groups, dates, amounts)
+        else:
+            daily, monthly = rollup_sums(groups, dates, amounts)
+
+        self.aggregates = AggregateCache.from_json({
+            "daily": self._rollup_rows(*daily, ordinal_to_date),
+            "monthly": self._rollup_rows(*monthly, lambda value: f"{value // 12:04d}/{value % 12 + 1:02d}"),
+        })
+
+    def _rollup_rows(self, keys, sums, counts, label):
+        """Turn group sums into [type, category, period, total, count] rows"""
+        # Many keys share a day or month, so each period is labelled once
+        labels = {}
+        rows = []
+        for key, total, count in zip(keys.tolist(), sums.tolist(), counts.tolist()):
+            group, period = key >> 32, key & 0xFFFFFFFF
+            category, code = divmod(group, len(TYPES))
+            name = labels.get(period)
+            if name is None:
+                name = labels[period] = label(period)
+            rows.append([TYPES[code], self.category_names[category], name, total, count])
+        return rows
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from money import MAX_CENTS, to_cents
+from transaction_store import DATE_FORMAT
+
+
+def parse_amount(text):
+    """Parse a transaction amount into cents, raising ValueError with a message for the user"""
+    # Parsed as a decimal, so 0.1 is exactly 10 cents
+    try:
+        amount = to_cents(text)
+    except ValueError:
+        raise ValueError("Enter a valid amount.")
+
+    if amount > MAX_CENTS:
+        raise ValueError("Enter a valid amount.")
+    if amount <= 0:
+        raise ValueError("Amount must be greater than 0.")
+    return amount
+
+
+def parse_date(text, date_format=DATE_FORMAT):
+    """Parse a date and return it as a zero-padded YYYY/MM/DD string"""
+    return datetime.strptime(text, date_format).strftime(DATE_FORMAT)
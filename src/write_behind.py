@@ -0,0 +1,129 @@
+import atexit
+import threading
+import time
+
+# A burst of changes is written once nothing new has arrived for this long
+DEBOUNCE_SECONDS = 0.5
+
+# ...but never later than this after the first change of the burst
+MAX_DELAY_SECONDS = 2.0
+
+
+class BackgroundWriter:
+    """Runs storage writes on a background thread, a burst of changes at a time
+
+    submit() queues an item and returns at once. The thread waits until the
+    changes stop for DEBOUNCE_SECONDS, then hands everything queued to
+    write(items) in one call. flush() waits until all submitted items are
+    written and raises the error of a failed write. Pending items are also
+    flushed when the program exits.
+    """
+
+    def __init__(self, write, delay=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS):
+        self._write = write
+        self.delay = delay
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        self._pending = []
+        self._submitted = 0
+        self._written = 0
+        self._first_change = 0.0
+        self._last_change = 0.0
+        self._flush_waiters = 0
+        self._failed = False
+        self._closed = False
+        self.error = None
+        self._thread = None
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+        self._thread.start()
+        # atexit runs before daemon threads are stopped, so nothing queued is lost
+        atexit.register(self.close)
+
+    def submit(self, item):
+        self.submit_many([item])
+
+    def submit_many(self, items):
+        """Queue items for the next write"""
+        with self._condition:
+            if self._closed:
+                raise ValueError("The writer is closed.")
+            if self._thread is None:
+                self._start()
+            now = time.monotonic()
+            if not self._pending:
+                self._first_change = now
+            self._last_change = now
+            for item in items:
+                self._pending.append(item)
+                self._submitted += 1
+            self._failed = False
+            self._condition.notify_all()
+
+    def flush(self):
+        """Write everything submitted so far and wait for it"""
+        with self._condition:
+            if self._thread is None:
+                return
+            target = self._submitted
+            self._flush_waiters += 1
+            self._condition.notify_all()
+            try:
+                while self._written < target and self.error is None and self._thread.is_alive():
+                    self._condition.wait()
+            finally:
+                self._flush_waiters -= 1
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Flush and stop the thread; later submits are refused"""
+        try:
+            self.flush()
+        finally:
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+            if self._thread is not None and self._thread is not threading.current_thread():
+                self._thread.join()
+            atexit.unregister(self.close)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # After a failed write, try again only when asked to or given more work
+                while (not self._pending or self._failed) and not self._closed and not self._flush_waiters:
+                    self._condition.wait()
+                if not self._pending or (self._closed and self._failed):
+                    if self._closed:
+                        return
+                    continue
+
+                # Debounce: let the burst finish unless someone is waiting
+                while not self._closed and not self._flush_waiters:
+                    now = time.monotonic()
+                    deadline = min(self._last_change + self.delay, self._first_change + self.max_delay)
+                    if now >= deadline:
+                        break
+                    self._condition.wait(deadline - now)
+
+                items = self._pending
+                self._pending = []
+
+            try:
+                self._write(items)
+            except Exception as e:
+                with self._condition:
+                    # Keep the items so the next attempt writes them again
+                    self._pending = items + self._pending
+                    self._failed = True
+                    self.error = e
+                    self._condition.notify_all()
+                print(f"\n❌ Error in saving transactions: {e}")
+                continue
+
+            with self._condition:
+                self._written += len(items)
+                self._condition.notify_all()
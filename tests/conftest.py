@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# The modules live side by side in src/ and import each other by name
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+from transaction_store import TransactionStore  # noqa: E402
+
+
+def make_transaction(transaction_id, amount, date, transaction_type="expense", category="Food", description=""):
+    """A transaction dict with the amount in cents"""
+    return {
+        "id": transaction_id,
+        "type": transaction_type,
+        "amount": amount,
+        "category": category,
+        "description": description,
+        "date": date,
+    }
+
+
+@pytest.fixture
+def store():
+    """A small ledger over two months"""
+    transactions = TransactionStore()
+    for transaction in [
+        make_transaction(1, 250000, "2025/01/01", "income", "Salary", "January pay"),
+        make_transaction(2, 1250, "2025/01/03", category="Food", description="Coffee and cake"),
+        make_transaction(3, 4000, "2025/01/10", category="Transport", description="Train ticket"),
+        make_transaction(4, 990, "2025/02/02", category="Food", description="Coffee beans"),
+        make_transaction(5, 12000, "2025/02/15", category="Rent", description="Garage"),
+    ]:
+        transactions.append(transaction)
+    return transactions
@@ -0,0 +1,68 @@
+import numpy as np
+
+import aggregation
+from conftest import make_transaction
+from quantile_sketch import EXACT_LIMIT, RELATIVE_ERROR, QuantileSketch
+from transaction_store import TransactionStore
+
+
+def test_group_totals_follow_changes(store):
+    assert aggregation.group_totals(store, ("month", "type")) == {
+        ("2025/01", "income"): [250000, 1],
+        ("2025/01", "expense"): [5250, 2],
+        ("2025/02", "expense"): [12990, 2],
+    }
+
+    store.remove(5)
+    edited = store.get(2)
+    edited["date"] = "2025/02/03"
+    store.update(edited)
+    assert aggregation.group_totals(store, ("month", "type")) == {
+        ("2025/01", "income"): [250000, 1],
+        ("2025/01", "expense"): [4000, 1],
+        ("2025/02", "expense"): [2240, 2],
+    }
+
+
+def test_balance_over_time_has_every_calendar_day():
+    transactions = TransactionStore()
+    transactions.append(make_transaction(1, 500, "2025/01/01"))
+    transactions.append(make_transaction(2, 10000, "2025/01/03", "income"))
+    transactions.append(make_transaction(3, 2000, "2025/01/05"))
+
+    rows = aggregation.balance_over_time(transactions, windows=(2,))
+    assert rows == [
+        ("2025/01/01", -500, [250.0]),
+        ("2025/01/02", -500, [250.0]),
+        ("2025/01/03", 9500, [0.0]),
+        ("2025/01/04", 9500, [0.0]),
+        ("2025/01/05", 7500, [1000.0]),
+    ]
+
+
+def test_balance_over_time_of_an_empty_ledger():
+    assert aggregation.balance_over_time(TransactionStore()) == []
+
+
+def test_expense_distribution_of_a_small_category_is_exact():
+    transactions = TransactionStore()
+    transactions.append(make_transaction(1, 500, "2025/01/01"))
+    transactions.append(make_transaction(2, 2000, "2025/01/02"))
+    transactions.append(make_transaction(3, 90000, "2025/01/03", "income"))
+
+    largest, percentiles = aggregation.expense_distribution(transactions, top=1, quantiles=(0.0, 0.5, 1.0))
+    assert [t["id"] for t in largest] == [2]
+    assert percentiles == [("Food", 2, [500, 1250, 2000])]
+
+
+def test_sketch_of_many_amounts_stays_within_its_error():
+    amounts = np.arange(1, 5 * EXACT_LIMIT + 1, dtype=np.int64)
+    sketch = QuantileSketch()
+    sketch.add_many(amounts[:EXACT_LIMIT])
+    assert sketch.quantile(0.5) == np.quantile(amounts[:EXACT_LIMIT], 0.5)
+
+    sketch.add_many(amounts[EXACT_LIMIT:])
+    assert sketch.exact is None
+    for q in (0.5, 0.9, 0.99):
+        exact = np.quantile(amounts, q)
+        assert abs(sketch.quantile(q) - exact) <= RELATIVE_ERROR * exact + 1
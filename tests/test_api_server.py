@@ -0,0 +1,90 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import api_server
+import main
+from storage import open_storage
+from transaction_store import TransactionStore
+
+COFFEE = {"type": "expense", "amount": 450, "category": "Food"}
+
+
+class FakeStorage:
+    """Records what the writer saves; flush raises error if one is given"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.records = []
+        self.flushes = 0
+
+    def record(self, transactions, op, transaction):
+        self.records.append((op, transaction["id"]))
+
+    def flush(self):
+        self.flushes += 1
+        if self.error is not None:
+            raise self.error
+
+
+def run_batches(storage, batches, monkeypatch):
+    """Send each batch of changes at once to one running writer
+
+    Returns the server and, per batch, each change's result or HttpError.
+    """
+    monkeypatch.setattr(main, "storage", storage)
+    server = api_server.LedgerServer(TransactionStore())
+
+    async def send():
+        server.changes = asyncio.Queue()
+        writer = asyncio.create_task(server._run_writer())
+        answers = []
+        try:
+            for changes in batches:
+                pending = (server._change(op, payload) for op, payload in changes)
+                answers.append(await asyncio.wait_for(asyncio.gather(*pending, return_exceptions=True), timeout=5))
+        finally:
+            writer.cancel()
+        return answers
+
+    return server, asyncio.run(send())
+
+
+def test_waiting_changes_are_committed_as_one_batch(monkeypatch):
+    storage = FakeStorage()
+    server, [results] = run_batches(storage, [[("add", COFFEE), ("add", COFFEE), ("delete", 99)]], monkeypatch)
+
+    assert [result["id"] for result in results[:2]] == [1, 2]
+    assert isinstance(results[2], api_server.HttpError) and results[2].status == 404
+    assert storage.records == [("add", 1), ("add", 2)]
+    assert storage.flushes == 1
+    assert server.version == 1
+
+
+@pytest.mark.parametrize("error", [OSError("disk full"), sqlite3.OperationalError("database is locked")])
+def test_failed_commit_answers_every_change(monkeypatch, error):
+    storage = FakeStorage(error)
+    batches = [[("add", COFFEE), ("add", COFFEE)], [("add", COFFEE)]]
+    server, answers = run_batches(storage, batches, monkeypatch)
+
+    # The writer survives the first failure and answers the next batch too
+    assert [[result.status for result in results] for results in answers] == [[500, 500], [500]]
+    assert str(error) in answers[0][0].message
+    assert storage.flushes == 2
+
+
+def test_change_is_answered_only_once_on_disk(tmp_path, monkeypatch):
+    # The snapshot and journal cannot be written into a missing folder
+    storage = open_storage(str(tmp_path / "missing" / "ledger.json"))
+    server, [results] = run_batches(storage, [[("add", COFFEE)]], monkeypatch)
+    assert results[0].status == 500
+    with pytest.raises(OSError):
+        storage.close()
+
+    storage = open_storage(str(tmp_path / "ledger.json"))
+    server, [results] = run_batches(storage, [[("add", COFFEE)]], monkeypatch)
+    assert results[0]["id"] == 1
+    with open(tmp_path / "ledger.journal", encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+    storage.close()
@@ -0,0 +1,67 @@
+import main
+from bulk_import import import_file
+from transaction_store import TransactionStore
+
+STATEMENT = """date,amount,description
+2025/03/01,-4.50,Coffee
+2025/03/01,-4.50,Coffee
+2025/03/02,1200.00,Salary
+2025/03/02,oops,Broken row
+"""
+
+
+def write_statement(tmp_path, text=STATEMENT):
+    path = tmp_path / "statement.csv"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_identical_rows_in_one_statement_are_all_added(tmp_path):
+    transactions = TransactionStore()
+    added, duplicates, errors = import_file(write_statement(tmp_path), transactions)
+
+    assert [(t["type"], t["amount"], t["description"]) for t in added] == [
+        ("expense", 450, "Coffee"),
+        ("expense", 450, "Coffee"),
+        ("income", 120000, "Salary"),
+    ]
+    assert duplicates == 0
+    assert [line for line, message in errors] == [5]
+    assert len(transactions) == 3
+
+
+def test_rows_already_in_the_ledger_are_skipped(tmp_path):
+    transactions = TransactionStore()
+    path = write_statement(tmp_path)
+    import_file(path, transactions)
+
+    added, duplicates, errors = import_file(path, transactions)
+    assert added == []
+    assert duplicates == 3
+    assert len(transactions) == 3
+
+
+def test_amounts_with_a_decimal_comma_or_two_signs_are_refused(tmp_path):
+    text = """date,amount,description
+2025/03/01,"1,234.50",Laptop
+2025/03/01,"12,50",Lunch
+2025/03/01,--5,Twice negative
+2025/03/01,-+5,Mixed signs
+2025/03/01,+7.25,Refund
+"""
+    added, duplicates, errors = import_file(write_statement(tmp_path, text), TransactionStore())
+
+    assert [(t["type"], t["amount"]) for t in added] == [("income", 123450), ("income", 725)]
+    assert [line for line, message in errors] == [3, 4, 5]
+    assert "use a point for decimals" in errors[0][1]
+
+
+def test_menu_import_asks_for_the_date_format(tmp_path, monkeypatch):
+    path = write_statement(tmp_path, "date,amount,description\n2025-03-01,-4.50,Coffee\n")
+    answers = iter([path, "", "%Y-%m-%d"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    monkeypatch.setattr(main, "record_batch", lambda transactions, op, batch: None)
+    transactions = TransactionStore()
+
+    main.import_transactions(transactions)
+    assert [t["date"] for t in transactions] == ["2025/03/01"]
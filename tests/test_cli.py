@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+import cli
+from conftest import SRC
+
+
+def test_importing_main_opens_no_storage(tmp_path):
+    # A damaged data file must not break the import, and nothing is created
+    (tmp_path / "ledger.db").write_bytes(b"this is not a database" * 10)
+    code = "import main; raise SystemExit(main.storage is not None)"
+    environment = dict(os.environ, FINANCE_DATA_FILE="ledger.db", PYTHONPATH=SRC)
+    assert subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=environment).returncode == 0
+    assert os.listdir(tmp_path) == ["ledger.db"]
+
+
+def test_damaged_database_is_reported(tmp_path, capsys):
+    path = tmp_path / "ledger.db"
+    path.write_bytes(b"this is not a database" * 10)
+    assert cli.run(["--data", str(path), "balance"]) == 1
+    assert "Error in loading data" in capsys.readouterr().err
+
+
+def test_added_transaction_is_saved(tmp_path, capsys):
+    path = tmp_path / "ledger.json"
+    command = ["--data", str(path), "add", "--type", "expense", "--amount", "12.50", "--category", "Food"]
+    assert cli.run(command) == 0
+    assert cli.run(["--data", str(path), "balance"]) == 0
+    assert "Total Expense: 12.50 $" in capsys.readouterr().out
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from conftest import make_transaction
+from money import format_amount, from_record, to_cents, to_record
+from transaction_store import TransactionStore
+
+
+def test_amounts_are_int64_cents(store):
+    assert store.amounts.dtype == np.int64
+    assert store.get(2)["amount"] == 1250
+
+
+def test_many_small_amounts_sum_exactly():
+    transactions = TransactionStore()
+    for transaction_id in range(1, 1001):
+        transactions.append(make_transaction(transaction_id, to_cents("0.10"), "2025/01/01"))
+    assert transactions.aggregates.by_type["expense"][0] == 10000
+    assert format_amount(transactions.aggregates.by_type["expense"][0]) == "100.00"
+
+
+def test_to_cents_rounds_half_up():
+    assert to_cents("0.29") == 29
+    assert to_cents(0.29) == 29
+    assert to_cents("1.005") == 101
+    with pytest.raises(ValueError):
+        to_cents("ten")
+
+
+def test_format_amount():
+    assert format_amount(123450) == "1,234.50"
+    assert format_amount(-5) == "-0.05"
+    assert format_amount(150, 0) == "2"
+
+
+def test_records_in_units_are_read_as_cents():
+    legacy = {"id": 1, "type": "expense", "amount": 12.34, "category": "Food", "description": "", "date": "2025/01/01"}
+    transaction = from_record(legacy)
+    assert transaction["amount"] == 1234
+    assert to_record(transaction)["amount_cents"] == 1234
@@ -0,0 +1,28 @@
+from query import Query
+
+
+def test_query_combines_predicates(store):
+    rows, total, plan = store.query(Query(category="food", date_from="2025/01/01", date_to="2025/02/28", amount_max=1000))
+    assert [t["id"] for t in rows] == [4]
+    assert total == 1
+    assert plan.index == "date index"
+
+
+def test_query_sorts_and_pages(store):
+    rows, total, plan = store.query(Query(transaction_type="expense", sort="amount", descending=True, limit=2))
+    assert [t["id"] for t in rows] == [5, 3]
+    assert total == 4
+
+
+def test_reversed_range_query_plan(store):
+    rows, total, plan = store.query(Query(date_from="2025/02/01", date_to="2025/01/01"))
+    assert (rows, total) == ([], 0)
+    assert plan.estimate == 0
+
+
+def test_date_candidates_are_counted_on_the_date_index(store, monkeypatch):
+    # A backend may count a range its own way; the rows still come from the index
+    monkeypatch.setattr(store, "count_by_dates", lambda first, last: 1)
+    rows, total, plan = store.query(Query(date_from="2025/01/01", date_to="2025/01/31"))
+    assert [t["id"] for t in rows] == [1, 2, 3]
+    assert plan.estimate == 3
@@ -0,0 +1,229 @@
+import json
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import aggregation
+import journal
+from conftest import SRC, make_transaction
+from journal import TransactionJournal, journal_path
+from query import Query
+from storage import convert, open_storage
+from stream_loader import LedgerLoadError
+
+def load(path):
+    storage = open_storage(str(path))
+    transactions = storage.load()
+    storage.close()
+    return transactions
+
+
+def write_json(path, records):
+    path.write_text(json.dumps(records), encoding="utf-8")
+
+
+def write_journal(path, records):
+    TransactionJournal(journal_path(str(path))).append_records(records)
+
+
+def test_changes_are_replayed_from_the_journal(tmp_path, store):
+    path = tmp_path / "ledger.json"
+    storage = open_storage(str(path))
+    storage.save(store)
+    store.append(make_transaction(6, 700, "2025/03/01"))
+    storage.record(store, "add", store.get(6))
+    store.remove(3)
+    storage.record(store, "delete", {"id": 3})
+    storage.close()
+
+    # The snapshot is untouched, the changes are only in the journal
+    assert len(json.loads(path.read_text(encoding="utf-8"))) == 5
+    assert sorted(t["id"] for t in load(path)) == [1, 2, 4, 5, 6]
+
+
+def test_torn_journal_line_is_skipped(tmp_path, capsys):
+    path = tmp_path / "ledger.json"
+    write_journal(path, [("add", make_transaction(1, 500, "2025/01/01"))])
+    with open(journal_path(str(path)), "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "transac')
+
+    assert [t["id"] for t in load(path)] == [1]
+    assert "Skipping damaged journal record on line 2." in capsys.readouterr().out
+
+
+def test_journal_records_without_their_fields_are_skipped(tmp_path, capsys):
+    path = tmp_path / "ledger.json"
+    write_journal(path, [("add", make_transaction(1, 500, "2025/01/01"))])
+    with open(journal_path(str(path)), "a", encoding="utf-8") as f:
+        f.write('{"transaction": {"id": 2}}\n{"op": "add"}\n{"op": "add", "transaction": {"id": 3}}\n[1, 2]\n')
+    write_journal(path, [("delete", {"id": 1})])
+
+    assert len(load(path)) == 0
+    output = capsys.readouterr().out
+    for line_number in (2, 3, 4, 5):
+        assert f"Skipping damaged journal record on line {line_number}." in output
+
+
+def test_long_journal_is_compacted_on_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "COMPACT_THRESHOLD", 3)
+    path = tmp_path / "ledger.json"
+    write_journal(path, [("add", make_transaction(i, 100 * i, "2025/01/0%d" % i)) for i in range(1, 4)])
+
+    assert len(load(path)) == 3
+    assert [record["id"] for record in json.loads(path.read_text(encoding="utf-8"))] == [1, 2, 3]
+    with open(journal_path(str(path)), encoding="utf-8") as f:
+        assert [json.loads(line)["op"] for line in f] == ["reserve"]
+
+
+def test_missing_data_file_is_reported_only_without_a_journal(tmp_path, capsys):
+    path = tmp_path / "ledger.json"
+    load(path)
+    assert "Data file not found." in capsys.readouterr().out
+
+    write_journal(path, [("add", make_transaction(1, 500, "2025/01/01"))])
+    assert len(load(path)) == 1
+    assert "Data file not found." not in capsys.readouterr().out
+
+
+def test_old_json_is_rewritten_with_padded_dates(tmp_path):
+    path = tmp_path / "ledger.json"
+    write_json(path, [
+        {"id": 1, "type": "income", "amount_cents": 500, "category": "Gift", "description": "", "date": "2025/1/5"},
+        {"id": 2, "type": "expense", "amount_cents": 29, "category": "Food", "description": "", "date": "2025/01/06"},
+    ])
+
+    assert [t["date"] for t in load(path)] == ["2025/01/05", "2025/01/06"]
+    assert [r["date"] for r in json.loads(path.read_text(encoding="utf-8"))] == ["2025/01/05", "2025/01/06"]
+
+
+def test_invalid_record_raises_ledger_load_error(tmp_path):
+    path = tmp_path / "ledger.json"
+    write_json(path, [{"id": 1, "type": "expense", "amount_cents": 100, "category": "Food", "description": ""}])
+    with pytest.raises(LedgerLoadError):
+        load(path)
+
+
+@pytest.mark.parametrize("target", ["ledger.bin", "ledger.db", "ledger.ledger"])
+def test_convert_keeps_every_transaction(tmp_path, store, target):
+    source = tmp_path / "source.json"
+    storage = open_storage(str(source))
+    storage.save(store)
+    storage.close()
+
+    convert(str(source), str(tmp_path / target))
+    converted = load(tmp_path / target)
+    assert sorted(converted.to_list(), key=lambda t: t["id"]) == store.to_list()
+
+
+def test_damaged_database_raises_ledger_load_error(tmp_path):
+    path = tmp_path / "ledger.db"
+    path.write_bytes(b"this is not a database" * 10)
+    with pytest.raises(LedgerLoadError):
+        open_storage(str(path))
+
+
+def test_damaged_manifest_raises_ledger_load_error(tmp_path):
+    path = tmp_path / "ledger.ledger"
+    path.mkdir()
+    (path / "manifest.json").write_text("{", encoding="utf-8")
+    with pytest.raises(LedgerLoadError):
+        open_storage(str(path))
+
+
+def test_old_json_is_rewritten_in_cents(tmp_path):
+    path = tmp_path / "ledger.json"
+    write_json(path, [
+        {"id": 1, "type": "income", "amount": 5.0, "category": "Gift", "description": "", "date": "2025/01/05"},
+        {"id": 2, "type": "expense", "amount": 0.29, "category": "Food", "description": "", "date": "2025/01/06"},
+    ])
+
+    assert [t["amount"] for t in load(path)] == [500, 29]
+    assert [r["amount_cents"] for r in json.loads(path.read_text(encoding="utf-8"))] == [500, 29]
+
+
+def test_sqlite_amounts_are_migrated_to_cents(tmp_path):
+    path = tmp_path / "ledger.db"
+    connection = sqlite3.connect(str(path))
+    connection.execute(
+        "CREATE TABLE transactions (id INTEGER PRIMARY KEY, type TEXT NOT NULL, amount REAL NOT NULL,"
+        " category TEXT NOT NULL, description TEXT NOT NULL, date TEXT NOT NULL)"
+    )
+    connection.execute("INSERT INTO transactions VALUES (1, 'expense', 12.34, 'Food', '', '2025/01/01')")
+    connection.execute("INSERT INTO transactions VALUES (2, 'expense', 0.29, 'Food', '', '2025/01/02')")
+    connection.commit()
+    connection.close()
+
+    transactions = load(path)
+    assert [t["amount"] for t in transactions] == [1234, 29]
+    assert transactions.aggregates.by_type["expense"][0] == 1263
+    # Opening it again does not multiply the amounts a second time
+    assert [t["amount"] for t in load(path)] == [1234, 29]
+
+
+def test_sqlite_dates_are_padded_once(tmp_path):
+    path = tmp_path / "ledger.db"
+    storage = open_storage(str(path))
+    storage.close()
+    connection = sqlite3.connect(str(path))
+    connection.execute("INSERT INTO transactions VALUES (1, 'expense', 500, 'Food', '', '2025/01/02')")
+    connection.execute("INSERT INTO transactions VALUES (2, 'expense', 1250, 'Food', '', '2025/1/5')")
+    connection.execute("DELETE FROM meta WHERE key = 'dates_padded'")
+    connection.commit()
+    connection.close()
+
+    storage = open_storage(str(path))
+    transactions = storage.load()
+    assert [t["date"] for t in transactions] == ["2025/01/02", "2025/01/05"]
+    assert aggregation.group_totals(transactions, ("month",)) == {("2025/01",): [1750, 2]}
+    rows, total, plan = transactions.query(Query(date_from="2025/01/01", date_to="2025/01/31"))
+    assert [t["id"] for t in rows] == [1, 2]
+    storage.close()
+
+
+def test_damaged_binary_file_raises_ledger_load_error(tmp_path, store):
+    path = tmp_path / "ledger.bin"
+    storage = open_storage(str(path))
+    storage.save(store)
+    storage.close()
+    data = path.read_bytes()
+
+    # Cut inside the prefix, then a header that is JSON but not a ledger header
+    path.write_bytes(data[:6])
+    with pytest.raises(LedgerLoadError):
+        load(path)
+    header = b'{"count": 5}'
+    path.write_bytes(data[:8] + len(header).to_bytes(4, "little") + header)
+    with pytest.raises(LedgerLoadError):
+        load(path)
+
+
+def test_convert_leaves_the_source_as_it_is(tmp_path):
+    source = tmp_path / "old.json"
+    write_json(source, [
+        {"id": 1, "type": "income", "amount": 5.0, "category": "Gift", "description": "", "date": "2025/1/5"},
+    ])
+    write_journal(source, [("add", make_transaction(2, 29, "2025/01/06"))])
+    before = {path.name: path.read_bytes() for path in tmp_path.iterdir()}
+
+    convert(str(source), str(tmp_path / "new.db"))
+    assert {name: (tmp_path / name).read_bytes() for name in before} == before
+    database = (tmp_path / "new.db").read_bytes()
+    convert(str(tmp_path / "new.db"), str(tmp_path / "again.json"))
+    assert (tmp_path / "new.db").read_bytes() == database
+    assert [(t["amount"], t["date"]) for t in load(tmp_path / "again.json")] == [(500, "2025/01/05"), (29, "2025/01/06")]
+
+
+def test_convert_reports_a_ledger_split_another_way(tmp_path, store):
+    source = tmp_path / "source.json"
+    storage = open_storage(str(source))
+    storage.save(store)
+    storage.close()
+    convert(str(source), str(tmp_path / "yearly.ledger"), "year")
+
+    command = [sys.executable, "storage.py", str(source), str(tmp_path / "yearly.ledger"), "--partition", "month"]
+    finished = subprocess.run(command, cwd=SRC, capture_output=True, text=True)
+    assert finished.returncode == 1
+    assert "is already split by year" in finished.stderr
+    assert "Traceback" not in finished.stderr
@@ -0,0 +1,74 @@
+import pytest
+
+from conftest import make_transaction
+from date_index import DateIndex
+from transaction_store import TransactionStore, date_to_ordinal, ordinal_to_date
+
+
+def test_rows_come_back_as_appended(store):
+    assert len(store) == 5
+    assert store.get(3) == make_transaction(3, 4000, "2025/01/10", category="Transport", description="Train ticket")
+    assert [t["id"] for t in store.iter_rows(1, 2)] == [2, 3]
+    assert store.get(99) is None
+
+
+def test_dates_without_leading_zeros():
+    assert date_to_ordinal("2025/1/5") == date_to_ordinal("2025/01/05")
+    assert ordinal_to_date(date_to_ordinal("2025/1/5")) == "2025/01/05"
+    with pytest.raises(ValueError):
+        date_to_ordinal("2025/13/01")
+
+    transactions = TransactionStore()
+    transactions.append(make_transaction(1, 500, "2025/1/5"))
+    assert transactions.get(1)["date"] == "2025/01/05"
+
+
+def test_update_and_remove_keep_ids_stable(store):
+    transaction = store.get(3)
+    transaction["amount"] = 4500
+    assert store.update(transaction)
+    assert store.get(3)["amount"] == 4500
+
+    assert store.remove(2)
+    assert not store.remove(2)
+    assert 2 not in store
+    assert len(store) == 4
+    assert [t["id"] for t in store] == [1, 3, 4, 5]
+    # Ids of removed transactions are not handed out again
+    assert store.next_id() == 6
+
+
+def test_search_index_follows_changes(store):
+    assert [t["id"] for t in store.find_by_category("foo")] == [2, 4]
+    assert [t["id"] for t in store.find_by_description("COFFEE")] == [2, 4]
+
+    store.remove(2)
+    edited = store.get(4)
+    edited["description"] = "Tea"
+    store.update(edited)
+    store.append(make_transaction(6, 300, "2025/02/20", category="Fast food", description="Coffee to go"))
+
+    assert [t["id"] for t in store.find_by_category("food")] == [4, 6]
+    assert [t["id"] for t in store.find_by_description("coffee")] == [6]
+
+
+def test_date_index_range_in_date_order(store):
+    found = store.iter_by_dates(date_to_ordinal("2025/01/02"), date_to_ordinal("2025/02/02"))
+    assert [t["id"] for t in found] == [2, 3, 4]
+
+    moved = store.get(3)
+    moved["date"] = "2025/02/20"
+    store.update(moved)
+    assert store.count_by_dates(date_to_ordinal("2025/02/01"), date_to_ordinal("2025/02/28")) == 3
+
+
+def test_reversed_date_range_is_empty(store):
+    first, last = date_to_ordinal("2025/02/01"), date_to_ordinal("2025/01/01")
+    assert store.count_by_dates(first, last) == 0
+    assert list(store.iter_by_dates(first, last)) == []
+
+    index = DateIndex()
+    for row, ordinal in enumerate([10, 11, 12, 13]):
+        index.add(row, ordinal)
+    assert index.count(13, 11) == 0
+    assert list(index.rows(13, 11)) == []